@@ -0,0 +1,211 @@
+"""
+Análisis de series diarias con NumPy.
+
+Una serie es una matriz (días, parámetros) con un día por fila, en orden
+cronológico. Todas las funciones aceptan también un bloque
+(usuarios, días, parámetros) para procesar muchos usuarios a la vez; los
+días sin dato van como NaN y se ignoran (ver `apilar`).
+"""
+import numpy as np
+
+from models import PARAMETROS
+
+# Diferencia relativa entre el primer y el último tercio que cuenta como cambio
+UMBRAL_TENDENCIA = 0.05
+VENTANA_MEDIA_MOVIL = 7
+
+TENDENCIAS = np.array(["estable", "creciente", "decreciente"])
+
+
+def matriz_serie(serie, parametros=PARAMETROS):
+    """Matriz (días, parámetros) a partir de {"fechas", "series"} de historico.serie_diaria."""
+    if not serie["fechas"]:
+        return np.empty((0, len(parametros)))
+    return np.column_stack([np.asarray(serie["series"][p], dtype=float) for p in parametros])
+
+
+def apilar(matrices):
+    """
+    Apila matrices (días, parámetros) de distinto largo en un bloque
+    (usuarios, días, parámetros), alineadas por el día más reciente y
+    rellenando con NaN al principio.
+    """
+    dias = max((m.shape[0] for m in matrices), default=0)
+    columnas = matrices[0].shape[1] if matrices else len(PARAMETROS)
+    bloque = np.full((len(matrices), dias, columnas), np.nan)
+    for i, m in enumerate(matrices):
+        if m.shape[0]:
+            bloque[i, dias - m.shape[0]:] = m
+    return bloque
+
+
+def _primero_y_ultimo(datos, validos):
+    """Primer y último valor válido de cada columna (NaN si no hay ninguno)."""
+    dias = datos.shape[-2]
+    indices = np.arange(dias).reshape(-1, 1)
+    primero = np.where(validos, indices, dias).min(axis=-2, keepdims=True)
+    ultimo = np.where(validos, indices, -1).max(axis=-2, keepdims=True)
+    hay = ultimo >= 0
+    primero = np.take_along_axis(datos, np.where(hay, primero, 0), axis=-2)
+    ultimo = np.take_along_axis(datos, np.where(hay, ultimo, 0), axis=-2)
+    return (np.where(hay, primero, np.nan).squeeze(-2),
+            np.where(hay, ultimo, np.nan).squeeze(-2))
+
+
+def media_movil(datos, ventana=VENTANA_MEDIA_MOVIL):
+    """
+    Media móvil de los últimos `ventana` días de cada columna, del mismo
+    largo que la serie (los primeros días promedian los que haya).
+    """
+    validos = ~np.isnan(datos)
+    ceros = np.zeros(datos.shape[:-2] + (1, datos.shape[-1]))
+    sumas = np.concatenate([ceros, np.cumsum(np.where(validos, datos, 0.0), axis=-2)], axis=-2)
+    conteos = np.concatenate([ceros, np.cumsum(validos, axis=-2)], axis=-2)
+
+    fin = np.arange(1, datos.shape[-2] + 1)
+    inicio = np.maximum(fin - ventana, 0)
+    suma = sumas[..., fin, :] - sumas[..., inicio, :]
+    conteo = conteos[..., fin, :] - conteos[..., inicio, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(conteo > 0, suma / conteo, np.nan)
+
+
+def analizar(datos, umbral=UMBRAL_TENDENCIA, ventana=VENTANA_MEDIA_MOVIL):
+    """
+    Estadísticas por parámetro de una matriz (días, parámetros) o de un
+    bloque (usuarios, días, parámetros), en una sola pasada vectorizada.
+
+    Devuelve un diccionario de arreglos con forma (parámetros,) o
+    (usuarios, parámetros): total, promedio, minimo, maximo, desviacion,
+    pendiente (mínimos cuadrados, unidades por día), cambio_porcentual
+    (último contra primer valor) y tendencia; además media_movil con la
+    forma de `datos`.
+
+    La tendencia compara el promedio del primer y del último tercio de los
+    días con dato: "creciente" si el final supera al inicio en más de
+    `umbral` (relativo), "decreciente" si queda por debajo y "estable" en
+    otro caso o con menos de tres días.
+    """
+    datos = np.asarray(datos, dtype=float)
+    if datos.shape[-2] == 0:
+        # Sin días: se analiza un único día vacío, que da NaN en todo
+        vacio = analizar(np.full(datos.shape[:-2] + (1, datos.shape[-1]), np.nan), umbral, ventana)
+        vacio["media_movil"] = datos
+        return vacio
+
+    validos = ~np.isnan(datos)
+    valores = np.where(validos, datos, 0.0)
+    total = validos.sum(axis=-2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        promedio = valores.sum(axis=-2) / total
+        desvio = np.where(validos, datos - promedio[..., None, :], 0.0)
+        desviacion = np.sqrt((desvio ** 2).sum(axis=-2) / total)
+
+        # Pendiente por mínimos cuadrados sobre el índice del día
+        x = np.arange(datos.shape[-2], dtype=float).reshape(-1, 1)
+        x_medio = np.where(validos, x, 0.0).sum(axis=-2) / total
+        dx = np.where(validos, x - x_medio[..., None, :], 0.0)
+        pendiente = (dx * desvio).sum(axis=-2) / (dx ** 2).sum(axis=-2)
+
+        primero, ultimo = _primero_y_ultimo(datos, validos)
+        cambio_porcentual = np.where(primero != 0, (ultimo - primero) / np.abs(primero) * 100, np.nan)
+
+        # Primer y último tercio según el orden de los días con dato
+        orden = np.cumsum(validos, axis=-2) - 1
+        tercio = (total // 3)[..., None, :]
+        en_inicio = validos & (orden < tercio)
+        en_final = validos & (orden >= total[..., None, :] - tercio)
+        inicio = np.where(en_inicio, datos, 0.0).sum(axis=-2) / en_inicio.sum(axis=-2)
+        final = np.where(en_final, datos, 0.0).sum(axis=-2) / en_final.sum(axis=-2)
+
+    margen = umbral * np.abs(inicio)
+    codigo = np.select([final - inicio > margen, inicio - final > margen], [1, 2], default=0)
+    codigo = np.where(total >= 3, codigo, 0)
+
+    return {
+        "total": total,
+        "promedio": promedio,
+        "minimo": np.fmin.reduce(datos, axis=-2),
+        "maximo": np.fmax.reduce(datos, axis=-2),
+        "desviacion": desviacion,
+        "pendiente": np.where(total >= 2, pendiente, np.nan),
+        "cambio_porcentual": cambio_porcentual,
+        "tendencia": TENDENCIAS[codigo],
+        "media_movil": media_movil(datos, ventana),
+    }
+
+
+def _numero(valor, decimales):
+    return None if np.isnan(valor) else round(float(valor), decimales)
+
+
+def resumen_por_parametro(serie, parametros=PARAMETROS, decimales=2, indices=None):
+    """
+    `analizar` sobre una serie de historico.serie_diaria, listo para JSON:
+    {parametro: {"tendencia", "estadisticas", "media_movil"}}.
+    Con `indices` la media móvil se devuelve solo en esos días.
+    """
+    resultado = analizar(matriz_serie(serie, parametros))
+    if indices is not None:
+        resultado["media_movil"] = resultado["media_movil"][indices]
+    resumen = {}
+    for i, p in enumerate(parametros):
+        resumen[p] = {
+            "tendencia": str(resultado["tendencia"][i]),
+            "estadisticas": {
+                nombre: _numero(resultado[nombre][i], decimales)
+                for nombre in ("promedio", "minimo", "maximo", "desviacion",
+                               "pendiente", "cambio_porcentual")
+            },
+            "media_movil": [_numero(v, decimales) for v in resultado["media_movil"][:, i]],
+        }
+    return resumen
+
+
+def indices_lttb(datos, max_puntos):
+    """
+    Índices de a lo sumo `max_puntos` días elegidos con Largest-Triangle-
+    Three-Buckets, siempre con el primero y el último.
+
+    `datos` es una serie (días,) o una matriz (días, parámetros); con varias
+    columnas se eligen los mismos días para todas, sumando el área del
+    triángulo de cada columna normalizada a su rango.
+    """
+    datos = np.asarray(datos, dtype=float)
+    if datos.ndim == 1:
+        datos = datos[:, None]
+    dias = datos.shape[0]
+    if max_puntos >= dias:
+        return np.arange(dias)
+    if max_puntos < 3:
+        return np.unique(np.linspace(0, dias - 1, max(max_puntos, 1)).round().astype(int))
+
+    minimo = np.fmin.reduce(datos, axis=0)
+    rango = np.fmax.reduce(datos, axis=0) - minimo
+    rango = np.where(np.isnan(rango) | (rango == 0), 1.0, rango)
+    y = np.nan_to_num((datos - minimo) / rango)
+    x = np.arange(dias, dtype=float)
+
+    # El primero y el último fijos; el resto se reparte en max_puntos - 2 cubos
+    paso = (dias - 2) / (max_puntos - 2)
+    bordes = (np.arange(max_puntos) * paso).astype(int) + 1
+    bordes[-1] = dias
+
+    elegidos = np.empty(max_puntos, dtype=int)
+    elegidos[0] = 0
+    elegidos[-1] = dias - 1
+    a = 0
+    for i in range(max_puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        siguiente_fin = bordes[i + 2] if i + 2 < max_puntos - 1 else dias
+        siguiente_inicio = min(fin, dias - 1)
+        c_x = x[siguiente_inicio:siguiente_fin].mean()
+        c_y = y[siguiente_inicio:siguiente_fin].mean(axis=0)
+
+        areas = np.abs(
+            (x[a] - c_x) * (y[inicio:fin] - y[a]) - (x[a] - x[inicio:fin, None]) * (c_y - y[a])
+        ).sum(axis=1)
+        a = inicio + int(np.argmax(areas))
+        elegidos[i + 1] = a
+    return elegidos
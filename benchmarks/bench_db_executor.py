@@ -0,0 +1,106 @@
+"""
+Benchmark: handlers async que bloquean el event loop vs. DBExecutor.
+
+Usa SQLite en un archivo temporal como base de datos local de reemplazo y
+simula la latencia de red de SQL Server con un `sleep` por consulta.
+
+    python benchmarks/bench_db_executor.py --peticiones 200 --latencia-ms 20 --concurrencia 10
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_executor import DBExecutor
+from db_pool import ConnectionPool
+
+
+def preparar_base(ruta, filas=5000):
+    conn = sqlite3.connect(ruta)
+    conn.execute("""
+        CREATE TABLE lecturas (
+            id INTEGER PRIMARY KEY, usuario_id INTEGER, nitrogeno REAL, fosforo REAL,
+            potasio REAL, ph REAL, humedad REAL, temperatura REAL, luz_solar REAL,
+            fecha_hora TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX ix_lecturas_usuario_fecha ON lecturas (usuario_id, fecha_hora)")
+    conn.executemany(
+        "INSERT INTO lecturas (usuario_id, nitrogeno, fosforo, potasio, ph, humedad, temperatura, luz_solar, fecha_hora) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now', ?))",
+        [(i % 50, 10, 20, 30, 6.5, 40, 22, 800, f"-{i} minutes") for i in range(filas)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def crear_consulta(pool, latencia):
+    def ultima_lectura(usuario_id):
+        with pool.connection() as conn:
+            time.sleep(latencia)  # ida y vuelta de red hacia el servidor remoto
+            cursor = conn.execute(
+                "SELECT nitrogeno, fosforo, potasio, ph, humedad, temperatura, luz_solar, fecha_hora "
+                "FROM lecturas WHERE usuario_id = ? ORDER BY fecha_hora DESC LIMIT 1",
+                (usuario_id,),
+            )
+            return cursor.fetchone()
+    return ultima_lectura
+
+
+async def modo_bloqueante(consulta, peticiones):
+    async def handler(usuario_id):
+        return consulta(usuario_id)
+    await asyncio.gather(*(handler(i % 50) for i in range(peticiones)))
+
+
+async def modo_ejecutor(consulta, peticiones, executor):
+    async def handler(usuario_id):
+        return await executor.run(consulta, usuario_id)
+    await asyncio.gather(*(handler(i % 50) for i in range(peticiones)))
+
+
+def medir(nombre, corrutina, peticiones):
+    inicio = time.perf_counter()
+    asyncio.run(corrutina)
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<28} {duracion:8.3f} s   {peticiones / duracion:10.1f} peticiones/s")
+    return duracion
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peticiones", type=int, default=200)
+    parser.add_argument("--latencia-ms", type=float, default=20.0)
+    parser.add_argument("--concurrencia", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "agromagu_bench.db")
+        preparar_base(ruta)
+        pool = ConnectionPool(
+            lambda: sqlite3.connect(ruta, check_same_thread=False),
+            min_size=args.concurrencia,
+            max_size=args.concurrencia,
+        )
+        pool.open()
+        consulta = crear_consulta(pool, args.latencia_ms / 1000)
+
+        print(f"{args.peticiones} peticiones, latencia simulada {args.latencia_ms} ms, "
+              f"concurrencia {args.concurrencia}")
+        base = medir("bloqueando el event loop", modo_bloqueante(consulta, args.peticiones), args.peticiones)
+
+        executor = DBExecutor(max_concurrency=args.concurrencia)
+        nuevo = medir("DBExecutor", modo_ejecutor(consulta, args.peticiones, executor), args.peticiones)
+        executor.shutdown()
+        pool.close()
+
+        print(f"mejora: x{base / nuevo:.1f}")
+
+
+if __name__ == "__main__":
+    main()
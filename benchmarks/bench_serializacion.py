@@ -0,0 +1,111 @@
+"""
+Benchmark: serialización de la respuesta completa de un histórico de 6 meses.
+
+Arma el payload con el handler real de /api/lecturas/historico a partir de
+una serie diaria sintética (sin base de datos) y mide cuánto tarda cada
+camino en convertirlo a bytes:
+
+  - fastapi:  jsonable_encoder + JSONResponse (lo que hace FastAPI por defecto)
+  - orjson:   RespuestaJSON
+  - msgpack:  RespuestaMsgPack
+
+    python benchmarks/bench_serializacion.py --dias 183 --repeticiones 200 [--analisis]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+from starlette.routing import Match
+
+import routes.lecturas as lecturas
+from models import PARAMETROS
+from respuestas import RespuestaJSON, RespuestaMsgPack
+
+
+def serie_sintetica(dias):
+    inicio = date.today() - timedelta(days=dias)
+    return {
+        "fechas": [(inicio + timedelta(days=i)).isoformat() for i in range(dias)],
+        "series": {p: [random.uniform(0, 100) for _ in range(dias)] for p in PARAMETROS},
+    }
+
+
+def payload_historico(dias, analisis=False):
+    serie = serie_sintetica(dias)
+
+    async def serie_diaria(usuario_id, periodo):
+        return serie
+
+    async def version_lecturas(usuario_id):
+        return len(serie["fechas"]), None
+
+    # El handler lee la serie desde historico.serie_diaria y el validador del ETag
+    # desde _version_lecturas; aquí se reemplazan para no tocar la base de datos
+    lecturas.serie_diaria = serie_diaria
+    lecturas._version_lecturas = version_lecturas
+    # Starlette atiende la petición con la primera ruta que coincide
+    alcance = {"type": "http", "method": "GET", "path": "/api/lecturas/historico/1/6meses"}
+    handler = next(r.endpoint for r in lecturas.router.routes if r.matches(alcance)[0] == Match.FULL)
+    peticion = Request({"type": "http", "headers": []})
+    respuesta = asyncio.run(handler(peticion, 1, "6meses", max_points=None, formato="full",
+                                    fields=None, analisis=analisis))
+    contenido = orjson.loads(respuesta.body)
+    verificar_historico(contenido, analisis)
+    return contenido
+
+
+def verificar_historico(contenido, analisis):
+    """
+    La ruta debe devolver la tendencia de analitica en el resumen de cada
+    parámetro, y las estadísticas y la media móvil solo con analisis=1.
+    """
+    resumen = contenido.get("resumen") if isinstance(contenido, dict) else None
+    esperadas = ("tendencia", "estadisticas", "media_movil") if analisis else ("tendencia",)
+    faltan = [f"{p}.{c}" for p in lecturas.PARAMETROS_HISTORICO for c in esperadas
+              if c not in (resumen or {}).get(p, {})]
+    if faltan:
+        raise SystemExit(f"/historico/{{id}}/{{periodo}} no devuelve resumen[*]: {', '.join(faltan)}")
+    if not analisis and any("estadisticas" in resumen[p] for p in lecturas.PARAMETROS_HISTORICO):
+        raise SystemExit("/historico/{id}/{periodo} devuelve estadisticas sin analisis=1")
+
+
+def medir(nombre, funcion, repeticiones):
+    funcion()  # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        cuerpo = funcion()
+    ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+    print(f"{nombre:<10} {ms:8.3f} ms  {len(cuerpo) / 1024:8.1f} KB")
+    return ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dias", type=int, default=183)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--analisis", action="store_true", help="incluir estadísticas y media móvil")
+    args = parser.parse_args()
+
+    contenido = payload_historico(args.dias, args.analisis)
+    detalle = " con analisis=1" if args.analisis else ""
+    print(f"Histórico completo de {args.dias} días{detalle}, {args.repeticiones} repeticiones\n")
+
+    base = medir("fastapi", lambda: JSONResponse(jsonable_encoder(contenido)).body, args.repeticiones)
+    rapido = medir("orjson", lambda: RespuestaJSON(contenido).body, args.repeticiones)
+    binario = medir("msgpack", lambda: RespuestaMsgPack(contenido).body, args.repeticiones)
+
+    print(f"\norjson es {base / rapido:.1f}x más rápido; msgpack {base / binario:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
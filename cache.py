@@ -0,0 +1,266 @@
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from models import PARAMETROS
+from rollup import agrupar_filas
+
+
+class CacheLRU:
+    """
+    Cache en memoria con expulsión LRU y vencimiento por TTL, segura entre hilos.
+
+    Las claves son tuplas cuyo primer elemento es el usuario_id, para poder
+    invalidar todas las entradas de un usuario cuando llega una lectura nueva.
+    Cada usuario tiene además una generación: quien calcula un valor la lee
+    antes de consultar la base de datos y la pasa a `set`, así un resultado
+    calculado antes de una invalidación no se guarda después de ella.
+    """
+
+    def __init__(self, capacidad=1000, ttl=300.0):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._por_usuario = {}
+        self._generaciones = {}
+        self._lock = threading.Lock()
+
+        self._aciertos = 0
+        self._fallos = 0
+        self._expulsiones = 0
+        self._vencidas = 0
+        self._invalidaciones = 0
+
+    def generacion(self, usuario_id):
+        with self._lock:
+            return self._generaciones.get(usuario_id, 0)
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self._fallos += 1
+                return None
+            valor, vence_en = entrada
+            if vence_en < time.monotonic():
+                self._quitar(clave)
+                self._vencidas += 1
+                self._fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self._aciertos += 1
+            return valor
+
+    def set(self, clave, valor, generacion=None):
+        usuario_id = clave[0]
+        with self._lock:
+            if generacion is not None and generacion != self._generaciones.get(usuario_id, 0):
+                return False
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+            self._por_usuario.setdefault(usuario_id, set()).add(clave)
+            while len(self._datos) > self.capacidad:
+                antigua, _ = self._datos.popitem(last=False)
+                self._desindexar(antigua)
+                self._expulsiones += 1
+            return True
+
+    def invalidar_usuario(self, usuario_id):
+        with self._lock:
+            self._generaciones[usuario_id] = self._generaciones.get(usuario_id, 0) + 1
+            claves = self._por_usuario.pop(usuario_id, ())
+            for clave in claves:
+                self._datos.pop(clave, None)
+            self._invalidaciones += len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._por_usuario.clear()
+
+    def stats(self):
+        with self._lock:
+            consultas = self._aciertos + self._fallos
+            return {
+                "capacidad": self.capacidad,
+                "ttl_s": self.ttl,
+                "entradas": len(self._datos),
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "tasa_aciertos": round(self._aciertos / consultas, 4) if consultas else 0,
+                "expulsiones": self._expulsiones,
+                "vencidas": self._vencidas,
+                "invalidadas": self._invalidaciones,
+            }
+
+    def _quitar(self, clave):
+        self._datos.pop(clave, None)
+        self._desindexar(clave)
+
+    def _desindexar(self, clave):
+        claves = self._por_usuario.get(clave[0])
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self._por_usuario[clave[0]]
+
+
+class IndiceUltimaLectura(CacheLRU):
+    """
+    Última lectura conocida de cada usuario: {(usuario_id,): (fecha_hora, lectura)}.
+
+    Se llena de forma perezosa desde la base de datos y se actualiza en el
+    camino de escritura. Una escritura solo reemplaza la entrada si ya existe
+    y la lectura nueva es más reciente; si no hay entrada no se puede saber si
+    la lectura es la última (los lotes traen fechas del dispositivo), así que
+    solo se avanza la generación y la próxima consulta va a la base de datos.
+    """
+
+    def registrar(self, usuario_id, fecha_hora, lectura):
+        clave = (usuario_id,)
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self._generaciones[usuario_id] = self._generaciones.get(usuario_id, 0) + 1
+                return
+            (fecha_actual, _), vence_en = entrada
+            if fecha_hora >= fecha_actual:
+                self._datos[clave] = ((fecha_hora, lectura), vence_en)
+                self._datos.move_to_end(clave)
+
+
+class AcumuladosDiarios(CacheLRU):
+    """
+    Conteo y suma por parámetro de las lecturas de un usuario en un día:
+    {(usuario_id, fecha): (total, [suma por parámetro])}.
+
+    El promedio del día se obtiene en O(1). Las entradas se rehidratan desde
+    la base de datos cuando faltan (por ejemplo tras reiniciar) y las
+    escrituras las incrementan; igual que en IndiceUltimaLectura, una
+    escritura sin entrada solo avanza la generación del usuario.
+
+    Como `sumar` no es idempotente, una rehidratación no puede guardarse
+    mientras hay un commit en curso del usuario: podría leer ya las lecturas
+    nuevas y `sumar` las contaría otra vez. `iniciar_escritura` (antes del
+    commit) y `terminar_escritura` (después de `sumar`) delimitan ese tramo
+    y avanzan la generación al entrar y al salir.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._en_curso = {}
+
+    def set(self, clave, valor, generacion=None):
+        with self._lock:
+            if clave[0] in self._en_curso:
+                return False
+        return super().set(clave, valor, generacion)
+
+    def iniciar_escritura(self, usuario_ids):
+        with self._lock:
+            for usuario_id in usuario_ids:
+                self._en_curso[usuario_id] = self._en_curso.get(usuario_id, 0) + 1
+                self._generaciones[usuario_id] = self._generaciones.get(usuario_id, 0) + 1
+
+    def terminar_escritura(self, usuario_ids):
+        with self._lock:
+            for usuario_id in usuario_ids:
+                pendientes = self._en_curso.get(usuario_id, 0) - 1
+                if pendientes > 0:
+                    self._en_curso[usuario_id] = pendientes
+                else:
+                    self._en_curso.pop(usuario_id, None)
+                self._generaciones[usuario_id] = self._generaciones.get(usuario_id, 0) + 1
+
+    def sumar(self, usuario_id, fecha, total, sumas):
+        clave = (usuario_id, fecha)
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self._generaciones[usuario_id] = self._generaciones.get(usuario_id, 0) + 1
+                return
+            (total_actual, sumas_actuales), vence_en = entrada
+            nuevas = [a + b for a, b in zip(sumas_actuales, sumas)]
+            self._datos[clave] = ((total_actual + total, nuevas), vence_en)
+            self._datos.move_to_end(clave)
+
+
+# Respuestas de /api/lecturas/historico/...
+historico = CacheLRU(capacidad=config.CACHE_HISTORICO_TAMANO, ttl=config.CACHE_HISTORICO_TTL)
+
+# Versión de las lecturas de cada usuario: {(usuario_id,): (total, última fecha_hora)}
+versiones_lecturas = CacheLRU(capacidad=config.CACHE_VERSIONES_TAMANO, ttl=config.CACHE_VERSIONES_TTL)
+
+# Respaldo de /api/lecturas/ultima/{usuario_id}
+ultima_lectura = IndiceUltimaLectura(capacidad=config.CACHE_ULTIMA_TAMANO, ttl=config.CACHE_ULTIMA_TTL)
+
+# Promedios del día actual (/promedio-hoy y /promedio con la fecha de hoy)
+acumulados = AcumuladosDiarios(capacidad=config.CACHE_ACUMULADOS_TAMANO, ttl=config.CACHE_ACUMULADOS_TTL)
+
+# Actividad de hoy o la siguiente: {(usuario_id, hoy): fila o () si no hay ninguna}
+siguiente_actividad = CacheLRU(capacidad=config.CACHE_SIGUIENTE_TAMANO, ttl=config.CACHE_SIGUIENTE_TTL)
+
+
+def formatear_ultima_lectura(fila):
+    """Fila (<parámetros>, fecha_hora) con el formato de /api/lecturas/ultima."""
+    lectura = {p: float(v) for p, v in zip(PARAMETROS, fila[:-1])}
+    lectura["fecha_hora"] = fila[-1].isoformat()
+    return lectura
+
+
+def guardando_lecturas(usuario_ids):
+    """
+    Antes del commit de lecturas de estos usuarios. Termina con
+    lecturas_guardadas si el commit se hizo o con guardado_fallido si no.
+    """
+    acumulados.iniciar_escritura(usuario_ids)
+
+
+def lecturas_guardadas(filas):
+    """Actualiza lo que depende de estas lecturas (usuario_id, <parámetros>, fecha_hora) tras un commit."""
+    ultimas = {}
+    for fila in filas:
+        actual = ultimas.get(fila[0])
+        if actual is None or fila[-1] >= actual[-1]:
+            ultimas[fila[0]] = fila
+
+    try:
+        for usuario_id, fila in ultimas.items():
+            historico.invalidar_usuario(usuario_id)
+            versiones_lecturas.invalidar_usuario(usuario_id)
+            ultima_lectura.registrar(usuario_id, fila[-1], formatear_ultima_lectura(fila[1:]))
+
+        for (usuario_id, fecha), agregado in agrupar_filas(filas).items():
+            # agregado = [total, suma, min, max, suma, min, max, ...]
+            acumulados.sumar(usuario_id, fecha, agregado[0], agregado[1::3])
+    finally:
+        acumulados.terminar_escritura(ultimas)
+
+
+def guardado_fallido(usuario_ids, incierto=False):
+    """
+    El commit no se hizo (o no se sabe, con `incierto`): en el segundo caso
+    las lecturas pudieron quedar guardadas y se descarta lo que dependa de ellas.
+    """
+    try:
+        if incierto:
+            for usuario_id in usuario_ids:
+                historico.invalidar_usuario(usuario_id)
+                versiones_lecturas.invalidar_usuario(usuario_id)
+                ultima_lectura.invalidar_usuario(usuario_id)
+                acumulados.invalidar_usuario(usuario_id)
+    finally:
+        acumulados.terminar_escritura(usuario_ids)
+
+
+def actividades_modificadas(usuario_ids):
+    """Invalida lo que depende de las actividades de estos usuarios tras un commit."""
+    for usuario_id in usuario_ids:
+        siguiente_actividad.invalidar_usuario(usuario_id)
+
+
+def promedios_acumulados(total, sumas):
+    """Promedios redondeados a 2 decimales a partir de un acumulado."""
+    return {p: round(suma / total, 2) if total else 0 for p, suma in zip(PARAMETROS, sumas)}
@@ -0,0 +1,186 @@
+"""
+Compresión de respuestas según Accept-Encoding.
+
+Middleware ASGI que comprime con brotli (si el paquete está instalado y el
+cliente lo acepta) o con gzip las respuestas que superan un umbral de bytes.
+Las rutas pequeñas y muy consultadas (/api/health, /api/lecturas/ultima) se
+excluyen por prefijo para no gastar CPU en ellas. Las respuestas en streaming
+se acumulan hasta alcanzar el umbral y a partir de ahí se comprimen por
+fragmentos.
+"""
+import gzip
+import zlib
+
+import config
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se ofrece gzip
+    brotli = None
+
+
+def codificaciones_aceptadas(accept_encoding):
+    """{codificación: calidad} del encabezado Accept-Encoding."""
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        clave, _, valor = parametros.strip().partition("=")
+        if clave == "q":
+            try:
+                calidad = float(valor)
+            except ValueError:
+                calidad = 0.0
+        if nombre:
+            aceptadas[nombre.strip().lower()] = calidad
+    return aceptadas
+
+
+def elegir_codificacion(accept_encoding, brotli_activo=True):
+    """"br", "gzip" o None según lo que acepta el cliente y lo disponible."""
+    if not accept_encoding:
+        return None
+    aceptadas = codificaciones_aceptadas(accept_encoding)
+    comodin = aceptadas.get("*", 0.0)
+    q_br = aceptadas.get("br", comodin) if brotli_activo and brotli is not None else 0.0
+    q_gzip = aceptadas.get("gzip", comodin)
+    if q_br > 0 and q_br >= q_gzip:
+        return "br"
+    if q_gzip > 0:
+        return "gzip"
+    return None
+
+
+class _Compresor:
+    def __init__(self, codificacion, nivel_gzip, nivel_brotli):
+        if codificacion == "br":
+            self._objeto = brotli.Compressor(quality=nivel_brotli)
+            self._comprimir, self._terminar = self._objeto.process, self._objeto.finish
+        else:
+            # wbits 16 + MAX_WBITS produce el formato gzip con cabecera y CRC
+            self._objeto = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._comprimir, self._terminar = self._objeto.compress, self._objeto.flush
+
+    def comprimir(self, datos):
+        return self._comprimir(datos)
+
+    def terminar(self):
+        return self._terminar()
+
+
+def comprimir(datos, codificacion, nivel_gzip, nivel_brotli):
+    """Cuerpo completo comprimido de una sola vez."""
+    if codificacion == "br":
+        return brotli.compress(datos, quality=nivel_brotli)
+    return gzip.compress(datos, compresslevel=nivel_gzip, mtime=0)
+
+
+class CompresionMiddleware:
+    def __init__(self, app, minimo=None, nivel_gzip=None, nivel_brotli=None,
+                 brotli_activo=None, excluir=None):
+        self.app = app
+        self.minimo = config.COMPRESION_MINIMO if minimo is None else minimo
+        self.nivel_gzip = config.COMPRESION_NIVEL_GZIP if nivel_gzip is None else nivel_gzip
+        self.nivel_brotli = config.COMPRESION_NIVEL_BROTLI if nivel_brotli is None else nivel_brotli
+        self.brotli_activo = config.COMPRESION_BROTLI if brotli_activo is None else brotli_activo
+        self.excluir = tuple(config.COMPRESION_EXCLUIR if excluir is None else excluir)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluir):
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for clave, valor in scope["headers"]:
+            if clave == b"accept-encoding":
+                accept_encoding = valor.decode("latin-1")
+                break
+        codificacion = elegir_codificacion(accept_encoding, self.brotli_activo)
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _RespuestaComprimida(self, codificacion, send).atender(scope, receive)
+
+
+class _RespuestaComprimida:
+    """Estado de una respuesta mientras se decide si se comprime."""
+
+    def __init__(self, middleware, codificacion, send):
+        self.middleware = middleware
+        self.codificacion = codificacion
+        self.send = send
+        self.inicio = None
+        self.pendiente = []
+        self.tamano = 0
+        self.compresor = None
+        self.omitir = False
+
+    async def atender(self, scope, receive):
+        await self.middleware.app(scope, receive, self.enviar)
+
+    async def enviar(self, mensaje):
+        if mensaje["type"] == "http.response.start":
+            encabezados = dict(mensaje.get("headers", []))
+            # Ya comprimida (o sin cuerpo que comprimir): se deja pasar tal cual
+            self.omitir = b"content-encoding" in encabezados or mensaje["status"] in (204, 304)
+            self.inicio = mensaje
+            if self.omitir:
+                await self.send(mensaje)
+            return
+
+        if mensaje["type"] != "http.response.body" or self.omitir:
+            await self.send(mensaje)
+            return
+
+        cuerpo = mensaje.get("body", b"")
+        mas = mensaje.get("more_body", False)
+
+        if self.compresor is not None:
+            datos = self.compresor.comprimir(cuerpo)
+            if not mas:
+                datos += self.compresor.terminar()
+            if datos or not mas:
+                await self.send({"type": "http.response.body", "body": datos, "more_body": mas})
+            return
+
+        self.pendiente.append(cuerpo)
+        self.tamano += len(cuerpo)
+        m = self.middleware
+
+        if self.tamano < m.minimo:
+            if mas:
+                return
+            # Terminó por debajo del umbral: se envía sin comprimir
+            await self._enviar_inicio(self._encabezados(comprimido=False))
+            await self.send({"type": "http.response.body", "body": b"".join(self.pendiente)})
+            return
+
+        acumulado = b"".join(self.pendiente)
+        self.pendiente = []
+        if not mas:
+            datos = comprimir(acumulado, self.codificacion, m.nivel_gzip, m.nivel_brotli)
+            await self._enviar_inicio(self._encabezados(comprimido=True, largo=len(datos)))
+            await self.send({"type": "http.response.body", "body": datos})
+            return
+
+        self.compresor = _Compresor(self.codificacion, m.nivel_gzip, m.nivel_brotli)
+        await self._enviar_inicio(self._encabezados(comprimido=True))
+        await self.send({"type": "http.response.body", "body": self.compresor.comprimir(acumulado),
+                         "more_body": True})
+
+    def _encabezados(self, comprimido, largo=None):
+        encabezados = [(k, v) for k, v in self.inicio.get("headers", [])
+                       if not (comprimido and k == b"content-length")]
+        vary = [v for k, v in encabezados if k == b"vary"]
+        if not any(b"accept-encoding" in v.lower() for v in vary):
+            encabezados = [(k, v) for k, v in encabezados if k != b"vary"]
+            encabezados.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        if comprimido:
+            encabezados.append((b"content-encoding", self.codificacion.encode("latin-1")))
+            if largo is not None:
+                encabezados.append((b"content-length", str(largo).encode("latin-1")))
+        return encabezados
+
+    async def _enviar_inicio(self, encabezados):
+        await self.send({**self.inicio, "headers": encabezados})
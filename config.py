@@ -18,4 +18,108 @@ try:
 except Exception as e:
     print("Error de conexión:", e)
 
-"""
\ No newline at end of file
+"""
+import os
+
+# ----------------- POOL DE CONEXIONES -----------------
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Segundos que una petición espera por una conexión libre
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Segundos de vida máxima de una conexión antes de reciclarla
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+# Segundos sin uso tras los cuales se verifica la conexión al prestarla
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+
+# ----------------- EJECUTOR DE BASE DE DATOS -----------------
+# Consultas bloqueantes que un worker puede tener en paralelo
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", str(DB_POOL_MAX)))
+
+# ----------------- INGESTA DE LECTURAS -----------------
+# Máximo de lecturas aceptadas en una sola petición a /api/lecturas/batch
+LECTURAS_BATCH_MAX = int(os.getenv("LECTURAS_BATCH_MAX", "5000"))
+# Modo de POST /api/lecturas:
+#   "directo"    escribe en la base de datos antes de responder (comportamiento original)
+#   "confirmado" encola y responde cuando el lote que la contiene se confirmó (group commit)
+#   "diferido"   encola y responde de inmediato; se escribe dentro de la ventana de latencia
+INGESTA_MODO = os.getenv("INGESTA_MODO", "directo")
+# Lecturas que admite el buffer antes de aplicar contrapresión
+INGESTA_CAPACIDAD = int(os.getenv("INGESTA_CAPACIDAD", "10000"))
+# Se escribe un lote al llegar a este tamaño...
+INGESTA_TAMANO_LOTE = int(os.getenv("INGESTA_TAMANO_LOTE", "500"))
+# ...o cuando la lectura más antigua del lote lleva esta espera
+INGESTA_VENTANA_MS = float(os.getenv("INGESTA_VENTANA_MS", "200"))
+# Segundos que una petición espera por espacio en un buffer lleno antes de recibir 503
+INGESTA_ESPERA_MAX = float(os.getenv("INGESTA_ESPERA_MAX", "2"))
+# Reintentos de escritura de un lote antes de descartarlo
+INGESTA_REINTENTOS = int(os.getenv("INGESTA_REINTENTOS", "3"))
+
+# ----------------- RESUMEN DIARIO -----------------
+# Mantener lecturas_diarias al guardar lecturas y leer los históricos desde ella.
+# Crear la tabla (python migrar.py aplicar) y hacer el backfill (python rollup.py --backfill) antes de activarlo.
+ROLLUP_DIARIO = os.getenv("ROLLUP_DIARIO", "0") == "1"
+
+# ----------------- CACHÉ DE HISTÓRICOS -----------------
+CACHE_HISTORICO_TAMANO = int(os.getenv("CACHE_HISTORICO_TAMANO", "1000"))
+# Segundos de vida de una respuesta; acota el desfase entre workers y el cambio de día
+CACHE_HISTORICO_TTL = float(os.getenv("CACHE_HISTORICO_TTL", "300"))
+# Versión de las lecturas de cada usuario, validador del ETag de los históricos
+CACHE_VERSIONES_TAMANO = int(os.getenv("CACHE_VERSIONES_TAMANO", "10000"))
+CACHE_VERSIONES_TTL = float(os.getenv("CACHE_VERSIONES_TTL", str(CACHE_HISTORICO_TTL)))
+
+# ----------------- ÍNDICE DE ÚLTIMA LECTURA -----------------
+CACHE_ULTIMA_TAMANO = int(os.getenv("CACHE_ULTIMA_TAMANO", "10000"))
+# Con varios workers, cada uno ve las escrituras de los demás como mucho tras este TTL
+CACHE_ULTIMA_TTL = float(os.getenv("CACHE_ULTIMA_TTL", "60"))
+
+# ----------------- ACUMULADOS DEL DÍA -----------------
+CACHE_ACUMULADOS_TAMANO = int(os.getenv("CACHE_ACUMULADOS_TAMANO", "10000"))
+CACHE_ACUMULADOS_TTL = float(os.getenv("CACHE_ACUMULADOS_TTL", "60"))
+
+# ----------------- ACTIVIDAD DE HOY O LA SIGUIENTE -----------------
+CACHE_SIGUIENTE_TAMANO = int(os.getenv("CACHE_SIGUIENTE_TAMANO", "10000"))
+# Los endpoints de actividades invalidan el puntero; el TTL cubre las escrituras de otros workers
+CACHE_SIGUIENTE_TTL = float(os.getenv("CACHE_SIGUIENTE_TTL", "300"))
+
+# ----------------- SERIES POR RANGO -----------------
+# Máximo de puntos (intervalos o lecturas crudas) que devuelve /api/lecturas/series
+SERIES_MAX_PUNTOS = int(os.getenv("SERIES_MAX_PUNTOS", "5000"))
+
+# ----------------- COMPRESIÓN DE RESPUESTAS -----------------
+# Solo se comprimen las respuestas de al menos estos bytes
+COMPRESION_MINIMO = int(os.getenv("COMPRESION_MINIMO", "1024"))
+COMPRESION_NIVEL_GZIP = int(os.getenv("COMPRESION_NIVEL_GZIP", "6"))
+COMPRESION_NIVEL_BROTLI = int(os.getenv("COMPRESION_NIVEL_BROTLI", "4"))
+# brotli se ofrece solo si además está instalado el paquete `brotli`
+COMPRESION_BROTLI = os.getenv("COMPRESION_BROTLI", "1") == "1"
+# Prefijos de ruta que nunca se comprimen (respuestas pequeñas y muy frecuentes)
+COMPRESION_EXCLUIR = [
+    p.strip() for p in os.getenv("COMPRESION_EXCLUIR", "/api/health,/api/lecturas/ultima").split(",")
+    if p.strip()
+]
+
+# ----------------- LECTURAS DE VARIOS USUARIOS -----------------
+# Máximo de usuario_id por petición a /bulk/ultima y /bulk/promedio-hoy
+BULK_MAX_USUARIOS = int(os.getenv("BULK_MAX_USUARIOS", "1000"))
+
+# ----------------- ACTIVIDADES -----------------
+# Máximo de operaciones por petición a /api/actividades/bulk
+ACTIVIDADES_BULK_MAX = int(os.getenv("ACTIVIDADES_BULK_MAX", "2000"))
+# Incluir las ocurrencias de actividades recurrentes en el listado por mes y en /hoy
+# y habilitar /api/actividades/recurrentes.
+# Crear las tablas (python migrar.py aplicar) antes de activarlo.
+RECURRENCIAS = os.getenv("RECURRENCIAS", "0") == "1"
+# Actividades por página en /api/actividades/rango
+ACTIVIDADES_PAGINA = int(os.getenv("ACTIVIDADES_PAGINA", "500"))
+ACTIVIDADES_PAGINA_MAX = int(os.getenv("ACTIVIDADES_PAGINA_MAX", "2000"))
+
+# ----------------- EXPORTACIÓN DE LECTURAS -----------------
+# Filas por fetchmany; acota la memoria de cada descarga
+EXPORTACION_TAMANO_LOTE = int(os.getenv("EXPORTACION_TAMANO_LOTE", "2000"))
+# Cada exportación retiene una conexión del pool mientras dura
+EXPORTACION_MAX_SIMULTANEAS = int(os.getenv("EXPORTACION_MAX_SIMULTANEAS", "2"))
+
+# ----------------- GET CONDICIONAL -----------------
+# Cache-Control de las lecturas con ETag: el cliente guarda la respuesta pero
+# la revalida (If-None-Match) en cada uso
+CACHE_CONTROL_DATOS = os.getenv("CACHE_CONTROL_DATOS", "private, no-cache")
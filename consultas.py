@@ -0,0 +1,388 @@
+"""
+Catálogo de sentencias SQL de la API.
+
+Cada sentencia tiene un nombre y solo usa marcadores %s para los valores:
+ninguna fecha ni expresión se pega en el texto, y los rangos de fechas se
+escriben como columna >= %s AND columna < %s para que SQL Server pueda
+buscar en los índices. `ejecutar` las envía con sp_executesql, así el
+servidor ve siempre el mismo texto con parámetros tipados y reutiliza un
+único plan por sentencia en lugar de compilar uno por cada valor.
+
+El catálogo lleva además cuántas veces se ejecutó cada sentencia, cuánto
+tardó y cuántas fallaron (ver /api/metricas).
+"""
+import threading
+import time
+from datetime import date, datetime
+
+from models import PARAMETROS
+
+_INT_MIN, _INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def _tipo_sql(valor):
+    """Tipo de la declaración de sp_executesql según el valor de Python."""
+    if isinstance(valor, bool):
+        return "BIT"
+    if isinstance(valor, int):
+        return "INT" if _INT_MIN <= valor <= _INT_MAX else "BIGINT"
+    if isinstance(valor, float):
+        return "FLOAT"
+    if isinstance(valor, datetime):
+        return "DATETIME"
+    if isinstance(valor, date):
+        return "DATE"
+    if isinstance(valor, (bytes, bytearray)):
+        return "VARBINARY(MAX)"
+    if valor is None:
+        # NULL sin tipo: NVARCHAR se convierte implícitamente a fechas, números y
+        # bit; un INT NULL en una columna DATE da "Operand type clash"
+        return "NVARCHAR(1)"
+    return "NVARCHAR(MAX)" if len(str(valor)) > 4000 else "NVARCHAR(4000)"
+
+
+def parametrizar(sql, params):
+    """
+    Convierte (sql con %s, params) en la llamada equivalente a sp_executesql:
+    cada %s pasa a ser @p0, @p1... con su tipo declarado.
+    """
+    partes = sql.split("%s")
+    if len(partes) - 1 != len(params):
+        raise ValueError(f"La sentencia espera {len(partes) - 1} parámetros y recibió {len(params)}")
+    if not params:
+        return sql, ()
+
+    texto = partes[0] + "".join(f"@p{i}{parte}" for i, parte in enumerate(partes[1:]))
+    declaracion = ", ".join(f"@p{i} {_tipo_sql(v)}" for i, v in enumerate(params))
+    asignaciones = ", ".join(f"@p{i} = %s" for i in range(len(params)))
+    return f"EXEC sp_executesql %s, %s, {asignaciones}", (texto, declaracion, *params)
+
+
+class Catalogo:
+    def __init__(self):
+        self._sentencias = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nombre, sql):
+        if nombre in self._sentencias:
+            raise ValueError(f"Sentencia duplicada en el catálogo: {nombre}")
+        self._sentencias[nombre] = sql
+        return nombre
+
+    def sql(self, nombre):
+        return self._sentencias[nombre]
+
+    def ejecutar(self, cursor, nombre, params=(), sql=None):
+        """
+        Ejecuta la sentencia `nombre` en el cursor. Las sentencias que se arman
+        según la petición (lotes, columnas elegidas) pasan su texto en `sql` y
+        se contabilizan bajo `nombre`.
+        """
+        texto, valores = parametrizar(sql if sql is not None else self._sentencias[nombre], tuple(params))
+        inicio = time.perf_counter()
+        ok = False
+        try:
+            cursor.execute(texto, valores)
+            ok = True
+        finally:
+            self._anotar(nombre, (time.perf_counter() - inicio) * 1000, ok)
+
+    def _anotar(self, nombre, ms, ok):
+        with self._lock:
+            stats = self._stats.get(nombre)
+            if stats is None:
+                stats = self._stats[nombre] = {"ejecuciones": 0, "errores": 0, "total_ms": 0.0, "max_ms": 0.0}
+            stats["ejecuciones"] += 1
+            stats["errores"] += not ok
+            stats["total_ms"] += ms
+            if ms > stats["max_ms"]:
+                stats["max_ms"] = ms
+
+    def stats(self):
+        with self._lock:
+            return {
+                nombre: {
+                    "ejecuciones": s["ejecuciones"],
+                    "errores": s["errores"],
+                    "total_ms": round(s["total_ms"], 2),
+                    "promedio_ms": round(s["total_ms"] / s["ejecuciones"], 2),
+                    "max_ms": round(s["max_ms"], 2),
+                }
+                for nombre, s in sorted(self._stats.items())
+            }
+
+
+catalogo = Catalogo()
+registrar = catalogo.registrar
+sql = catalogo.sql
+ejecutar = catalogo.ejecutar
+stats = catalogo.stats
+
+
+# ----------------- LECTURAS -----------------
+ULTIMA_LECTURA = registrar("ultima_lectura", """
+    SELECT TOP 1 nitrogeno, fosforo, potasio, ph, humedad, temperatura, luz_solar, fecha_hora
+    FROM lecturas
+    WHERE usuario_id = %s
+    ORDER BY fecha_hora DESC
+""")
+
+# Total y suma por parámetro de un día: (usuario_id, fecha) / (usuario_id, desde, hasta)
+ACUMULADO_DIA_RESUMEN = registrar("acumulado_dia_resumen", f"""
+    SELECT total, {", ".join(f"suma_{p}" for p in PARAMETROS)}
+    FROM lecturas_diarias
+    WHERE usuario_id = %s AND fecha = %s
+""")
+ACUMULADO_DIA_LECTURAS = registrar("acumulado_dia_lecturas", f"""
+    SELECT COUNT(*), {", ".join(f"SUM(CAST({p} AS FLOAT))" for p in PARAMETROS)}
+    FROM lecturas
+    WHERE usuario_id = %s AND fecha_hora >= %s AND fecha_hora < %s
+""")
+
+PROMEDIO_RANGO = registrar("promedio_rango", f"""
+    SELECT {", ".join(f"AVG(CAST({p} AS FLOAT))" for p in PARAMETROS)}
+    FROM lecturas
+    WHERE usuario_id = %s AND fecha_hora >= %s AND fecha_hora < %s
+""")
+
+# Promedio diario de todos los parámetros desde una fecha: (usuario_id, desde)
+SERIE_DIARIA_RESUMEN = registrar("serie_diaria_resumen", f"""
+    SELECT fecha, {", ".join(f"suma_{p} / total" for p in PARAMETROS)}
+    FROM lecturas_diarias
+    WHERE usuario_id = %s AND fecha >= %s
+    ORDER BY fecha
+""")
+SERIE_DIARIA_LECTURAS = registrar("serie_diaria_lecturas", f"""
+    SELECT CAST(fecha_hora AS DATE) as fecha, {", ".join(f"AVG(CAST({p} AS FLOAT))" for p in PARAMETROS)}
+    FROM lecturas
+    WHERE usuario_id = %s AND fecha_hora >= %s
+    GROUP BY CAST(fecha_hora AS DATE)
+    ORDER BY CAST(fecha_hora AS DATE)
+""")
+
+# Validador de los históricos: (total de lecturas, última fecha_hora) del usuario
+VERSION_LECTURAS_RESUMEN = registrar("version_lecturas_resumen", """
+    SELECT (SELECT SUM(total) FROM lecturas_diarias WHERE usuario_id = %s),
+           (SELECT MAX(fecha_hora) FROM lecturas WHERE usuario_id = %s)
+""")
+VERSION_LECTURAS = registrar("version_lecturas", """
+    SELECT COUNT_BIG(*), MAX(fecha_hora) FROM lecturas WHERE usuario_id = %s
+""")
+
+# Sentencias que se arman por petición; se registran para las métricas
+INSERTAR_LECTURAS = "insertar_lecturas"
+ROLLUP_MERGE = "rollup_merge"
+SERIES = "series"
+EXPORTAR_LECTURAS = "exportar_lecturas"
+DASHBOARD = "dashboard"
+
+# ----------------- LECTURAS DE VARIOS USUARIOS -----------------
+# Los usuario_id viajan como un único texto "1,2,3": el texto de la sentencia
+# (y su plan) no cambia con la cantidad de usuarios
+_USUARIOS = "SELECT DISTINCT CAST(value AS INT) AS usuario_id FROM STRING_SPLIT(%s, ',')"
+
+
+def lista_ids(ids):
+    """Parámetro de las sentencias que reciben varios ids como texto separado por comas."""
+    return ",".join(str(int(i)) for i in ids)
+
+
+# Una búsqueda TOP 1 por usuario en el índice (usuario_id, fecha_hora DESC):
+# a diferencia de ROW_NUMBER() OVER (PARTITION BY usuario_id), no lee el resto
+# de las lecturas de cada usuario
+ULTIMA_LECTURA_VARIOS = registrar("ultima_lectura_varios", f"""
+    SELECT u.usuario_id, {", ".join(f"l.{p}" for p in PARAMETROS)}, l.fecha_hora
+    FROM ({_USUARIOS}) u
+    CROSS APPLY (
+        SELECT TOP 1 {", ".join(PARAMETROS)}, fecha_hora
+        FROM lecturas
+        WHERE lecturas.usuario_id = u.usuario_id
+        ORDER BY fecha_hora DESC
+    ) l
+""")
+
+# (usuario_ids, fecha) / (usuario_ids, desde, hasta); los usuarios sin lecturas no traen fila
+ACUMULADO_DIA_RESUMEN_VARIOS = registrar("acumulado_dia_resumen_varios", f"""
+    SELECT usuario_id, total, {", ".join(f"suma_{p}" for p in PARAMETROS)}
+    FROM lecturas_diarias
+    WHERE usuario_id IN ({_USUARIOS}) AND fecha = %s
+""")
+ACUMULADO_DIA_LECTURAS_VARIOS = registrar("acumulado_dia_lecturas_varios", f"""
+    SELECT usuario_id, COUNT(*), {", ".join(f"SUM(CAST({p} AS FLOAT))" for p in PARAMETROS)}
+    FROM lecturas
+    WHERE usuario_id IN ({_USUARIOS}) AND fecha_hora >= %s AND fecha_hora < %s
+    GROUP BY usuario_id
+""")
+
+# ----------------- ACTIVIDADES -----------------
+ACTIVIDADES_RANGO = registrar("actividades_rango", """
+    SELECT id, fecha, titulo, completada
+    FROM actividades
+    WHERE usuario_id = %s
+    AND fecha >= %s AND fecha < %s
+    ORDER BY fecha
+""")
+
+# Página de un rango en orden (fecha, id), desde la clave de la última fila
+# entregada: (limite, usuario_id, desde, hasta, fecha_cursor, fecha_cursor,
+# id_cursor, completada, completada). En la primera página el cursor es
+# (desde, -1); completada NULL no filtra.
+ACTIVIDADES_PAGINA = registrar("actividades_pagina", """
+    SELECT TOP (%s) id, fecha, titulo, completada
+    FROM actividades
+    WHERE usuario_id = %s
+    AND fecha >= %s AND fecha < %s
+    AND (fecha > %s OR (fecha = %s AND id > %s))
+    AND (%s IS NULL OR completada = %s)
+    ORDER BY fecha, id
+""")
+
+# Validador del listado por mes: una alta o un cambio sube el rowversion máximo
+# del rango y una baja cambia el conteo (migración 0006)
+VERSION_ACTIVIDADES_RANGO = registrar("version_actividades_rango", """
+    SELECT COUNT(*), MAX(version_fila)
+    FROM actividades
+    WHERE usuario_id = %s
+    AND fecha >= %s AND fecha < %s
+""")
+
+# Primera actividad desde el inicio de `hoy`: la de hoy si existe, si no la siguiente
+HOY_O_SIGUIENTE = registrar("hoy_o_siguiente", """
+    SELECT TOP 1 id, fecha, titulo, completada
+    FROM actividades
+    WHERE usuario_id = %s AND fecha >= %s
+    ORDER BY fecha
+""")
+
+# Las escrituras por id devuelven el usuario_id para invalidar su caché
+COMPLETAR_ACTIVIDAD = registrar("completar_actividad", """
+    UPDATE actividades SET completada = 1 OUTPUT INSERTED.usuario_id WHERE id = %s
+""")
+
+ACTUALIZAR_ACTIVIDAD = registrar("actualizar_actividad", """
+    UPDATE actividades
+    SET titulo = %s, fecha = %s, completada = %s
+    OUTPUT INSERTED.usuario_id
+    WHERE id = %s
+""")
+
+INSERTAR_ACTIVIDAD = registrar("insertar_actividad", """
+    INSERT INTO actividades (usuario_id, titulo, fecha, completada)
+    OUTPUT INSERTED.id
+    VALUES (%s, %s, %s, %s)
+""")
+
+BORRAR_ACTIVIDAD = registrar("borrar_actividad", """
+    DELETE FROM actividades OUTPUT DELETED.usuario_id WHERE id = %s
+""")
+
+# Lote de /api/actividades/bulk: las OUTPUT devuelven los ids que existían
+COMPLETAR_ACTIVIDADES = registrar("completar_actividades", """
+    UPDATE actividades SET completada = 1
+    OUTPUT INSERTED.id, INSERTED.usuario_id
+    WHERE id IN (SELECT CAST(value AS INT) FROM STRING_SPLIT(%s, ','))
+""")
+
+BORRAR_ACTIVIDADES = registrar("borrar_actividades", """
+    DELETE FROM actividades
+    OUTPUT DELETED.id, DELETED.usuario_id
+    WHERE id IN (SELECT CAST(value AS INT) FROM STRING_SPLIT(%s, ','))
+""")
+
+# Se arman según el tamaño del lote
+CREAR_ACTIVIDADES = "crear_actividades"
+MODIFICAR_ACTIVIDADES = "modificar_actividades"
+
+# ----------------- ACTIVIDADES RECURRENTES -----------------
+# Reglas con ocurrencias posibles en [desde, hasta) o con alguna ocurrencia
+# movida a esa ventana: (usuario_id, hasta, desde, desde, hasta)
+RECURRENCIAS_VENTANA = registrar("recurrencias_ventana", """
+    SELECT id, usuario_id, titulo, inicio, frecuencia, intervalo, hasta, repeticiones
+    FROM actividades_recurrentes r
+    WHERE usuario_id = %s
+    AND (
+        (inicio < %s AND (hasta IS NULL OR hasta >= %s))
+        OR EXISTS (
+            SELECT 1 FROM actividades_excepciones e
+            WHERE e.recurrencia_id = r.id AND e.nueva_fecha >= %s AND e.nueva_fecha < %s
+        )
+    )
+""")
+
+# Excepciones cuya fecha original o nueva cae en [desde, hasta): (usuario_id, desde, hasta, desde, hasta)
+EXCEPCIONES_VENTANA = registrar("excepciones_ventana", """
+    SELECT e.recurrencia_id, e.fecha, e.nueva_fecha, e.completada, e.cancelada
+    FROM actividades_excepciones e
+    JOIN actividades_recurrentes r ON r.id = e.recurrencia_id
+    WHERE r.usuario_id = %s
+    AND ((e.fecha >= %s AND e.fecha < %s) OR (e.nueva_fecha >= %s AND e.nueva_fecha < %s))
+""")
+
+# Validador de los listados (migración 0007): las altas y cambios de reglas o
+# excepciones suben su rowversion máximo y una regla borrada cambia el conteo;
+# las excepciones solo se borran en cascada con su regla
+VERSION_RECURRENCIAS = registrar("version_recurrencias", """
+    SELECT COUNT(*),
+           MAX(version_fila),
+           (SELECT MAX(e.version_fila)
+            FROM actividades_excepciones e
+            JOIN actividades_recurrentes r ON r.id = e.recurrencia_id
+            WHERE r.usuario_id = %s)
+    FROM actividades_recurrentes
+    WHERE usuario_id = %s
+""")
+
+RECURRENCIAS_USUARIO = registrar("recurrencias_usuario", """
+    SELECT id, usuario_id, titulo, inicio, frecuencia, intervalo, hasta, repeticiones
+    FROM actividades_recurrentes
+    WHERE usuario_id = %s
+    ORDER BY inicio, id
+""")
+
+INSERTAR_RECURRENCIA = registrar("insertar_recurrencia", """
+    INSERT INTO actividades_recurrentes (usuario_id, titulo, inicio, frecuencia, intervalo, hasta, repeticiones)
+    OUTPUT INSERTED.id
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+""")
+
+# Las excepciones se borran en cascada
+BORRAR_RECURRENCIA = registrar("borrar_recurrencia", """
+    DELETE FROM actividades_recurrentes OUTPUT DELETED.usuario_id WHERE id = %s
+""")
+
+# Regla y excepción actual de una ocurrencia: (fecha, recurrencia_id)
+RECURRENCIA_Y_EXCEPCION = registrar("recurrencia_y_excepcion", """
+    SELECT r.id, r.usuario_id, r.titulo, r.inicio, r.frecuencia, r.intervalo, r.hasta, r.repeticiones,
+           e.nueva_fecha, e.completada, e.cancelada
+    FROM actividades_recurrentes r
+    LEFT JOIN actividades_excepciones e ON e.recurrencia_id = r.id AND e.fecha = %s
+    WHERE r.id = %s
+""")
+
+# (recurrencia_id, fecha, nueva_fecha, completada, cancelada)
+GUARDAR_EXCEPCION = registrar("guardar_excepcion", """
+    MERGE actividades_excepciones AS e
+    USING (VALUES (%s, %s, %s, %s, %s)) AS s (recurrencia_id, fecha, nueva_fecha, completada, cancelada)
+    ON e.recurrencia_id = s.recurrencia_id AND e.fecha = s.fecha
+    WHEN MATCHED THEN
+        UPDATE SET nueva_fecha = s.nueva_fecha, completada = s.completada, cancelada = s.cancelada
+    WHEN NOT MATCHED THEN
+        INSERT (recurrencia_id, fecha, nueva_fecha, completada, cancelada)
+        VALUES (s.recurrencia_id, s.fecha, s.nueva_fecha, s.completada, s.cancelada);
+""")
+
+# ----------------- USUARIOS -----------------
+USUARIO_EXISTE = registrar("usuario_existe", """
+    SELECT COUNT(*) FROM usuarios WHERE username = %s OR email = %s
+""")
+
+INSERTAR_USUARIO = registrar("insertar_usuario", """
+    INSERT INTO usuarios (username, email, password, telefono)
+    VALUES (%s, %s, %s, %s)
+""")
+
+CREDENCIALES = registrar("credenciales", """
+    SELECT id, username, email FROM usuarios
+    WHERE (username = %s OR email = %s) AND password = %s
+""")
@@ -1,6 +1,11 @@
 import pymssql
+from contextlib import contextmanager
 from fastapi import HTTPException
 
+import config
+from db_executor import DBExecutor
+from db_pool import ConnectionPool, PoolAgotadoError
+
 def get_db_connection():
     try:
         conn = pymssql.connect(
@@ -17,3 +22,43 @@ def get_db_connection():
     except Exception as e:
         print(f"❌ Error conectando a la base de datos: {e}")
         raise HTTPException(status_code=500, detail=f"Error de conexión a la base de datos: {str(e)}")
+
+
+# ----------------- POOL DE CONEXIONES -----------------
+pool = ConnectionPool(
+    get_db_connection,
+    min_size=config.DB_POOL_MIN,
+    max_size=config.DB_POOL_MAX,
+    timeout=config.DB_POOL_TIMEOUT,
+    max_lifetime=config.DB_POOL_MAX_LIFETIME,
+    health_check_after=config.DB_POOL_HEALTH_CHECK_AFTER,
+)
+
+@contextmanager
+def db_connection():
+    """
+    Presta una conexión del pool durante el bloque `with`.
+    No llamar conn.close(): la conexión vuelve al pool al salir.
+    """
+    try:
+        with pool.connection() as conn:
+            yield conn
+    except PoolAgotadoError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def pool_stats():
+    return pool.stats()
+
+
+# ----------------- EJECUTOR ASÍNCRONO -----------------
+executor = DBExecutor(max_concurrency=config.DB_MAX_CONCURRENCY)
+
+async def run_db(func, *args, **kwargs):
+    """
+    Ejecuta `func` (código bloqueante con pymssql) en el ejecutor de base de
+    datos y espera su resultado sin bloquear el event loop.
+    """
+    return await executor.run(func, *args, **kwargs)
+
+def executor_stats():
+    return executor.stats()
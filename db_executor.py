@@ -0,0 +1,60 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DBExecutor:
+    """
+    Ejecuta el trabajo bloqueante de base de datos en un pool de hilos acotado,
+    para que los handlers `async def` no bloqueen el event loop.
+
+    `max_concurrency` es el número máximo de consultas en paralelo por worker;
+    conviene que no supere el tamaño máximo del pool de conexiones.
+    """
+
+    def __init__(self, max_concurrency=10):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency debe ser >= 1")
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="db")
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._en_curso = 0
+        self._completadas = 0
+        self._fallidas = 0
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._pendientes += 1
+        return await loop.run_in_executor(self._executor, functools.partial(self._ejecutar, func, *args, **kwargs))
+
+    def _ejecutar(self, func, *args, **kwargs):
+        with self._lock:
+            self._pendientes -= 1
+            self._en_curso += 1
+        try:
+            resultado = func(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._fallidas += 1
+            raise
+        finally:
+            with self._lock:
+                self._en_curso -= 1
+                self._completadas += 1
+        return resultado
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrencia": self.max_concurrency,
+                "en_curso": self._en_curso,
+                "en_cola": self._pendientes,
+                "completadas": self._completadas,
+                "fallidas": self._fallidas,
+            }
@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolAgotadoError(Exception):
+    """No se consiguió una conexión libre dentro del tiempo de espera."""
+
+
+class _ConexionPool:
+    """Conexión física junto con los datos que el pool necesita para reciclarla."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.creada_en = time.monotonic()
+        self.usada_en = self.creada_en
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones seguro entre hilos.
+
+    - Mantiene entre `min_size` y `max_size` conexiones abiertas.
+    - Verifica la conexión al prestarla si lleva más de `health_check_after`
+      segundos sin usarse.
+    - Recicla las conexiones con más de `max_lifetime` segundos de vida y las
+      que fallaron durante su uso.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, timeout=10.0,
+                 max_lifetime=1800.0, health_check_after=30.0,
+                 health_check_sql="SELECT 1"):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Tamaños de pool inválidos")
+
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.health_check_sql = health_check_sql
+
+        self._libres = deque()
+        self._en_uso = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        # Estadísticas para monitoreo
+        self._creadas = 0
+        self._cerradas = 0
+        self._prestamos = 0
+        self._esperas = 0
+        self._tiempo_espera_total = 0.0
+        self._tiempo_espera_max = 0.0
+        self._fallos_verificacion = 0
+        self._timeouts = 0
+
+    # ----------------- CICLO DE VIDA -----------------
+    def open(self):
+        """Abre las conexiones mínimas por adelantado."""
+        for _ in range(self.min_size - len(self._libres)):
+            nueva = self._crear()
+            with self._cond:
+                self._libres.append(nueva)
+                self._cond.notify()
+
+    def close(self):
+        """Cierra las conexiones libres. Las prestadas se cierran al devolverse."""
+        with self._cond:
+            libres = list(self._libres)
+            self._libres.clear()
+            self.max_size = 0
+            self._cond.notify_all()
+        for item in libres:
+            self._cerrar(item)
+
+    # ----------------- PRÉSTAMO Y DEVOLUCIÓN -----------------
+    def acquire(self):
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        esperado = False
+
+        while True:
+            item = None
+            crear = False
+            with self._cond:
+                while True:
+                    if self._libres:
+                        item = self._libres.pop()
+                        self._en_uso += 1
+                        break
+                    if self._en_uso < self.max_size:
+                        self._en_uso += 1
+                        crear = True
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._timeouts += 1
+                        raise PoolAgotadoError(
+                            f"No hay conexiones disponibles tras {self.timeout}s "
+                            f"({self.max_size} en uso)"
+                        )
+                    esperado = True
+                    self._cond.wait(restante)
+
+            if crear:
+                try:
+                    item = self._crear()
+                except Exception:
+                    self._liberar_cupo()
+                    raise
+            elif not self._es_valida(item):
+                self._cerrar(item)
+                self._liberar_cupo()
+                continue
+
+            espera = time.monotonic() - inicio
+            with self._cond:
+                self._prestamos += 1
+                if esperado:
+                    self._esperas += 1
+                self._tiempo_espera_total += espera
+                self._tiempo_espera_max = max(self._tiempo_espera_max, espera)
+            return item
+
+    def release(self, item, descartar=False):
+        ahora = time.monotonic()
+        vencida = ahora - item.creada_en > self.max_lifetime
+        if descartar or vencida:
+            self._cerrar(item)
+            self._liberar_cupo()
+            return
+
+        item.usada_en = ahora
+        with self._cond:
+            self._en_uso -= 1
+            if len(self._libres) + self._en_uso < self.max_size:
+                self._libres.append(item)
+                self._cond.notify()
+                return
+        # El pool se cerró o se redujo mientras la conexión estaba prestada
+        self._cerrar(item)
+
+    @contextmanager
+    def connection(self):
+        """
+        Presta una conexión y la devuelve al salir del bloque.
+        Si el bloque falla se hace rollback; si el rollback también falla
+        la conexión se descarta en lugar de volver al pool.
+        """
+        item = self.acquire()
+        descartar = False
+        try:
+            yield item.conn
+        except BaseException:
+            try:
+                item.conn.rollback()
+            except Exception:
+                descartar = True
+            raise
+        finally:
+            self.release(item, descartar=descartar)
+
+    # ----------------- MONITOREO -----------------
+    def stats(self):
+        with self._cond:
+            prestamos = self._prestamos
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "en_uso": self._en_uso,
+                "libres": len(self._libres),
+                "creadas": self._creadas,
+                "cerradas": self._cerradas,
+                "prestamos": prestamos,
+                "prestamos_con_espera": self._esperas,
+                "espera_promedio_ms": round(self._tiempo_espera_total / prestamos * 1000, 3) if prestamos else 0,
+                "espera_max_ms": round(self._tiempo_espera_max * 1000, 3),
+                "fallos_verificacion": self._fallos_verificacion,
+                "timeouts": self._timeouts,
+            }
+
+    # ----------------- INTERNOS -----------------
+    def _crear(self):
+        conn = self._factory()
+        with self._cond:
+            self._creadas += 1
+        return _ConexionPool(conn)
+
+    def _cerrar(self, item):
+        try:
+            item.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._cerradas += 1
+
+    def _liberar_cupo(self):
+        with self._cond:
+            self._en_uso -= 1
+            self._cond.notify()
+
+    def _es_valida(self, item):
+        ahora = time.monotonic()
+        if ahora - item.creada_en > self.max_lifetime:
+            return False
+        if ahora - item.usada_en < self.health_check_after:
+            return True
+        try:
+            cursor = item.conn.cursor()
+            cursor.execute(self.health_check_sql)
+            cursor.fetchall()
+            return True
+        except Exception:
+            with self._cond:
+                self._fallos_verificacion += 1
+            return False
@@ -0,0 +1,179 @@
+"""
+Exportación de lecturas crudas en CSV o NDJSON.
+
+La consulta se envía una sola vez y las filas se leen por lotes con
+fetchmany mientras se escriben en la respuesta, así la memoria no depende
+del tamaño del rango. La conexión queda prestada mientras dura la descarga,
+por eso se limita el número de exportaciones simultáneas; el ejecutor de
+base de datos solo se ocupa durante cada fetchmany.
+"""
+import asyncio
+import csv
+import io
+import threading
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+import config
+import consultas
+from database import pool, run_db
+from db_pool import PoolAgotadoError
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+_activas = 0
+
+# Cierres de lectores pendientes; la referencia evita que el recolector descarte la tarea
+_cierres = set()
+
+
+def sql_exportacion(parametros):
+    columnas = ", ".join(f"CAST({p} AS FLOAT)" for p in parametros)
+    return f"""
+        SELECT fecha_hora, {columnas}
+        FROM lecturas
+        WHERE usuario_id = %s AND fecha_hora >= %s AND fecha_hora < %s
+        ORDER BY fecha_hora
+    """
+
+
+def formatear_csv(filas, columnas):
+    salida = io.StringIO()
+    escritor = csv.writer(salida, lineterminator="\n")
+    for fila in filas:
+        escritor.writerow([fila[0].isoformat(), *("" if v is None else v for v in fila[1:])])
+    return salida.getvalue().encode("utf-8")
+
+
+def formatear_ndjson(filas, columnas):
+    return b"".join(
+        orjson.dumps({"fecha_hora": fila[0], **dict(zip(columnas[1:], fila[1:]))}) + b"\n"
+        for fila in filas
+    )
+
+
+class LectorLecturas:
+    """
+    Resultado abierto de la consulta de exportación, leído por lotes. `cerrar`
+    espera a que termine el fetchmany en curso: la conexión no se puede usar
+    desde dos hilos a la vez.
+    """
+
+    def __init__(self, usuario_id, desde, hasta, parametros, tamano_lote=None):
+        self.params = (usuario_id, desde, hasta)
+        self.parametros = parametros
+        self.tamano_lote = tamano_lote or config.EXPORTACION_TAMANO_LOTE
+        self.agotado = False
+        self._item = None
+        self._cursor = None
+        self._lock = threading.Lock()
+
+    def abrir(self):
+        try:
+            self._item = pool.acquire()
+        except PoolAgotadoError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        try:
+            self._cursor = self._item.conn.cursor()
+            consultas.ejecutar(self._cursor, consultas.EXPORTAR_LECTURAS, self.params,
+                               sql=sql_exportacion(self.parametros))
+        except BaseException:
+            self.cerrar()
+            raise
+
+    def lote(self):
+        with self._lock:
+            filas = self._cursor.fetchmany(self.tamano_lote)
+            if not filas:
+                self.agotado = True
+            return filas
+
+    def cerrar(self):
+        """Devuelve la conexión; si quedaron filas sin leer se descarta."""
+        with self._lock:
+            if self._item is not None:
+                item, self._item = self._item, None
+                pool.release(item, descartar=not self.agotado)
+
+
+def reservar():
+    """Ocupa un lugar entre las exportaciones simultáneas o responde 503."""
+    global _activas
+    if _activas >= config.EXPORTACION_MAX_SIMULTANEAS:
+        raise HTTPException(status_code=503, detail="Hay demasiadas exportaciones en curso",
+                            headers={"Retry-After": "5"})
+    _activas += 1
+
+
+def liberar():
+    global _activas
+    _activas -= 1
+
+
+def cerrar_en_segundo_plano(lector):
+    """
+    Devuelve la conexión del lector desde una tarea propia. Sirve aunque la
+    tarea actual esté cancelada (cliente desconectado), que ya no puede esperar.
+    """
+    tarea = asyncio.get_running_loop().create_task(run_db(lector.cerrar))
+    _cierres.add(tarea)
+    tarea.add_done_callback(_cierres.discard)
+
+
+async def esperar_cierres():
+    """Espera los cierres pendientes antes de apagar el ejecutor y el pool."""
+    if _cierres:
+        await asyncio.gather(*_cierres, return_exceptions=True)
+
+
+async def abrir_exportacion(usuario_id, desde, hasta, parametros):
+    """
+    Reserva un lugar y ejecuta la consulta antes de empezar la respuesta, para
+    que los errores todavía puedan devolverse con su código HTTP.
+    """
+    reservar()
+    lector = LectorLecturas(usuario_id, desde, hasta, parametros)
+    try:
+        await run_db(lector.abrir)
+    except BaseException:
+        liberar()
+        raise
+    return lector
+
+
+async def _generar(lector, formato):
+    columnas = ["fecha_hora", *lector.parametros]
+    formatear = formatear_csv if formato == "csv" else formatear_ndjson
+    if formato == "csv":
+        yield (",".join(columnas) + "\n").encode("utf-8")
+    while True:
+        filas = await run_db(lector.lote)
+        if not filas:
+            break
+        yield formatear(filas, columnas)
+
+
+class RespuestaExportacion(StreamingResponse):
+    """StreamingResponse que libera la conexión y el lugar al terminar, aunque el cliente se desconecte."""
+
+    def __init__(self, lector, formato, nombre_archivo):
+        super().__init__(
+            _generar(lector, formato),
+            media_type=FORMATOS[formato],
+            headers={"Content-Disposition": f'attachment; filename="{nombre_archivo}"'},
+        )
+        self.lector = lector
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            liberar()
+            # Tras una desconexión la tarea está cancelada y no se puede esperar
+            # aquí: la conexión se devuelve (o se descarta) en segundo plano
+            cerrar_en_segundo_plano(self.lector)
@@ -0,0 +1,157 @@
+import asyncio
+import calendar
+from datetime import datetime
+
+import cache
+import config
+import consultas
+from analitica import indices_lttb, matriz_serie
+from database import db_connection, run_db
+from models import PARAMETROS
+
+# periodo -> (meses hacia atrás, texto). Cualquier otro valor se trata como 6 meses.
+PERIODOS = {
+    "1mes": (1, "Último mes"),
+    "3meses": (3, "Últimos 3 meses"),
+    "6meses": (6, "Últimos 6 meses"),
+}
+PERIODO_POR_DEFECTO = "6meses"
+
+# Datos estáticos de cada parámetro; los clientes los piden una vez a /api/lecturas/metadata
+METADATA_PARAMETROS = {
+    "nitrogeno": {
+        "nombre": "Nitrógeno", "nombre_grafica": "Nitrógeno (N)", "unidad": "ppm", "icono": "🌱",
+        "color": "#4A6B2A",
+        "descripcion": "El nitrógeno es esencial para el crecimiento vegetativo y el desarrollo de hojas.",
+    },
+    "fosforo": {
+        "nombre": "Fósforo", "nombre_grafica": "Fósforo (P)", "unidad": "ppm", "icono": "🧪",
+        "color": "#6B9EBF",
+        "descripcion": "El fósforo favorece el desarrollo radicular y la formación de flores y frutos.",
+    },
+    "potasio": {
+        "nombre": "Potasio", "nombre_grafica": "Potasio (K)", "unidad": "ppm", "icono": "🪴",
+        "color": "#E8C662",
+        "descripcion": "El potasio mejora la resistencia a enfermedades y la calidad de los frutos.",
+    },
+    "ph": {
+        "nombre": "pH del suelo", "nombre_grafica": "pH del suelo", "unidad": "", "icono": "⚗️",
+        "color": "#8B7BD8",
+        "descripcion": "El pH afecta la disponibilidad de nutrientes para las plantas.",
+    },
+    "humedad": {
+        "nombre": "Humedad", "nombre_grafica": "Humedad", "unidad": "%", "icono": "💧",
+        "color": "#5DADE2",
+        "descripcion": "La humedad del suelo es crucial para la absorción de nutrientes.",
+    },
+    "temperatura": {
+        "nombre": "Temperatura", "nombre_grafica": "Temperatura", "unidad": "°C", "icono": "🌡️",
+        "color": "#F1948A",
+        "descripcion": "La temperatura afecta los procesos metabólicos de las plantas.",
+    },
+}
+
+# Cargas en curso por clave: las peticiones concurrentes esperan la misma
+_en_vuelo = {}
+
+
+def normalizar_periodo(periodo):
+    return periodo if periodo in PERIODOS else PERIODO_POR_DEFECTO
+
+
+def texto_periodo(periodo):
+    return PERIODOS[normalizar_periodo(periodo)][1]
+
+
+def reducir_serie(serie, max_puntos, parametros=PARAMETROS):
+    """
+    Serie con a lo sumo `max_puntos` días elegidos con LTTB sobre `parametros`
+    (los mismos días para todos). Devuelve (serie, indices); si no se pide
+    reducción o la serie ya es más corta, la devuelve tal cual con indices None.
+    """
+    if max_puntos is None or len(serie["fechas"]) <= max_puntos:
+        return serie, None
+    indices = indices_lttb(matriz_serie(serie, parametros), max_puntos).tolist()
+    reducida = {
+        "fechas": [serie["fechas"][i] for i in indices],
+        "series": {p: [serie["series"][p][i] for i in indices] for p in parametros},
+    }
+    return reducida, indices
+
+
+def respuesta_compacta(serie, periodo, parametros, decimales=2):
+    """
+    Histórico en columnas: un solo arreglo de fechas y una columna por
+    parámetro, sin metadatos (ver METADATA_PARAMETROS).
+    """
+    return {
+        "periodo": periodo,
+        "periodo_texto": texto_periodo(periodo),
+        "fechas": serie["fechas"],
+        "columnas": {p: [round(v, decimales) for v in serie["series"][p]] for p in parametros},
+    }
+
+
+def restar_meses(momento, meses):
+    """Mismo instante `meses` meses antes; el día se ajusta al fin de mes como DATEADD."""
+    anio, mes = divmod(momento.month - 1 - meses, 12)
+    anio += momento.year
+    dia = min(momento.day, calendar.monthrange(anio, mes + 1)[1])
+    return momento.replace(year=anio, month=mes + 1, day=dia)
+
+
+def consulta_serie_diaria(usuario_id, meses, ahora=None):
+    """(sentencia, params) del promedio diario de todos los parámetros de los últimos `meses`."""
+    desde = restar_meses(ahora or datetime.now(), meses)
+    if config.ROLLUP_DIARIO:
+        return consultas.SERIE_DIARIA_RESUMEN, (usuario_id, desde.date())
+    return consultas.SERIE_DIARIA_LECTURAS, (usuario_id, desde)
+
+
+def _consultar_series(usuario_id, meses):
+    """
+    Promedio diario de todos los parámetros en una sola consulta.
+    Devuelve {"fechas": [...], "series": {parametro: [...]}}.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, *consulta_serie_diaria(usuario_id, meses))
+        results = cursor.fetchall()
+
+    fechas = [row[0].strftime("%Y-%m-%d") for row in results]
+    series = {
+        p: [float(row[i + 1]) if row[i + 1] is not None else 0.0 for row in results]
+        for i, p in enumerate(PARAMETROS)
+    }
+    return {"fechas": fechas, "series": series}
+
+
+async def _cargar(clave, usuario_id, meses):
+    generacion = cache.historico.generacion(usuario_id)
+    serie = await run_db(_consultar_series, usuario_id, meses)
+    cache.historico.set(clave, serie, generacion)
+    return serie
+
+
+async def serie_diaria(usuario_id, periodo):
+    """
+    Serie diaria de todos los parámetros para (usuario_id, periodo).
+
+    Sale de la caché de históricos si está; si no, las peticiones
+    concurrentes por la misma clave comparten una sola consulta. La carga
+    corre en su propia tarea para que cancelar una petición no cancele a
+    las demás.
+    """
+    periodo = normalizar_periodo(periodo)
+    clave = (usuario_id, "serie", periodo)
+
+    serie = cache.historico.get(clave)
+    if serie is not None:
+        return serie
+
+    tarea = _en_vuelo.get(clave)
+    if tarea is None:
+        tarea = asyncio.ensure_future(_cargar(clave, usuario_id, PERIODOS[periodo][0]))
+        _en_vuelo[clave] = tarea
+        tarea.add_done_callback(lambda _: _en_vuelo.pop(clave, None))
+    return await asyncio.shield(tarea)
@@ -0,0 +1,339 @@
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta
+
+from pydantic import ValidationError
+
+import cache
+import config
+import consultas
+from database import db_connection, run_db
+from models import PARAMETROS, LecturaBatchItem
+from rollup import actualizar_rollup
+
+# SQL Server admite como máximo 2100 parámetros por sentencia
+_COLUMNAS_INSERT = 2 + len(PARAMETROS)
+_FILAS_POR_INSERT = 2000 // _COLUMNAS_INSERT
+
+# Tolerancia para relojes de dispositivos ligeramente adelantados
+_TOLERANCIA_FUTURO = timedelta(minutes=5)
+
+
+def fila_lectura(usuario_id, lectura, fecha_hora=None):
+    """
+    Tupla (usuario_id, <parámetros>, fecha_hora) lista para insertar. Sin
+    fecha_hora la pone la base de datos al insertar (ver insertar_lecturas).
+    """
+    return (usuario_id, *(getattr(lectura, p) for p in PARAMETROS), fecha_hora)
+
+
+def validar_lote(items, usuario_id_lote, ahora=None):
+    """
+    Valida todas las lecturas del lote en una sola pasada.
+    Devuelve (filas_validas, resultados): `resultados` tiene una entrada por item,
+    en el mismo orden, y los válidos se marcan con ok=True.
+    Las lecturas sin fecha_hora toman la hora del servidor de base de datos.
+    """
+    ahora = ahora or datetime.now()
+    limite_futuro = ahora + _TOLERANCIA_FUTURO
+    filas = []
+    resultados = []
+
+    for indice, crudo in enumerate(items):
+        try:
+            item = LecturaBatchItem.model_validate(crudo)
+        except ValidationError as e:
+            errores = "; ".join(
+                f"{'.'.join(str(x) for x in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            resultados.append({"indice": indice, "ok": False, "error": errores})
+            continue
+
+        usuario_id = item.usuario_id if item.usuario_id is not None else usuario_id_lote
+        if usuario_id is None:
+            resultados.append({"indice": indice, "ok": False, "error": "Falta usuario_id"})
+            continue
+
+        no_finitos = [p for p in PARAMETROS if not math.isfinite(getattr(item, p))]
+        if no_finitos:
+            resultados.append({"indice": indice, "ok": False,
+                               "error": f"Valores no numéricos en: {', '.join(no_finitos)}"})
+            continue
+
+        fecha_hora = item.fecha_hora
+        if fecha_hora is not None and fecha_hora.tzinfo is not None:
+            # La columna es datetime sin zona: se guarda en hora local del servidor
+            fecha_hora = fecha_hora.astimezone().replace(tzinfo=None)
+        if fecha_hora is not None and fecha_hora > limite_futuro:
+            resultados.append({"indice": indice, "ok": False, "error": "fecha_hora en el futuro"})
+            continue
+
+        filas.append(fila_lectura(usuario_id, item, fecha_hora))
+        resultados.append({"indice": indice, "ok": True, "usuario_id": usuario_id})
+
+    return filas, resultados
+
+
+def insertar_lecturas(cursor, filas):
+    """
+    Inserta las filas con INSERTs de varias filas (sin commit).
+    Agrupa tantas filas por sentencia como permite el límite de parámetros.
+
+    Las filas sin fecha_hora toman GETDATE() del servidor de base de datos,
+    como el DEFAULT de la columna, para no mezclar el reloj y la zona horaria
+    de la API con los de la base. Devuelve las filas con la fecha_hora guardada.
+    """
+    columnas = "usuario_id, " + ", ".join(PARAMETROS) + ", fecha_hora"
+    marcador = "(" + ", ".join(["%s"] * (_COLUMNAS_INSERT - 1)) + ", COALESCE(%s, @ahora))"
+    guardadas = []
+
+    for inicio in range(0, len(filas), _FILAS_POR_INSERT):
+        grupo = filas[inicio:inicio + _FILAS_POR_INSERT]
+        valores = ", ".join([marcador] * len(grupo))
+        params = tuple(v for fila in grupo for v in fila)
+        consultas.ejecutar(cursor, consultas.INSERTAR_LECTURAS, params, sql=f"""
+            DECLARE @ahora DATETIME = GETDATE();
+            INSERT INTO lecturas ({columnas}) VALUES {valores};
+            SELECT @ahora
+        """)
+        ahora = cursor.fetchone()[0]
+        guardadas.extend(fila if fila[-1] is not None else (*fila[:-1], ahora) for fila in grupo)
+    return guardadas
+
+
+class CommitInciertoError(Exception):
+    """Falló el commit o algo posterior: el lote pudo quedar guardado o no."""
+
+
+def escribir_lecturas(filas):
+    """
+    Guarda las filas y actualiza el resumen diario en una sola transacción.
+    Devuelve las filas con la fecha_hora guardada, que luego se pasan a
+    cache.lecturas_guardadas (ver cache.guardando_lecturas).
+
+    Un error antes del commit deja la transacción sin efecto y se puede
+    reintentar; uno desde el commit en adelante se informa como
+    CommitInciertoError, porque repetir el INSERT podría duplicar el lote.
+    """
+    usuario_ids = {fila[0] for fila in filas}
+    cache.guardando_lecturas(usuario_ids)
+    en_commit = False
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            filas = insertar_lecturas(cursor, filas)
+            if config.ROLLUP_DIARIO:
+                actualizar_rollup(cursor, filas)
+            en_commit = True
+            conn.commit()
+    except Exception as e:
+        cache.guardado_fallido(usuario_ids, incierto=en_commit)
+        if en_commit:
+            raise CommitInciertoError(f"No se pudo confirmar el commit: {e}") from e
+        raise
+    return filas
+
+
+def guardar_lecturas(filas):
+    """Guarda las filas en una sola transacción y actualiza las cachés tras el commit."""
+    if not filas:
+        return
+    filas = escribir_lecturas(filas)
+    cache.lecturas_guardadas(filas)
+
+
+# ----------------- BUFFER DE ESCRITURA DIFERIDA -----------------
+class BufferLlenoError(Exception):
+    """El buffer siguió lleno durante todo el tiempo de espera."""
+
+
+class BufferCerradoError(Exception):
+    """El buffer se está vaciando por apagado y ya no acepta lecturas."""
+
+
+_FIN = object()
+
+
+class BufferIngesta:
+    """
+    Buffer en memoria delante de la tabla lecturas.
+
+    Las peticiones encolan filas y un único escritor en segundo plano las
+    guarda en lotes cuando se alcanza `tamano_lote` filas o pasan `ventana`
+    segundos desde la primera fila del lote. Con `esperar=True` la petición
+    espera a que su lote se confirme; si no, responde al encolar.
+
+    `guardar(filas)` escribe el lote y devuelve las filas guardadas; solo se
+    reintenta si no llegó al commit (ver escribir_lecturas). `al_guardar`
+    recibe esas filas una vez, fuera de los reintentos.
+    """
+
+    def __init__(self, guardar, al_guardar=None, capacidad=10000, tamano_lote=500,
+                 ventana=0.2, espera_max=2.0, reintentos=3):
+        self._guardar = guardar
+        self._al_guardar = al_guardar
+        self.capacidad = capacidad
+        self.tamano_lote = tamano_lote
+        self.ventana = ventana
+        self.espera_max = espera_max
+        self.reintentos = reintentos
+
+        self._cola = None
+        self._tarea = None
+        self._cerrando = False
+
+        self._encoladas = 0
+        self._guardadas = 0
+        self._lotes = 0
+        self._rechazadas = 0
+        self._perdidas = 0
+        self._inciertas = 0
+        self._ultimo_error = None
+
+    @property
+    def activo(self):
+        return self._tarea is not None and not self._cerrando
+
+    async def iniciar(self):
+        self._cola = asyncio.Queue(maxsize=self.capacidad)
+        self._cerrando = False
+        self._tarea = asyncio.create_task(self._escritor())
+
+    async def detener(self):
+        """Deja de aceptar lecturas y espera a que se escriba todo lo pendiente."""
+        if self._tarea is None:
+            return
+        self._cerrando = True
+        await self._cola.put(_FIN)
+        await self._tarea
+        self._tarea = None
+
+    async def encolar(self, fila, esperar=False):
+        if not self.activo:
+            raise BufferCerradoError("El buffer de ingesta no está activo")
+
+        confirmacion = asyncio.get_running_loop().create_future() if esperar else None
+        try:
+            await asyncio.wait_for(self._cola.put((fila, confirmacion)), timeout=self.espera_max)
+        except asyncio.TimeoutError:
+            self._rechazadas += 1
+            raise BufferLlenoError(
+                f"Buffer de ingesta lleno ({self.capacidad} lecturas pendientes)"
+            )
+        self._encoladas += 1
+
+        if confirmacion is not None:
+            await confirmacion
+
+    async def _escritor(self):
+        loop = asyncio.get_running_loop()
+        terminar = False
+        while not terminar:
+            item = await self._cola.get()
+            if item is _FIN:
+                break
+            lote = [item]
+            limite = loop.time() + self.ventana
+
+            while len(lote) < self.tamano_lote:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._cola.get(), timeout=restante)
+                except asyncio.TimeoutError:
+                    break
+                if item is _FIN:
+                    terminar = True
+                    break
+                lote.append(item)
+
+            await self._escribir(lote)
+
+        # Lecturas que alcanzaron a entrar mientras se cerraba
+        resto = []
+        while not self._cola.empty():
+            item = self._cola.get_nowait()
+            if item is not _FIN:
+                resto.append(item)
+        for inicio in range(0, len(resto), self.tamano_lote):
+            await self._escribir(resto[inicio:inicio + self.tamano_lote])
+
+    async def _escribir(self, lote):
+        filas = [fila for fila, _ in lote]
+        error = None
+        for intento in range(self.reintentos + 1):
+            try:
+                guardadas = await run_db(self._guardar, filas)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                self._ultimo_error = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {e}"
+                print(f"❌ Error guardando lote de {len(filas)} lecturas (intento {intento + 1}): {e}")
+                if isinstance(e, CommitInciertoError):
+                    break
+                if intento < self.reintentos:
+                    await asyncio.sleep(min(2 ** intento * 0.1, 2.0))
+
+        if error is None:
+            self._lotes += 1
+            self._guardadas += len(filas)
+            if self._al_guardar is not None:
+                try:
+                    self._al_guardar(guardadas)
+                except Exception as e:
+                    self._ultimo_error = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {e}"
+                    print(f"❌ Error actualizando cachés tras guardar {len(filas)} lecturas: {e}")
+        elif isinstance(error, CommitInciertoError):
+            self._inciertas += len(filas)
+        else:
+            self._perdidas += len(filas)
+
+        for _, confirmacion in lote:
+            if confirmacion is None or confirmacion.done():
+                continue
+            if error is None:
+                confirmacion.set_result(None)
+            else:
+                confirmacion.set_exception(error)
+
+    def stats(self):
+        return {
+            "activo": self.activo,
+            "capacidad": self.capacidad,
+            "pendientes": self._cola.qsize() if self._cola is not None else 0,
+            "encoladas": self._encoladas,
+            "guardadas": self._guardadas,
+            "lotes": self._lotes,
+            "rechazadas_por_buffer_lleno": self._rechazadas,
+            "perdidas": self._perdidas,
+            "sin_confirmar": self._inciertas,
+            "ultimo_error": self._ultimo_error,
+        }
+
+
+buffer = BufferIngesta(
+    escribir_lecturas,
+    al_guardar=cache.lecturas_guardadas,
+    capacidad=config.INGESTA_CAPACIDAD,
+    tamano_lote=config.INGESTA_TAMANO_LOTE,
+    ventana=config.INGESTA_VENTANA_MS / 1000,
+    espera_max=config.INGESTA_ESPERA_MAX,
+    reintentos=config.INGESTA_REINTENTOS,
+)
+
+
+async def registrar_lectura(usuario_id, lectura):
+    """
+    Punto de entrada de POST /api/lecturas según INGESTA_MODO.
+    Devuelve True si la lectura ya está confirmada en la base de datos.
+    """
+    fila = fila_lectura(usuario_id, lectura)
+    if config.INGESTA_MODO == "directo" or not buffer.activo:
+        await run_db(guardar_lecturas, [fila])
+        return True
+    esperar = config.INGESTA_MODO == "confirmado"
+    await buffer.encolar(fila, esperar=esperar)
+    return esperar
@@ -0,0 +1,161 @@
+"""
+Operaciones en lote sobre actividades (/api/actividades/bulk).
+
+Cada item del lote es {"op": "crear" | "modificar" | "completar" | "eliminar", ...}
+con los mismos campos que el endpoint individual. Las válidas se aplican en
+una sola transacción con una sentencia por tipo de operación (en grupos
+según el límite de parámetros), no una por fila; las OUTPUT de esas
+sentencias dicen qué ids se crearon y cuáles existían.
+
+Un mismo id solo puede aparecer en una operación del lote: así el resultado
+no depende del orden en que se aplican los grupos.
+"""
+from datetime import datetime
+
+from pydantic import ValidationError
+
+import consultas
+from database import db_connection
+from models import ActividadCreate, ActividadUpdate
+
+OPERACIONES = ("crear", "modificar", "completar", "eliminar")
+
+# SQL Server admite como máximo 2100 parámetros por sentencia
+_FILAS_POR_CREAR = 2000 // 5
+_FILAS_POR_MODIFICAR = 2000 // 4
+
+
+def _errores(e):
+    return "; ".join(f"{'.'.join(str(x) for x in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+def _id(crudo):
+    actividad_id = crudo.get("id")
+    if isinstance(actividad_id, bool) or not isinstance(actividad_id, int):
+        raise ValueError("id debe ser un entero")
+    return actividad_id
+
+
+def validar_operaciones(items):
+    """
+    Valida el lote en una sola pasada.
+    Devuelve (operaciones, resultados): `operaciones` es {op: [(indice, valores)]}
+    con las válidas y `resultados` tiene una entrada por item en el mismo orden.
+    """
+    operaciones = {op: [] for op in OPERACIONES}
+    resultados = []
+    ids_vistos = set()
+
+    for indice, crudo in enumerate(items):
+        op = crudo.get("op")
+        if op not in OPERACIONES:
+            resultados.append({"indice": indice, "ok": False,
+                               "error": f"op inválida; permitidas: {', '.join(OPERACIONES)}"})
+            continue
+        datos = {k: v for k, v in crudo.items() if k != "op"}
+        try:
+            if op == "crear":
+                actividad = ActividadCreate.model_validate(datos)
+                valores = (indice, actividad.usuario_id, actividad.titulo,
+                           datetime.strptime(actividad.fecha, "%Y-%m-%d"), int(actividad.completada))
+            else:
+                actividad_id = _id(datos)
+                if actividad_id in ids_vistos:
+                    raise ValueError(f"El id {actividad_id} aparece en más de una operación del lote")
+                if op == "modificar":
+                    actividad = ActividadUpdate.model_validate(datos)
+                    valores = (actividad_id, actividad.titulo,
+                               datetime.strptime(actividad.fecha, "%Y-%m-%d"), int(actividad.completada))
+                else:
+                    valores = actividad_id
+                ids_vistos.add(actividad_id)
+        except ValidationError as e:
+            resultados.append({"indice": indice, "ok": False, "op": op, "error": _errores(e)})
+            continue
+        except ValueError as e:
+            resultados.append({"indice": indice, "ok": False, "op": op, "error": str(e)})
+            continue
+
+        operaciones[op].append((indice, valores))
+        resultados.append({"indice": indice, "ok": True, "op": op})
+
+    return operaciones, resultados
+
+
+def _crear(cursor, filas):
+    """{indice: id nuevo}. MERGE permite devolver el índice del item junto al id insertado."""
+    nuevos = {}
+    for inicio in range(0, len(filas), _FILAS_POR_CREAR):
+        grupo = filas[inicio:inicio + _FILAS_POR_CREAR]
+        valores = ", ".join(["(%s, %s, %s, %s, %s)"] * len(grupo))
+        consultas.ejecutar(cursor, consultas.CREAR_ACTIVIDADES, tuple(v for fila in grupo for v in fila), sql=f"""
+            MERGE actividades AS a
+            USING (VALUES {valores}) AS s (indice, usuario_id, titulo, fecha, completada)
+            ON 1 = 0
+            WHEN NOT MATCHED THEN
+                INSERT (usuario_id, titulo, fecha, completada)
+                VALUES (s.usuario_id, s.titulo, s.fecha, s.completada)
+            OUTPUT s.indice, INSERTED.id;
+        """)
+        nuevos.update((indice, nuevo_id) for indice, nuevo_id in cursor.fetchall())
+    return nuevos
+
+
+def _modificar(cursor, filas):
+    """{id: usuario_id} de las actividades que existían y se modificaron."""
+    encontrados = {}
+    for inicio in range(0, len(filas), _FILAS_POR_MODIFICAR):
+        grupo = filas[inicio:inicio + _FILAS_POR_MODIFICAR]
+        valores = ", ".join(["(%s, %s, %s, %s)"] * len(grupo))
+        consultas.ejecutar(cursor, consultas.MODIFICAR_ACTIVIDADES, tuple(v for fila in grupo for v in fila), sql=f"""
+            UPDATE a
+            SET titulo = s.titulo, fecha = s.fecha, completada = s.completada
+            OUTPUT INSERTED.id, INSERTED.usuario_id
+            FROM actividades a
+            JOIN (VALUES {valores}) AS s (id, titulo, fecha, completada) ON a.id = s.id
+        """)
+        encontrados.update(cursor.fetchall())
+    return encontrados
+
+
+def _por_ids(cursor, nombre, ids):
+    """{id: usuario_id} de las actividades afectadas."""
+    if not ids:
+        return {}
+    consultas.ejecutar(cursor, nombre, (consultas.lista_ids(ids),))
+    return dict(cursor.fetchall())
+
+
+def aplicar_operaciones(operaciones):
+    """
+    Aplica las operaciones validadas en una transacción.
+    Devuelve ({indice: id nuevo}, {id: usuario_id} encontrados por
+    modificar/completar/eliminar, usuarios con actividades modificadas).
+    """
+    creadas = [v for _, v in operaciones["crear"]]
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        nuevos = _crear(cursor, creadas)
+        encontrados = _modificar(cursor, [v for _, v in operaciones["modificar"]])
+        encontrados.update(_por_ids(cursor, consultas.COMPLETAR_ACTIVIDADES,
+                                    [v for _, v in operaciones["completar"]]))
+        encontrados.update(_por_ids(cursor, consultas.BORRAR_ACTIVIDADES,
+                                    [v for _, v in operaciones["eliminar"]]))
+        conn.commit()
+    return nuevos, encontrados, {fila[1] for fila in creadas} | set(encontrados.values())
+
+
+def completar_resultados(operaciones, resultados, nuevos, encontrados):
+    """Agrega a cada resultado válido el id creado o marca las actividades que no existían."""
+    for op, items in operaciones.items():
+        for indice, valores in items:
+            resultado = resultados[indice]
+            if op == "crear":
+                resultado["id"] = nuevos[indice]
+                continue
+            actividad_id = valores[0] if op == "modificar" else valores
+            resultado["id"] = actividad_id
+            if actividad_id not in encontrados:
+                resultado["ok"] = False
+                resultado["error"] = "Actividad no encontrada"
+    return resultados
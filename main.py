@@ -1,12 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth, lecturas, actividades
+from routes import auth, lecturas, actividades, dashboard
+from database import executor, executor_stats, pool, pool_stats
+from compresion import CompresionMiddleware
+import cache
+import config
+import consultas
+import exportacion
+import ingesta
+from respuestas import RespuestaJSON
 
 
 app = FastAPI(
     title="AGROMAGU API",
     version="1.0.0",
-    description="API para el sistema de monitoreo agrícola AGROMAGU"
+    description="API para el sistema de monitoreo agrícola AGROMAGU",
+    default_response_class=RespuestaJSON
 )
 
 app.add_middleware(
@@ -16,11 +25,31 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompresionMiddleware)
+
+@app.on_event("startup")
+async def iniciar():
+    try:
+        pool.open()
+    except Exception as e:
+        # La API arranca igual; las conexiones se crearán bajo demanda
+        print(f"⚠️ No se pudo precalentar el pool de conexiones: {e}")
+    if config.INGESTA_MODO != "directo":
+        await ingesta.buffer.iniciar()
+
+@app.on_event("shutdown")
+async def detener():
+    # Primero se vacía el buffer: todavía necesita el ejecutor y el pool
+    await ingesta.buffer.detener()
+    await exportacion.esperar_cierres()
+    executor.shutdown()
+    pool.close()
 
 # Incluir las rutas
 app.include_router(auth.router)
 app.include_router(lecturas.router)
 app.include_router(actividades.router)
+app.include_router(dashboard.router)
 
 @app.get("/")
 async def root():
@@ -29,3 +58,16 @@ async def root():
 @app.get("/api/health")
 async def health_check():
     return {"status": "OK", "message": "API funcionando"}
+
+@app.get("/api/metricas")
+async def metricas():
+    return {
+        "pool": pool_stats(),
+        "ejecutor_db": executor_stats(),
+        "ingesta": {"modo": config.INGESTA_MODO, **ingesta.buffer.stats()},
+        "cache_historico": cache.historico.stats(),
+        "indice_ultima_lectura": cache.ultima_lectura.stats(),
+        "acumulados_dia": cache.acumulados.stats(),
+        "siguiente_actividad": cache.siguiente_actividad.stats(),
+        "consultas": consultas.stats()
+    }
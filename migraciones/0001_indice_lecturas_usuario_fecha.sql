@@ -0,0 +1,7 @@
+-- Última lectura (usuario_id = ? ORDER BY fecha_hora DESC), históricos y
+-- series por rango (usuario_id = ? AND fecha_hora >= ? AND fecha_hora < ?).
+-- Incluye los parámetros para que esas consultas no vuelvan a la tabla.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_lecturas_usuario_fecha' AND object_id = OBJECT_ID('lecturas'))
+CREATE INDEX IX_lecturas_usuario_fecha
+    ON lecturas (usuario_id, fecha_hora DESC)
+    INCLUDE (nitrogeno, fosforo, potasio, ph, humedad, temperatura, luz_solar);
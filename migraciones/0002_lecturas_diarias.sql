@@ -0,0 +1,31 @@
+-- Resumen diario de lecturas (ver rollup.py). Tras aplicarla, cargar los
+-- datos existentes con: python rollup.py --backfill
+IF OBJECT_ID('lecturas_diarias', 'U') IS NULL
+CREATE TABLE lecturas_diarias (
+    usuario_id INT NOT NULL,
+    fecha DATE NOT NULL,
+    total INT NOT NULL,
+    suma_nitrogeno FLOAT NULL,
+    min_nitrogeno FLOAT NULL,
+    max_nitrogeno FLOAT NULL,
+    suma_fosforo FLOAT NULL,
+    min_fosforo FLOAT NULL,
+    max_fosforo FLOAT NULL,
+    suma_potasio FLOAT NULL,
+    min_potasio FLOAT NULL,
+    max_potasio FLOAT NULL,
+    suma_ph FLOAT NULL,
+    min_ph FLOAT NULL,
+    max_ph FLOAT NULL,
+    suma_humedad FLOAT NULL,
+    min_humedad FLOAT NULL,
+    max_humedad FLOAT NULL,
+    suma_temperatura FLOAT NULL,
+    min_temperatura FLOAT NULL,
+    max_temperatura FLOAT NULL,
+    suma_luz_solar FLOAT NULL,
+    min_luz_solar FLOAT NULL,
+    max_luz_solar FLOAT NULL,
+    actualizado_en DATETIME NOT NULL DEFAULT GETDATE(),
+    CONSTRAINT PK_lecturas_diarias PRIMARY KEY (usuario_id, fecha)
+);
@@ -0,0 +1,6 @@
+-- Listado por mes y actividad de hoy o la siguiente
+-- (usuario_id = ? AND fecha >= ? [AND fecha < ?] ORDER BY fecha).
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_actividades_usuario_fecha' AND object_id = OBJECT_ID('actividades'))
+CREATE INDEX IX_actividades_usuario_fecha
+    ON actividades (usuario_id, fecha)
+    INCLUDE (titulo, completada);
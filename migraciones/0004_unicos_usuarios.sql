@@ -0,0 +1,9 @@
+-- Registro y login buscan por username = ? OR email = ?; con un índice único
+-- en cada columna el OR se resuelve con dos búsquedas y la base de datos
+-- garantiza que no haya duplicados aunque dos registros lleguen a la vez.
+-- Falla si ya hay duplicados: depurarlos antes de aplicarla.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_usuarios_username' AND object_id = OBJECT_ID('usuarios'))
+CREATE UNIQUE INDEX UX_usuarios_username ON usuarios (username);
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_usuarios_email' AND object_id = OBJECT_ID('usuarios'))
+CREATE UNIQUE INDEX UX_usuarios_email ON usuarios (email) WHERE email IS NOT NULL;
@@ -0,0 +1,40 @@
+-- Actividades recurrentes (ver recurrencias.py): la regla se guarda una vez y
+-- las ocurrencias se calculan al leer. Solo las ocurrencias completadas,
+-- movidas o canceladas tienen fila en actividades_excepciones.
+IF OBJECT_ID('actividades_recurrentes', 'U') IS NULL
+CREATE TABLE actividades_recurrentes (
+    id INT IDENTITY(1, 1) NOT NULL PRIMARY KEY,
+    usuario_id INT NOT NULL,
+    titulo NVARCHAR(200) NOT NULL,
+    inicio DATE NOT NULL,
+    frecuencia VARCHAR(10) NOT NULL,
+    intervalo INT NOT NULL DEFAULT 1,
+    hasta DATE NULL,
+    repeticiones INT NULL,
+    creada_en DATETIME NOT NULL DEFAULT GETDATE(),
+    CONSTRAINT CK_actividades_recurrentes_frecuencia CHECK (frecuencia IN ('diaria', 'semanal', 'mensual')),
+    CONSTRAINT CK_actividades_recurrentes_intervalo CHECK (intervalo >= 1)
+);
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_actividades_recurrentes_usuario' AND object_id = OBJECT_ID('actividades_recurrentes'))
+CREATE INDEX IX_actividades_recurrentes_usuario
+    ON actividades_recurrentes (usuario_id, inicio)
+    INCLUDE (titulo, frecuencia, intervalo, hasta, repeticiones);
+GO
+-- fecha es la fecha original de la ocurrencia según la regla
+IF OBJECT_ID('actividades_excepciones', 'U') IS NULL
+CREATE TABLE actividades_excepciones (
+    recurrencia_id INT NOT NULL,
+    fecha DATE NOT NULL,
+    nueva_fecha DATE NULL,
+    completada BIT NOT NULL DEFAULT 0,
+    cancelada BIT NOT NULL DEFAULT 0,
+    CONSTRAINT PK_actividades_excepciones PRIMARY KEY (recurrencia_id, fecha),
+    CONSTRAINT FK_actividades_excepciones_recurrencia FOREIGN KEY (recurrencia_id)
+        REFERENCES actividades_recurrentes (id) ON DELETE CASCADE
+);
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_actividades_excepciones_nueva_fecha' AND object_id = OBJECT_ID('actividades_excepciones'))
+CREATE INDEX IX_actividades_excepciones_nueva_fecha
+    ON actividades_excepciones (recurrencia_id, nueva_fecha)
+    WHERE nueva_fecha IS NOT NULL;
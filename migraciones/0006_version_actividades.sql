@@ -0,0 +1,12 @@
+-- Validador del ETag de los listados de actividades (VERSION_ACTIVIDADES_RANGO).
+-- SQL Server asigna un rowversion nuevo, mayor que todos los anteriores de la
+-- base, en cada INSERT o UPDATE de la fila: una alta o un cambio sube
+-- MAX(version_fila) del rango y una baja cambia COUNT(*).
+IF COL_LENGTH('actividades', 'version_fila') IS NULL
+ALTER TABLE actividades ADD version_fila ROWVERSION;
+GO
+-- El índice del listado incluye la columna para que el validador no vuelva a la tabla
+CREATE INDEX IX_actividades_usuario_fecha
+    ON actividades (usuario_id, fecha)
+    INCLUDE (titulo, completada, version_fila)
+    WITH (DROP_EXISTING = ON);
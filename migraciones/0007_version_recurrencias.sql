@@ -0,0 +1,7 @@
+-- Validador de las recurrentes en los listados (VERSION_RECURRENCIAS), igual
+-- que la migración 0006: el rowversion máximo sube con cada alta o cambio.
+IF COL_LENGTH('actividades_recurrentes', 'version_fila') IS NULL
+ALTER TABLE actividades_recurrentes ADD version_fila ROWVERSION;
+GO
+IF COL_LENGTH('actividades_excepciones', 'version_fila') IS NULL
+ALTER TABLE actividades_excepciones ADD version_fila ROWVERSION;
@@ -0,0 +1,233 @@
+"""
+Migraciones versionadas del esquema (carpeta migraciones/).
+
+Cada archivo NNNN_descripcion.sql es una migración; los lotes se separan con
+una línea GO, como en SSMS. Las aplicadas se registran en la tabla
+schema_migraciones junto con el hash del archivo, y cada una corre en su
+propia transacción.
+
+    python migrar.py estado
+    python migrar.py aplicar [--hasta 3]
+    python migrar.py planes [--usuario 7] [--guardar planes/]
+
+`planes` muestra el plan estimado (SHOWPLAN_XML) de las consultas calientes
+de la API y marca los recorridos completos, para comprobar tras un despliegue
+que usan búsquedas en los índices.
+"""
+import argparse
+import hashlib
+import os
+import re
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timedelta
+
+import config
+import consultas
+from database import get_db_connection
+
+CARPETA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migraciones")
+
+DDL_SCHEMA_MIGRACIONES = """
+    IF OBJECT_ID('schema_migraciones', 'U') IS NULL
+    CREATE TABLE schema_migraciones (
+        version INT NOT NULL PRIMARY KEY,
+        nombre NVARCHAR(200) NOT NULL,
+        hash CHAR(64) NOT NULL,
+        aplicada_en DATETIME NOT NULL DEFAULT GETDATE()
+    )
+"""
+
+_ARCHIVO = re.compile(r"^(\d+)_(.+)\.sql$")
+_SEPARADOR = re.compile(r"^\s*GO\s*;?\s*$", re.IGNORECASE | re.MULTILINE)
+
+_SHOWPLAN = {"p": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+_RECORRIDOS = {"Table Scan", "Index Scan", "Clustered Index Scan"}
+
+
+class Migracion:
+    def __init__(self, version, nombre, ruta):
+        self.version = version
+        self.nombre = nombre
+        self.ruta = ruta
+        with open(ruta, encoding="utf-8") as f:
+            self.sql = f.read()
+        self.hash = hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def lotes(self):
+        return [lote for lote in _SEPARADOR.split(self.sql) if lote.strip()]
+
+
+def cargar_migraciones(carpeta=CARPETA):
+    migraciones = []
+    for archivo in sorted(os.listdir(carpeta)):
+        coincidencia = _ARCHIVO.match(archivo)
+        if coincidencia:
+            migraciones.append(Migracion(int(coincidencia.group(1)), coincidencia.group(2),
+                                         os.path.join(carpeta, archivo)))
+    versiones = [m.version for m in migraciones]
+    if len(versiones) != len(set(versiones)):
+        raise ValueError("Hay dos migraciones con el mismo número de versión")
+    return migraciones
+
+
+def aplicadas(cursor):
+    """{version: hash} de las migraciones ya registradas."""
+    cursor.execute(DDL_SCHEMA_MIGRACIONES)
+    cursor.execute("SELECT version, hash FROM schema_migraciones")
+    return {version: hash_ for version, hash_ in cursor.fetchall()}
+
+
+def aplicar(conn, migracion):
+    cursor = conn.cursor()
+    try:
+        for lote in migracion.lotes():
+            cursor.execute(lote)
+        cursor.execute(
+            "INSERT INTO schema_migraciones (version, nombre, hash) VALUES (%s, %s, %s)",
+            (migracion.version, migracion.nombre, migracion.hash),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# ----------------- PLANES DE EJECUCIÓN -----------------
+def consultas_calientes(usuario_id):
+    """(nombre, query, params) de las consultas más frecuentes de la API."""
+    from historico import consulta_serie_diaria
+    from routes.lecturas import consulta_acumulado_dia, consulta_version_lecturas
+    from series import sql_series
+
+    hoy = date.today()
+    inicio_hoy = datetime.combine(hoy, datetime.min.time())
+    inicio_mes = datetime(hoy.year, hoy.month, 1)
+    ahora = datetime.now()
+    catalogadas = [
+        (consultas.ULTIMA_LECTURA, (usuario_id,)),
+        (consultas.ULTIMA_LECTURA_VARIOS, (consultas.lista_ids(range(usuario_id, usuario_id + 50)),)),
+        consulta_acumulado_dia(usuario_id, hoy),
+        consulta_serie_diaria(usuario_id, 6),
+        consulta_version_lecturas(usuario_id),
+        (consultas.HOY_O_SIGUIENTE, (usuario_id, inicio_hoy)),
+        (consultas.ACTIVIDADES_RANGO, (usuario_id, inicio_mes, inicio_mes + timedelta(days=31))),
+        (consultas.VERSION_ACTIVIDADES_RANGO, (usuario_id, inicio_mes, inicio_mes + timedelta(days=31))),
+        (consultas.ACTIVIDADES_PAGINA, (501, usuario_id, inicio_mes, inicio_mes + timedelta(days=92),
+                                        inicio_mes, inicio_mes, -1, None, None)),
+        (consultas.CREDENCIALES, ("usuario", "usuario", "x")),
+    ]
+    if config.RECURRENCIAS:
+        catalogadas += [
+            (consultas.RECURRENCIAS_VENTANA, (usuario_id, inicio_mes + timedelta(days=31), inicio_mes,
+                                              inicio_mes, inicio_mes + timedelta(days=31))),
+            (consultas.EXCEPCIONES_VENTANA, (usuario_id, inicio_mes, inicio_mes + timedelta(days=31),
+                                             inicio_mes, inicio_mes + timedelta(days=31))),
+        ]
+    return [(nombre, consultas.sql(nombre), params) for nombre, params in catalogadas] + [
+        ("series_hora", *sql_series(usuario_id, ahora - timedelta(days=7), ahora, "hour",
+                                    ["ph", "humedad"], ["avg"], 5000)),
+    ]
+
+
+def plan_estimado(conn, query, params):
+    """XML del plan estimado, enviando la consulta igual que la API; no se ejecuta."""
+    cursor = conn.cursor()
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        cursor.execute(*consultas.parametrizar(query, params))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+
+
+def operadores(plan_xml):
+    """[(operador físico, tabla.índice)] de los accesos a datos del plan."""
+    raiz = ET.fromstring(plan_xml)
+    resultado = []
+    for relop in raiz.iter(f"{{{_SHOWPLAN['p']}}}RelOp"):
+        objeto = relop.find("./*/p:Object", _SHOWPLAN)
+        if objeto is None:
+            continue
+        tabla = objeto.get("Table", "").strip("[]")
+        indice = objeto.get("Index", "").strip("[]")
+        resultado.append((relop.get("PhysicalOp"), f"{tabla}.{indice}" if indice else tabla))
+    return resultado
+
+
+# ----------------- CLI -----------------
+def comando_estado(conn, migraciones):
+    registradas = aplicadas(conn.cursor())
+    conn.commit()
+    for m in migraciones:
+        if m.version not in registradas:
+            marca = "pendiente"
+        elif registradas[m.version] != m.hash:
+            marca = "⚠️ aplicada, el archivo cambió después"
+        else:
+            marca = "aplicada"
+        print(f"{m.version:04d} {m.nombre}: {marca}")
+    desconocidas = set(registradas) - {m.version for m in migraciones}
+    for version in sorted(desconocidas):
+        print(f"{version:04d} ⚠️ registrada pero sin archivo")
+
+
+def comando_aplicar(conn, migraciones, hasta=None):
+    registradas = aplicadas(conn.cursor())
+    conn.commit()
+    pendientes = [m for m in migraciones
+                  if m.version not in registradas and (hasta is None or m.version <= hasta)]
+    if not pendientes:
+        print("✅ No hay migraciones pendientes")
+        return
+    for m in pendientes:
+        print(f"→ {m.version:04d} {m.nombre}")
+        aplicar(conn, m)
+    print(f"✅ {len(pendientes)} migraciones aplicadas")
+
+
+def comando_planes(conn, usuario_id, guardar=None):
+    if guardar:
+        os.makedirs(guardar, exist_ok=True)
+    recorridos = 0
+    for nombre, query, params in consultas_calientes(usuario_id):
+        plan = plan_estimado(conn, query, params)
+        if guardar:
+            with open(os.path.join(guardar, f"{nombre}.sqlplan"), "w", encoding="utf-8") as f:
+                f.write(plan)
+        print(nombre)
+        for operador, objeto in operadores(plan):
+            marca = "⚠️ " if operador in _RECORRIDOS else "   "
+            recorridos += operador in _RECORRIDOS
+            print(f"  {marca}{operador}: {objeto}")
+    if recorridos:
+        print(f"⚠️ {recorridos} recorridos completos; revisar los índices")
+    else:
+        print("✅ Todas las consultas usan búsquedas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de AGROMAGU")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("estado", help="Lista las migraciones y si están aplicadas")
+    p_aplicar = sub.add_parser("aplicar", help="Aplica las migraciones pendientes en orden")
+    p_aplicar.add_argument("--hasta", type=int, help="Última versión a aplicar")
+    p_planes = sub.add_parser("planes", help="Plan estimado de las consultas calientes")
+    p_planes.add_argument("--usuario", type=int, default=1, help="usuario_id de ejemplo")
+    p_planes.add_argument("--guardar", help="Carpeta donde guardar los .sqlplan")
+    args = parser.parse_args()
+
+    migraciones = cargar_migraciones()
+    conn = get_db_connection()
+    try:
+        if args.comando == "estado":
+            comando_estado(conn, migraciones)
+        elif args.comando == "aplicar":
+            comando_aplicar(conn, migraciones, args.hasta)
+        else:
+            comando_planes(conn, args.usuario, args.guardar)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
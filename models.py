@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime, date
 
 class UsuarioRegistro(BaseModel):
@@ -21,6 +21,51 @@ class LecturaCreate(BaseModel):
     temperatura: float
     luz_solar: float
 
+# Columnas de valores de una lectura, en el orden de la tabla lecturas
+PARAMETROS = tuple(LecturaCreate.model_fields)
+
+class LecturaBatchItem(LecturaCreate):
+    usuario_id: Optional[int] = None  # si falta se usa el usuario_id del lote
+    fecha_hora: Optional[datetime] = None  # hora de la lectura en el dispositivo
+
+class LecturaBatch(BaseModel):
+    usuario_id: Optional[int] = None
+    # Se validan item por item para poder devolver un resultado por lectura
+    lecturas: List[Dict[str, Any]]
+
+class UsuariosBulk(BaseModel):
+    usuario_ids: List[int]
+
+class ActividadUpdate(BaseModel):
+    titulo: str
+    fecha: str  # formato "YYYY-MM-DD"
+    completada: bool
+
+class ActividadCreate(BaseModel):
+    usuario_id: int
+    titulo: str
+    fecha: str  # formato "YYYY-MM-DD"
+    completada: bool = False
+
+class ActividadRecurrenteCreate(BaseModel):
+    usuario_id: int
+    titulo: str
+    inicio: str  # formato "YYYY-MM-DD", primera ocurrencia
+    frecuencia: str  # diaria, semanal o mensual
+    intervalo: int = 1  # cada N días, semanas o meses
+    hasta: Optional[str] = None  # formato "YYYY-MM-DD", inclusive
+    repeticiones: Optional[int] = None
+
+class OcurrenciaUpdate(BaseModel):
+    # Los campos que no se envían conservan su valor
+    completada: Optional[bool] = None
+    nueva_fecha: Optional[str] = None  # formato "YYYY-MM-DD"; null vuelve a la fecha original
+    cancelada: Optional[bool] = None
+
+class ActividadesBulk(BaseModel):
+    # Se validan item por item para poder devolver un resultado por operación
+    operaciones: List[Dict[str, Any]]
+
 class UsuarioResponse(BaseModel):
     id: int
     username: str
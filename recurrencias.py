@@ -0,0 +1,172 @@
+"""
+Actividades recurrentes.
+
+Una regla (tabla actividades_recurrentes) guarda una sola vez una actividad
+que se repite cada `intervalo` días, semanas o meses desde `inicio`, hasta
+una fecha (`hasta`, inclusive) o un número de `repeticiones`, o sin fin. Las
+ocurrencias no se guardan: se calculan en memoria para la ventana que pide
+cada endpoint. Solo se guarda una fila en actividades_excepciones cuando una
+ocurrencia se completa, se mueve a otra fecha o se cancela.
+
+En las respuestas una ocurrencia tiene "id": null y su "recurrencia_id"; se
+modifica con PUT /api/actividades/recurrentes/{recurrencia_id}/ocurrencias/{fecha}.
+"""
+import calendar
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import consultas
+
+FRECUENCIAS = ("diaria", "semanal", "mensual")
+
+# Límite superior de las ventanas sin fin (actividad de hoy o la siguiente)
+FECHA_MAXIMA = date(9999, 12, 31)
+
+# Estado de una ocurrencia; `fecha` es la fecha original según la regla
+Excepcion = namedtuple("Excepcion", "fecha nueva_fecha completada cancelada")
+
+
+def a_fecha(valor):
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def sumar_meses(fecha, meses):
+    """Misma fecha `meses` después; el día se ajusta al último del mes si no existe."""
+    total = fecha.month - 1 + meses
+    anio, mes = fecha.year + total // 12, total % 12 + 1
+    return date(anio, mes, min(fecha.day, calendar.monthrange(anio, mes)[1]))
+
+
+class Regla:
+    def __init__(self, id, usuario_id, titulo, inicio, frecuencia, intervalo=1, hasta=None, repeticiones=None):
+        self.id = id
+        self.usuario_id = usuario_id
+        self.titulo = titulo
+        self.inicio = a_fecha(inicio)
+        self.frecuencia = frecuencia
+        self.intervalo = intervalo
+        self.hasta = a_fecha(hasta)
+        self.repeticiones = repeticiones
+
+    @classmethod
+    def desde_fila(cls, fila):
+        """Fila (id, usuario_id, titulo, inicio, frecuencia, intervalo, hasta, repeticiones)."""
+        return cls(*fila[:8])
+
+    def _ocurrencia(self, k):
+        if self.frecuencia == "mensual":
+            return sumar_meses(self.inicio, k * self.intervalo)
+        paso = self.intervalo * (7 if self.frecuencia == "semanal" else 1)
+        return self.inicio + timedelta(days=k * paso)
+
+    def _primer_indice(self, desde):
+        """Índice de la primera ocurrencia que puede caer en o después de `desde`."""
+        if desde <= self.inicio:
+            return 0
+        if self.frecuencia == "mensual":
+            meses = (desde.year - self.inicio.year) * 12 + desde.month - self.inicio.month
+            return max(0, meses // self.intervalo)
+        paso = self.intervalo * (7 if self.frecuencia == "semanal" else 1)
+        return -(-(desde - self.inicio).days // paso)
+
+    def fechas(self, desde, hasta=None):
+        """Fechas originales de las ocurrencias en [desde, hasta), en orden; sin `hasta` no termina."""
+        k = self._primer_indice(desde)
+        while self.repeticiones is None or k < self.repeticiones:
+            fecha = self._ocurrencia(k)
+            if (self.hasta is not None and fecha > self.hasta) or (hasta is not None and fecha >= hasta):
+                return
+            if fecha >= desde:
+                yield fecha
+            k += 1
+
+    def es_ocurrencia(self, fecha):
+        return next(self.fechas(fecha, fecha + timedelta(days=1)), None) == fecha
+
+
+def expandir(regla, excepciones, desde, hasta):
+    """
+    Ocurrencias de la regla que caen en [desde, hasta) como [(fecha, completada)],
+    aplicando las excepciones {fecha original: Excepcion}.
+    """
+    resultado = []
+    for fecha in regla.fechas(desde, hasta):
+        excepcion = excepciones.get(fecha)
+        if excepcion is None:
+            resultado.append((fecha, False))
+        elif not excepcion.cancelada:
+            efectiva = excepcion.nueva_fecha or fecha
+            if desde <= efectiva < hasta:
+                resultado.append((efectiva, excepcion.completada))
+
+    # Ocurrencias de fuera de la ventana movidas dentro de ella
+    for excepcion in excepciones.values():
+        if (not excepcion.cancelada and excepcion.nueva_fecha is not None
+                and desde <= excepcion.nueva_fecha < hasta
+                and not desde <= excepcion.fecha < hasta
+                and regla.es_ocurrencia(excepcion.fecha)):
+            resultado.append((excepcion.nueva_fecha, excepcion.completada))
+    return sorted(resultado)
+
+
+def primera_desde(regla, excepciones, desde):
+    """Primera ocurrencia efectiva en o después de `desde` como (fecha, completada), o None."""
+    movidas = [
+        (e.nueva_fecha, e.completada) for e in excepciones.values()
+        if not e.cancelada and e.nueva_fecha is not None and e.nueva_fecha >= desde
+        and regla.es_ocurrencia(e.fecha)
+    ]
+    mejor = min(movidas) if movidas else None
+    # Las excepciones son finitas: tras ellas siempre hay una ocurrencia sin excepción
+    for fecha in regla.fechas(desde):
+        if mejor is not None and fecha >= mejor[0]:
+            break
+        excepcion = excepciones.get(fecha)
+        if excepcion is None:
+            return fecha, False
+        if not excepcion.cancelada and excepcion.nueva_fecha is None:
+            return fecha, excepcion.completada
+    return mejor
+
+
+def fila_ocurrencia(regla, fecha, completada):
+    """Ocurrencia con la forma de una fila de actividades (id, fecha, titulo, completada, recurrencia_id)."""
+    return (None, datetime.combine(fecha, datetime.min.time()), regla.titulo, completada, regla.id)
+
+
+# ----------------- BASE DE DATOS -----------------
+def consultar_ventana(cursor, usuario_id, desde, hasta=FECHA_MAXIMA):
+    """
+    Reglas del usuario con ocurrencias posibles en [desde, hasta) y sus
+    excepciones en la ventana: ([Regla], {recurrencia_id: {fecha: Excepcion}}).
+    """
+    consultas.ejecutar(cursor, consultas.RECURRENCIAS_VENTANA, (usuario_id, hasta, desde, desde, hasta))
+    reglas = [Regla.desde_fila(fila) for fila in cursor.fetchall()]
+    excepciones = {}
+    if reglas:
+        consultas.ejecutar(cursor, consultas.EXCEPCIONES_VENTANA, (usuario_id, desde, hasta, desde, hasta))
+        for recurrencia_id, fecha, nueva_fecha, completada, cancelada in cursor.fetchall():
+            excepciones.setdefault(recurrencia_id, {})[a_fecha(fecha)] = Excepcion(
+                a_fecha(fecha), a_fecha(nueva_fecha), bool(completada), bool(cancelada)
+            )
+    return reglas, excepciones
+
+
+def ocurrencias_en_rango(reglas, excepciones, desde, hasta):
+    """Filas de las ocurrencias de todas las reglas en [desde, hasta), ordenadas por fecha."""
+    filas = [
+        fila_ocurrencia(regla, fecha, completada)
+        for regla in reglas
+        for fecha, completada in expandir(regla, excepciones.get(regla.id, {}), desde, hasta)
+    ]
+    return sorted(filas, key=lambda fila: fila[1])
+
+
+def siguiente_ocurrencia(reglas, excepciones, desde):
+    """Fila de la primera ocurrencia en o después de `desde` entre todas las reglas, o None."""
+    mejor = None
+    for regla in reglas:
+        primera = primera_desde(regla, excepciones.get(regla.id, {}), desde)
+        if primera is not None and (mejor is None or primera[0] < mejor[1].date()):
+            mejor = fila_ocurrencia(regla, *primera)
+    return mejor
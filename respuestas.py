@@ -0,0 +1,112 @@
+"""
+Serialización de respuestas grandes.
+
+FastAPI pasa lo que devuelve un handler por jsonable_encoder, que recorre
+cada valor en Python, y después por json.dumps. Los handlers con respuestas
+grandes (históricos, actividades) devuelven en cambio `negociar(request, datos)`:
+el contenido va directo a orjson, o a MessagePack si el cliente lo pide con
+`Accept: application/msgpack`.
+
+Las lecturas de datos del usuario llevan además un ETag calculado a partir
+de un validador barato del recurso (no del cuerpo) y Cache-Control; `validar`
+responde 304 Not Modified antes de armar la respuesta si el cliente ya la tiene.
+"""
+import hashlib
+from datetime import date, datetime
+
+import msgpack
+import numpy as np
+import orjson
+from fastapi.responses import Response
+
+import config
+
+MSGPACK = "application/msgpack"
+_TIPOS_MSGPACK = (MSGPACK, "application/x-msgpack")
+
+
+class RespuestaJSON(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_default(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    raise TypeError(f"No se puede serializar {type(valor).__name__} en MessagePack")
+
+
+class RespuestaMsgPack(Response):
+    media_type = MSGPACK
+
+    def render(self, content):
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def acepta_msgpack(accept):
+    """True si el encabezado Accept prefiere MessagePack sobre JSON."""
+    if not accept:
+        return False
+    preferencias = {}
+    for parte in accept.split(","):
+        tipo, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.strip().partition("=")
+            if clave == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        preferencias[tipo.strip().lower()] = calidad
+
+    q_msgpack = max((preferencias.get(t, 0.0) for t in _TIPOS_MSGPACK), default=0.0)
+    q_json = max(preferencias.get("application/json", 0.0),
+                 preferencias.get("application/*", 0.0), preferencias.get("*/*", 0.0))
+    return q_msgpack > 0 and q_msgpack >= q_json
+
+
+def negociar(request, contenido, status_code=200, headers=None):
+    """Respuesta en MessagePack o JSON según el Accept de la petición."""
+    clase = RespuestaMsgPack if acepta_msgpack(request.headers.get("accept")) else RespuestaJSON
+    respuesta = clase(contenido, status_code=status_code, headers=headers)
+    respuesta.headers["Vary"] = "Accept"
+    return respuesta
+
+
+# ----------------- GET CONDICIONAL -----------------
+def calcular_etag(*partes):
+    """
+    ETag débil a partir de los valores que determinan la representación.
+    Es débil porque la misma representación puede viajar comprimida o no.
+    """
+    resumen = hashlib.blake2b(repr(partes).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{resumen}"'
+
+
+def coincide_etag(if_none_match, etag):
+    """Comparación débil de If-None-Match con el ETag actual."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaca = etag.removeprefix("W/")
+    return any(e.strip().removeprefix("W/") == opaca for e in if_none_match.split(","))
+
+
+def validar(request, *partes, cache_control=None):
+    """
+    ETag de la representación: las `partes` del recurso más el formato negociado.
+    Devuelve (respuesta 304 o None, encabezados para la respuesta completa).
+    """
+    etag = calcular_etag(acepta_msgpack(request.headers.get("accept")), *partes)
+    encabezados = {"ETag": etag, "Cache-Control": cache_control or config.CACHE_CONTROL_DATOS}
+    if coincide_etag(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={**encabezados, "Vary": "Accept"}), encabezados
+    return None, encabezados
@@ -0,0 +1,169 @@
+"""
+Resumen diario de lecturas (tabla lecturas_diarias).
+
+Por cada (usuario_id, fecha) guarda el total de lecturas y la suma, el mínimo
+y el máximo de cada parámetro. Se actualiza en la misma transacción que
+inserta las lecturas, así los históricos leen una fila por día en lugar de
+agrupar todas las lecturas crudas.
+
+Puesta en marcha sobre una base existente (--crear-tabla aplica las
+migraciones pendientes hasta la 0002, igual que python migrar.py aplicar --hasta 2):
+
+    python rollup.py --crear-tabla
+    python rollup.py --backfill
+
+Para corregir desvíos (por ejemplo lecturas insertadas fuera de la API) se
+puede recalcular un rango:
+
+    python rollup.py --backfill --desde 2024-05-01 --hasta 2024-05-31 [--usuario 7]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import consultas
+from database import get_db_connection
+from models import PARAMETROS
+
+# Migración de migrar.py que crea la tabla (migraciones/0002_lecturas_diarias.sql)
+MIGRACION_TABLA = 2
+
+_COLUMNAS_AGREGADAS = [f"{agg}_{p}" for p in PARAMETROS for agg in ("suma", "min", "max")]
+_COLUMNAS = ["usuario_id", "fecha", "total"] + _COLUMNAS_AGREGADAS
+_GRUPOS_POR_MERGE = 2000 // len(_COLUMNAS)
+
+
+def agrupar_filas(filas):
+    """
+    Agrega en memoria las filas (usuario_id, <parámetros>, fecha_hora) por
+    (usuario_id, fecha). Devuelve {(usuario_id, fecha): [total, suma, min, max, ...]}.
+    """
+    grupos = {}
+    for fila in filas:
+        usuario_id, valores, fecha_hora = fila[0], fila[1:-1], fila[-1]
+        clave = (usuario_id, fecha_hora.date())
+        acumulado = grupos.get(clave)
+        if acumulado is None:
+            acumulado = [0]
+            for v in valores:
+                acumulado.extend((0.0, v, v))
+            grupos[clave] = acumulado
+        acumulado[0] += 1
+        for i, v in enumerate(valores):
+            base = 1 + i * 3
+            acumulado[base] += v
+            if v < acumulado[base + 1]:
+                acumulado[base + 1] = v
+            if v > acumulado[base + 2]:
+                acumulado[base + 2] = v
+    return grupos
+
+
+def _sql_merge(cantidad):
+    marcador = "(" + ", ".join(["%s"] * len(_COLUMNAS)) + ")"
+    actualizaciones = ["total = d.total + s.total"]
+    for p in PARAMETROS:
+        actualizaciones.append(f"suma_{p} = ISNULL(d.suma_{p}, 0) + s.suma_{p}")
+        actualizaciones.append(
+            f"min_{p} = CASE WHEN d.min_{p} IS NULL OR s.min_{p} < d.min_{p} THEN s.min_{p} ELSE d.min_{p} END"
+        )
+        actualizaciones.append(
+            f"max_{p} = CASE WHEN d.max_{p} IS NULL OR s.max_{p} > d.max_{p} THEN s.max_{p} ELSE d.max_{p} END"
+        )
+    actualizaciones.append("actualizado_en = GETDATE()")
+    columnas = ", ".join(_COLUMNAS)
+    return f"""
+        MERGE lecturas_diarias WITH (HOLDLOCK) AS d
+        USING (VALUES {", ".join([marcador] * cantidad)}) AS s ({columnas})
+        ON d.usuario_id = s.usuario_id AND d.fecha = s.fecha
+        WHEN MATCHED THEN UPDATE SET {", ".join(actualizaciones)}
+        WHEN NOT MATCHED THEN INSERT ({columnas})
+            VALUES ({", ".join("s." + c for c in _COLUMNAS)});
+    """
+
+
+def actualizar_rollup(cursor, filas):
+    """Suma las filas recién insertadas al resumen diario (sin commit)."""
+    grupos = list(agrupar_filas(filas).items())
+    for inicio in range(0, len(grupos), _GRUPOS_POR_MERGE):
+        tramo = grupos[inicio:inicio + _GRUPOS_POR_MERGE]
+        params = []
+        for (usuario_id, fecha), acumulado in tramo:
+            params.extend((usuario_id, fecha, *acumulado))
+        consultas.ejecutar(cursor, consultas.ROLLUP_MERGE, params, sql=_sql_merge(len(tramo)))
+
+
+def recalcular(cursor, desde=None, hasta=None, usuario_id=None):
+    """
+    Reconstruye el resumen a partir de las lecturas crudas para el rango de
+    fechas [desde, hasta] (ambos opcionales e inclusivos) y, si se indica,
+    solo para un usuario. No hace commit.
+    """
+    condiciones_resumen = []
+    condiciones_lecturas = []
+    params = []
+    if usuario_id is not None:
+        condiciones_resumen.append("usuario_id = %s")
+        condiciones_lecturas.append("usuario_id = %s")
+        params.append(usuario_id)
+    if desde is not None:
+        condiciones_resumen.append("fecha >= %s")
+        condiciones_lecturas.append("fecha_hora >= %s")
+        params.append(desde)
+    if hasta is not None:
+        condiciones_resumen.append("fecha < %s")
+        condiciones_lecturas.append("fecha_hora < %s")
+        params.append(hasta + timedelta(days=1))
+
+    where_resumen = (" WHERE " + " AND ".join(condiciones_resumen)) if condiciones_resumen else ""
+    where_lecturas = (" WHERE " + " AND ".join(condiciones_lecturas)) if condiciones_lecturas else ""
+
+    cursor.execute("DELETE FROM lecturas_diarias" + where_resumen, tuple(params))
+
+    agregados = ", ".join(
+        f"SUM(CAST({p} AS FLOAT)), MIN(CAST({p} AS FLOAT)), MAX(CAST({p} AS FLOAT))" for p in PARAMETROS
+    )
+    cursor.execute(f"""
+        INSERT INTO lecturas_diarias ({", ".join(_COLUMNAS)})
+        SELECT usuario_id, CAST(fecha_hora AS DATE), COUNT(*), {agregados}
+        FROM lecturas{where_lecturas}
+        GROUP BY usuario_id, CAST(fecha_hora AS DATE)
+    """, tuple(params))
+    return cursor.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la tabla lecturas_diarias")
+    parser.add_argument("--crear-tabla", action="store_true",
+                        help=f"Aplica las migraciones pendientes hasta la {MIGRACION_TABLA:04d}, que crea la tabla")
+    parser.add_argument("--backfill", action="store_true", help="Recalcula el resumen desde las lecturas")
+    parser.add_argument("--desde", help="Fecha inicial YYYY-MM-DD (inclusive)")
+    parser.add_argument("--hasta", help="Fecha final YYYY-MM-DD (inclusive)")
+    parser.add_argument("--usuario", type=int, help="Limitar a un usuario_id")
+    args = parser.parse_args()
+
+    if not (args.crear_tabla or args.backfill):
+        parser.error("Indique --crear-tabla y/o --backfill")
+
+    desde = datetime.strptime(args.desde, "%Y-%m-%d").date() if args.desde else None
+    hasta = datetime.strptime(args.hasta, "%Y-%m-%d").date() if args.hasta else None
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if args.crear_tabla:
+            # La tabla se define solo en la migración; así queda registrada en schema_migraciones
+            from migrar import cargar_migraciones, comando_aplicar
+            comando_aplicar(conn, cargar_migraciones(), hasta=MIGRACION_TABLA)
+            print("✅ Tabla lecturas_diarias lista")
+        if args.backfill:
+            # Evita contar dos veces lecturas que llegan mientras se recalcula
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL SERIALIZABLE")
+            dias = recalcular(cursor, desde, hasta, args.usuario)
+            conn.commit()
+            print(f"✅ Resumen recalculado: {dias} días")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,115 +1,296 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from database import get_db_connection
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request
+from database import db_connection, run_db
+from models import (
+    ActividadCreate, ActividadRecurrenteCreate, ActividadUpdate, ActividadesBulk, OcurrenciaUpdate
+)
+from datetime import date, datetime, timedelta
+from typing import Optional
+import base64
+import cache
+import config
+import consultas
+from lote_actividades import aplicar_operaciones, completar_resultados, validar_operaciones
+import recurrencias
+from respuestas import negociar, validar
 
 router = APIRouter(prefix="/api/actividades", tags=["actividades"])
 
-# ----------------- MODELOS -----------------
-class ActividadUpdate(BaseModel):
-    titulo: str
-    fecha: str  # formato "YYYY-MM-DD"
-    completada: bool
-
-class ActividadCreate(BaseModel):
-    usuario_id: int
-    titulo: str
-    fecha: str  # formato "YYYY-MM-DD"
-    completada: bool = False
-
 # ----------------- ENDPOINTS EXISTENTES -----------------
-@router.get("/{usuario_id}/{mes}/{anio}")
-async def obtener_actividades(usuario_id: int, mes: int, anio: int):
-    try:
-        conn = get_db_connection()
+def formatear_actividad(fila):
+    """Fila (id, fecha, titulo, completada[, recurrencia_id]) con el formato de la API."""
+    actividad = {
+        "id": fila[0],
+        "fecha": fila[1].strftime("%Y-%m-%d"),
+        "titulo": fila[2],
+        "completada": bool(fila[3])
+    }
+    if len(fila) > 4:
+        actividad["recurrencia_id"] = fila[4]
+    return actividad
+
+def _actividades_mes(cursor, usuario_id, fecha_inicio, fecha_fin):
+    """Actividades guardadas del rango y ocurrencias de las recurrentes, por fecha."""
+    consultas.ejecutar(cursor, consultas.ACTIVIDADES_RANGO, (usuario_id, fecha_inicio, fecha_fin))
+    filas = cursor.fetchall()
+    if not config.RECURRENCIAS:
+        return filas
+    desde, hasta = fecha_inicio.date(), fecha_fin.date()
+    reglas, excepciones = recurrencias.consultar_ventana(cursor, usuario_id, desde, hasta)
+    ocurrencias = recurrencias.ocurrencias_en_rango(reglas, excepciones, desde, hasta)
+    # sorted es estable: en el mismo día van primero las guardadas
+    return sorted([*filas, *ocurrencias], key=lambda fila: recurrencias.a_fecha(fila[1]))
+
+def _version_actividades(cursor, usuario_id, fecha_inicio, fecha_fin, con_recurrencias=False):
+    """Conteo y rowversion máximo del rango: una fila, sin leer ni armar el listado."""
+    consultas.ejecutar(cursor, consultas.VERSION_ACTIVIDADES_RANGO, (usuario_id, fecha_inicio, fecha_fin))
+    version = tuple(cursor.fetchone())
+    if con_recurrencias and config.RECURRENCIAS:
+        consultas.ejecutar(cursor, consultas.VERSION_RECURRENCIAS, (usuario_id, usuario_id))
+        version += tuple(cursor.fetchone())
+    return version
+
+def _consultar_si_cambio(request, partes, version, datos):
+    """
+    Valida el ETag y lee los datos con una sola conexión: `version(cursor)` se
+    agrega a `partes` y `datos(cursor)` solo se ejecuta si el cliente no tiene
+    la versión actual. Devuelve (304 o None, encabezados, datos o None).
+    """
+    with db_connection() as conn:
         cursor = conn.cursor()
+        no_modificado, encabezados = validar(request, *partes, version(cursor))
+        if no_modificado is not None:
+            return no_modificado, encabezados, None
+        return None, encabezados, datos(cursor)
 
+@router.get("/{usuario_id}/{mes}/{anio}")
+async def obtener_actividades(request: Request, usuario_id: int, mes: int, anio: int):
+    try:
         fecha_inicio = datetime(anio, mes, 1)
         fecha_fin = datetime(anio + 1, 1, 1) if mes == 12 else datetime(anio, mes + 1, 1)
 
-        cursor.execute("""
-            SELECT id, fecha, titulo, completada
-            FROM actividades
-            WHERE usuario_id = %s
-            AND fecha >= %s AND fecha < %s
-            ORDER BY fecha
-        """, (usuario_id, fecha_inicio, fecha_fin))
+        no_modificado, encabezados, results = await run_db(
+            _consultar_si_cambio, request, ("actividades", usuario_id, anio, mes),
+            lambda c: _version_actividades(c, usuario_id, fecha_inicio, fecha_fin, True),
+            lambda c: _actividades_mes(c, usuario_id, fecha_inicio, fecha_fin)
+        )
+        if no_modificado is not None:
+            return no_modificado
 
-        results = cursor.fetchall()
-        conn.close()
+        actividades = [formatear_actividad(row) for row in results]
 
-        actividades = [
-            {
-                "id": row[0],
-                "fecha": row[1].strftime("%Y-%m-%d"),
-                "titulo": row[2],
-                "completada": bool(row[3])
-            }
-            for row in results
-        ]
+        return negociar(request, actividades, headers=encabezados)
 
-        return actividades
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ----------------- RANGO DE FECHAS (CALENDARIO) -----------------
+COLUMNAS_RANGO = ["id", "titulo", "completada"]
+
+# Mayor id posible (columna INT): después de una ocurrencia siguen las guardadas de la fecha siguiente
+_ID_MAXIMO = 2 ** 31 - 1
+
+# Orden del rango: (fecha, 0, id, 0) para las guardadas y (fecha, 1, recurrencia_id, n)
+# para las ocurrencias, que van después de las guardadas del mismo día; n distingue
+# dos ocurrencias de la misma regla en un día (una movida sobre otra).
+def _clave_guardada(fila):
+    return (fila[1], 0, fila[0], 0)
+
+def _claves_ocurrencias(ocurrencias):
+    """[(clave, fila)] de las ocurrencias, en el orden del rango."""
+    vistas = {}
+    resultado = []
+    for fila in sorted(ocurrencias, key=lambda fila: (fila[1], fila[4], fila[3])):
+        orden = vistas.get((fila[1], fila[4]), 0)
+        vistas[(fila[1], fila[4])] = orden + 1
+        resultado.append(((fila[1], 1, fila[4], orden), fila))
+    return resultado
+
+def _codificar_cursor(clave, version):
+    """Clave de la última actividad entregada y versión de la primera página, opacas para el cliente."""
+    fecha, tipo, identificador, orden = clave
+    texto = f"{fecha.isoformat()}|{tipo}|{identificador}|{orden}|{version}"
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decodificar_cursor(cursor):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        fecha, tipo, identificador, orden, version = texto.split("|")
+        return (datetime.fromisoformat(fecha), int(tipo), int(identificador), int(orden)), version
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="cursor inválido")
+
+def _pagina(cursor, usuario_id, desde, hasta, clave, completada, limite):
+    """
+    Hasta limite + 1 actividades del rango después de `clave` como [(clave, fila)]:
+    las guardadas con ACTIVIDADES_PAGINA y, con RECURRENCIAS, las ocurrencias de
+    las recurrentes calculadas en memoria.
+    """
+    filtro = None if completada is None else int(completada)
+    ultimo_id = clave[2] if clave[1] == 0 else _ID_MAXIMO
+    consultas.ejecutar(cursor, consultas.ACTIVIDADES_PAGINA, (
+        limite + 1, usuario_id, desde, hasta, clave[0], clave[0], ultimo_id, filtro, filtro
+    ))
+    filas = [(_clave_guardada(fila), fila) for fila in cursor.fetchall()]
+    if not config.RECURRENCIAS:
+        return filas
+
+    # Con la página llena de guardadas solo hacen falta las ocurrencias hasta la última
+    inicio, fin = clave[0].date(), hasta.date()
+    if len(filas) > limite:
+        fin = min(fin, recurrencias.a_fecha(filas[-1][1][1]) + timedelta(days=1))
+    reglas, excepciones = recurrencias.consultar_ventana(cursor, usuario_id, inicio, fin)
+    ocurrencias = [
+        (clave_ocurrencia, fila)
+        for clave_ocurrencia, fila in _claves_ocurrencias(
+            recurrencias.ocurrencias_en_rango(reglas, excepciones, inicio, fin)
+        )
+        if clave_ocurrencia > clave and (completada is None or fila[3] == completada)
+    ]
+    return sorted(filas + ocurrencias, key=lambda par: par[0])[:limite + 1]
+
+def _consultar_pagina(usuario_id, desde, hasta, clave, completada, limite):
+    with db_connection() as conn:
+        return _pagina(conn.cursor(), usuario_id, desde, hasta, clave, completada, limite)
+
+@router.get("/rango/{usuario_id}")
+async def obtener_actividades_rango(
+    request: Request,
+    usuario_id: int,
+    desde: date = Query(...),
+    hasta: date = Query(..., description="Exclusivo"),
+    completada: Optional[bool] = Query(None),
+    limite: int = Query(config.ACTIVIDADES_PAGINA, ge=1, le=config.ACTIVIDADES_PAGINA_MAX),
+    cursor: Optional[str] = Query(None),
+):
+    """
+    Actividades del rango [desde, hasta) agrupadas por día, en orden de fecha:
+    {"columnas": ["id", "titulo", "completada"], "dias": {"YYYY-MM-DD": [[...], ...]}, "siguiente"}.
+    Si `siguiente` no es null hay más actividades: se piden con cursor=siguiente.
+    Con RECURRENCIAS se incluyen las ocurrencias de las recurrentes, con id null
+    y una columna más, "recurrencia_id".
+
+    La versión del rango se consulta solo en la primera página y viaja en los
+    cursores: si algo cambia, la primera página tiene otro ETag y otros cursores.
+    """
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="desde debe ser anterior a hasta")
+    fecha_inicio = datetime.combine(desde, datetime.min.time())
+    fecha_fin = datetime.combine(hasta, datetime.min.time())
+    partes = ("rango", usuario_id, desde, hasta, completada, limite)
+    if cursor:
+        clave, version = _decodificar_cursor(cursor)
+    else:
+        clave, version = (fecha_inicio, 0, -1, 0), None
+
+    try:
+        if version is None:
+            no_modificado, encabezados, filas = await run_db(
+                _consultar_si_cambio, request, partes,
+                lambda c: _version_actividades(c, usuario_id, fecha_inicio, fecha_fin, True),
+                lambda c: _pagina(c, usuario_id, fecha_inicio, fecha_fin, clave, completada, limite)
+            )
+            # El ETag de la primera página ya resume la versión del rango
+            version = encabezados["ETag"][3:-1]
+        else:
+            # Páginas siguientes: la versión viaja en el cursor, sin consultar la base de datos
+            no_modificado, encabezados = validar(request, *partes, clave, version)
+            if no_modificado is None:
+                filas = await run_db(_consultar_pagina, usuario_id, fecha_inicio, fecha_fin,
+                                     clave, completada, limite)
+        if no_modificado is not None:
+            return no_modificado
+
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            siguiente = _codificar_cursor(filas[-1][0], version)
+
+        columnas = COLUMNAS_RANGO + ["recurrencia_id"] if config.RECURRENCIAS else COLUMNAS_RANGO
+        dias = {}
+        for _, fila in filas:
+            valores = [fila[0], fila[2], bool(fila[3])]
+            if config.RECURRENCIAS:
+                valores.append(fila[4] if len(fila) > 4 else None)
+            dias.setdefault(fila[1].strftime("%Y-%m-%d"), []).append(valores)
+
+        return negociar(request, {
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "columnas": columnas,
+            "dias": dias,
+            "siguiente": siguiente
+        }, headers=encabezados)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _marcar_completada(actividad_id):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.COMPLETAR_ACTIVIDAD, (actividad_id,))
+        fila = cursor.fetchone()
+        conn.commit()
+        return fila[0] if fila else None
+
 @router.put("/{actividad_id}/completar")
 async def completar_actividad(actividad_id: int):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE actividades SET completada = 1 WHERE id = %s", (actividad_id,))
-        conn.commit()
-        conn.close()
+        usuario_id = await run_db(_marcar_completada, actividad_id)
+        if usuario_id is not None:
+            cache.actividades_modificadas([usuario_id])
         return {"success": True, "message": "Actividad completada"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.put("/{actividad_id}")
-async def modificar_actividad(actividad_id: int, datos: ActividadUpdate):
-    try:
-        conn = get_db_connection()
+def _actualizar_actividad(actividad_id, datos, fecha_dt):
+    with db_connection() as conn:
         cursor = conn.cursor()
-        fecha_dt = datetime.strptime(datos.fecha, "%Y-%m-%d")
-        cursor.execute("""
-            UPDATE actividades
-            SET titulo = %s, fecha = %s, completada = %s
-            WHERE id = %s
-        """, (datos.titulo, fecha_dt, int(datos.completada), actividad_id))
+        consultas.ejecutar(cursor, consultas.ACTUALIZAR_ACTIVIDAD,
+                           (datos.titulo, fecha_dt, int(datos.completada), actividad_id))
 
-        if cursor.rowcount == 0:
-            conn.close()
+        fila = cursor.fetchone()
+        if not fila:
             raise HTTPException(status_code=404, detail="Actividad no encontrada")
 
         conn.commit()
-        conn.close()
+        return fila[0]
+
+@router.put("/{actividad_id}")
+async def modificar_actividad(actividad_id: int, datos: ActividadUpdate):
+    try:
+        fecha_dt = datetime.strptime(datos.fecha, "%Y-%m-%d")
+        usuario_id = await run_db(_actualizar_actividad, actividad_id, datos, fecha_dt)
+        cache.actividades_modificadas([usuario_id])
         return {"success": True, "message": "Actividad modificada"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # ----------------- NUEVO: CREAR ACTIVIDAD -----------------
-@router.post("/")
-async def crear_actividad(datos: ActividadCreate):
-    try:
-        conn = get_db_connection()
+def _insertar_actividad(datos, fecha_dt):
+    with db_connection() as conn:
         cursor = conn.cursor()
-        fecha_dt = datetime.strptime(datos.fecha, "%Y-%m-%d")
-
-        cursor.execute("""
-            INSERT INTO actividades (usuario_id, titulo, fecha, completada)
-            OUTPUT INSERTED.id
-            VALUES (%s, %s, %s, %s)
-        """, (datos.usuario_id, datos.titulo, fecha_dt, int(datos.completada)))
+        consultas.ejecutar(cursor, consultas.INSERTAR_ACTIVIDAD,
+                           (datos.usuario_id, datos.titulo, fecha_dt, int(datos.completada)))
 
         # Obtener el nuevo ID
         new_id = cursor.fetchone()[0]
 
         conn.commit()
-        conn.close()
+        return new_id
+
+@router.post("/")
+async def crear_actividad(datos: ActividadCreate):
+    try:
+        fecha_dt = datetime.strptime(datos.fecha, "%Y-%m-%d")
+        new_id = await run_db(_insertar_actividad, datos, fecha_dt)
+        cache.actividades_modificadas([datos.usuario_id])
 
         return {"success": True, "message": "Actividad creada", "id": new_id}
 
@@ -119,75 +300,284 @@ async def crear_actividad(datos: ActividadCreate):
 
 
 # ----------------- NUEVO: ELIMINAR ACTIVIDAD -----------------
-@router.delete("/{actividad_id}")
-async def eliminar_actividad(actividad_id: int):
-    try:
-        conn = get_db_connection()
+def _borrar_actividad(actividad_id):
+    with db_connection() as conn:
         cursor = conn.cursor()
 
-        cursor.execute("DELETE FROM actividades WHERE id = %s", (actividad_id,))
-        if cursor.rowcount == 0:
-            conn.close()
+        consultas.ejecutar(cursor, consultas.BORRAR_ACTIVIDAD, (actividad_id,))
+        fila = cursor.fetchone()
+        if not fila:
             raise HTTPException(status_code=404, detail="Actividad no encontrada")
 
         conn.commit()
-        conn.close()
+        return fila[0]
+
+@router.delete("/{actividad_id}")
+async def eliminar_actividad(actividad_id: int):
+    try:
+        usuario_id = await run_db(_borrar_actividad, actividad_id)
+        cache.actividades_modificadas([usuario_id])
         return {"success": True, "message": "Actividad eliminada"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# ----------------- NUEVO: ACTIVIDAD DE HOY O LA SIGUIENTE -----------------
-@router.get("/hoy/{usuario_id}")
-async def actividad_hoy_o_siguiente(usuario_id: int):
+# ----------------- OPERACIONES EN LOTE -----------------
+@router.post("/bulk")
+async def actividades_bulk(lote: ActividadesBulk):
     """
-    Devuelve la actividad de hoy de un usuario. 
-    Si no hay, devuelve la siguiente actividad pendiente.
+    Aplica varias operaciones (crear, modificar, completar, eliminar) en una
+    sola transacción. Devuelve un resultado por operación, en el mismo orden,
+    con el id creado o afectado; las inválidas o con id inexistente llevan ok=False.
     """
+    if len(lote.operaciones) > config.ACTIVIDADES_BULK_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {config.ACTIVIDADES_BULK_MAX} operaciones por lote"
+        )
+
     try:
-        conn = get_db_connection()
+        operaciones, resultados = validar_operaciones(lote.operaciones)
+        nuevos, encontrados, usuarios = await run_db(aplicar_operaciones, operaciones)
+        cache.actividades_modificadas(usuarios)
+        completar_resultados(operaciones, resultados, nuevos, encontrados)
+
+        aplicadas = sum(1 for r in resultados if r["ok"])
+        return {
+            "success": True,
+            "recibidas": len(resultados),
+            "aplicadas": aplicadas,
+            "rechazadas": len(resultados) - aplicadas,
+            "resultados": resultados
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ----------------- ACTIVIDADES RECURRENTES -----------------
+def _recurrencias_activas():
+    """Sin RECURRENCIAS las tablas pueden no existir y las reglas no se mostrarían."""
+    if not config.RECURRENCIAS:
+        raise HTTPException(status_code=404, detail="Las actividades recurrentes no están habilitadas")
+
+def _parsear_fecha(texto, campo):
+    try:
+        return datetime.strptime(texto, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{campo} debe tener formato YYYY-MM-DD")
+
+def _insertar_recurrencia(datos, inicio, hasta):
+    with db_connection() as conn:
         cursor = conn.cursor()
-        hoy = datetime.today().date()
+        consultas.ejecutar(cursor, consultas.INSERTAR_RECURRENCIA, (
+            datos.usuario_id, datos.titulo, inicio, datos.frecuencia, datos.intervalo, hasta, datos.repeticiones
+        ))
+        new_id = cursor.fetchone()[0]
+        conn.commit()
+        return new_id
 
-        # Buscar actividad de hoy
-        cursor.execute("""
-            SELECT TOP 1 id, fecha, titulo, completada
-            FROM actividades
-            WHERE usuario_id = %s AND CAST(fecha AS DATE) = %s
-            ORDER BY fecha
-        """, (usuario_id, hoy))
-        actividad = cursor.fetchone()
+@router.post("/recurrentes")
+async def crear_actividad_recurrente(datos: ActividadRecurrenteCreate):
+    """
+    Guarda la regla una sola vez; sus ocurrencias aparecen en el listado por mes
+    y en /hoy con "id": null y su "recurrencia_id".
+    """
+    _recurrencias_activas()
+    if datos.frecuencia not in recurrencias.FRECUENCIAS:
+        raise HTTPException(status_code=400,
+                            detail=f"frecuencia debe ser {', '.join(recurrencias.FRECUENCIAS)}")
+    if datos.intervalo < 1 or (datos.repeticiones is not None and datos.repeticiones < 1):
+        raise HTTPException(status_code=400, detail="intervalo y repeticiones deben ser >= 1")
+    inicio = _parsear_fecha(datos.inicio, "inicio")
+    hasta = _parsear_fecha(datos.hasta, "hasta") if datos.hasta else None
+    if hasta is not None and hasta < inicio:
+        raise HTTPException(status_code=400, detail="hasta no puede ser anterior a inicio")
 
-        if actividad:
-            conn.close()
-            return {
-                "id": actividad[0],
-                "fecha": actividad[1].strftime("%Y-%m-%d"),
-                "titulo": actividad[2],
-                "completada": bool(actividad[3])
-            }
+    try:
+        new_id = await run_db(_insertar_recurrencia, datos, inicio, hasta)
+        cache.actividades_modificadas([datos.usuario_id])
+        return {"success": True, "message": "Actividad recurrente creada", "id": new_id}
 
-        # Si no hay actividad hoy, buscar la siguiente pendiente
-        cursor.execute("""
-            SELECT TOP 1 id, fecha, titulo, completada
-            FROM actividades
-            WHERE usuario_id = %s AND CAST(fecha AS DATE) > %s
-            ORDER BY fecha
-        """, (usuario_id, hoy))
-        siguiente = cursor.fetchone()
-        conn.close()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if siguiente:
-            return {
-                "id": siguiente[0],
-                "fecha": siguiente[1].strftime("%Y-%m-%d"),
-                "titulo": siguiente[2],
-                "completada": bool(siguiente[3]),
-                "mensaje": "No hay actividad hoy, esta es la siguiente programada"
+def _consultar_recurrencias(usuario_id):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.RECURRENCIAS_USUARIO, (usuario_id,))
+        return [recurrencias.Regla.desde_fila(fila) for fila in cursor.fetchall()]
+
+@router.get("/recurrentes/{usuario_id}")
+async def obtener_actividades_recurrentes(usuario_id: int):
+    _recurrencias_activas()
+    try:
+        reglas = await run_db(_consultar_recurrencias, usuario_id)
+        return [
+            {
+                "id": regla.id,
+                "titulo": regla.titulo,
+                "inicio": regla.inicio.isoformat(),
+                "frecuencia": regla.frecuencia,
+                "intervalo": regla.intervalo,
+                "hasta": regla.hasta.isoformat() if regla.hasta else None,
+                "repeticiones": regla.repeticiones
             }
+            for regla in reglas
+        ]
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _borrar_recurrencia(recurrencia_id):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.BORRAR_RECURRENCIA, (recurrencia_id,))
+        fila = cursor.fetchone()
+        if not fila:
+            raise HTTPException(status_code=404, detail="Actividad recurrente no encontrada")
+        conn.commit()
+        return fila[0]
+
+@router.delete("/recurrentes/{recurrencia_id}")
+async def eliminar_actividad_recurrente(recurrencia_id: int):
+    """Elimina la regla y todas sus ocurrencias (también las completadas)."""
+    _recurrencias_activas()
+    try:
+        usuario_id = await run_db(_borrar_recurrencia, recurrencia_id)
+        cache.actividades_modificadas([usuario_id])
+        return {"success": True, "message": "Actividad recurrente eliminada"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _guardar_ocurrencia(recurrencia_id, fecha, cambios):
+    """Aplica `cambios` sobre el estado actual de la ocurrencia y lo guarda como excepción."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.RECURRENCIA_Y_EXCEPCION, (fecha, recurrencia_id))
+        fila = cursor.fetchone()
+        if not fila:
+            raise HTTPException(status_code=404, detail="Actividad recurrente no encontrada")
+        if not recurrencias.Regla.desde_fila(fila).es_ocurrencia(fecha):
+            raise HTTPException(status_code=404, detail="La actividad recurrente no ocurre en esa fecha")
+
+        estado = {
+            "nueva_fecha": recurrencias.a_fecha(fila[8]),
+            "completada": bool(fila[9]),
+            "cancelada": bool(fila[10]),
+            **cambios
+        }
+        consultas.ejecutar(cursor, consultas.GUARDAR_EXCEPCION, (
+            recurrencia_id, fecha, estado["nueva_fecha"], int(estado["completada"]), int(estado["cancelada"])
+        ))
+        conn.commit()
+        return fila[1], estado
+
+@router.put("/recurrentes/{recurrencia_id}/ocurrencias/{fecha}")
+async def modificar_ocurrencia(recurrencia_id: int, fecha: str, datos: OcurrenciaUpdate):
+    """
+    Completa, mueve (nueva_fecha) o cancela una ocurrencia; `fecha` es la fecha
+    original según la regla. Los campos que no se envían no cambian.
+    """
+    _recurrencias_activas()
+    fecha_original = _parsear_fecha(fecha, "fecha")
+    cambios = {}
+    if datos.completada is not None:
+        cambios["completada"] = datos.completada
+    if datos.cancelada is not None:
+        cambios["cancelada"] = datos.cancelada
+    if "nueva_fecha" in datos.model_fields_set:
+        nueva_fecha = _parsear_fecha(datos.nueva_fecha, "nueva_fecha") if datos.nueva_fecha else None
+        cambios["nueva_fecha"] = None if nueva_fecha == fecha_original else nueva_fecha
 
+    try:
+        usuario_id, estado = await run_db(_guardar_ocurrencia, recurrencia_id, fecha_original, cambios)
+        cache.actividades_modificadas([usuario_id])
+        return {
+            "success": True,
+            "message": "Ocurrencia actualizada",
+            "recurrencia_id": recurrencia_id,
+            "fecha": fecha_original.isoformat(),
+            "nueva_fecha": estado["nueva_fecha"].isoformat() if estado["nueva_fecha"] else None,
+            "completada": estado["completada"],
+            "cancelada": estado["cancelada"]
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ----------------- NUEVO: ACTIVIDAD DE HOY O LA SIGUIENTE -----------------
+
+def respuesta_hoy_o_siguiente(fila, hoy):
+    """
+    Respuesta de /hoy a partir de la primera actividad con fecha >= hoy
+    (fila id, fecha, titulo, completada[, recurrencia_id]) o None.
+    """
+    if not fila:
         return {"message": "No hay actividades para hoy ni próximas"}
 
+    respuesta = formatear_actividad(fila)
+    fecha = fila[1].date() if isinstance(fila[1], datetime) else fila[1]
+    if fecha != hoy:
+        respuesta["mensaje"] = "No hay actividad hoy, esta es la siguiente programada"
+    return respuesta
+
+def con_recurrentes(cursor, usuario_id, hoy, fila):
+    """
+    `fila` (la guardada más próxima desde hoy, o None) o la próxima ocurrencia
+    de una recurrente si cae antes.
+    """
+    if not config.RECURRENCIAS:
+        return fila
+    reglas, excepciones = recurrencias.consultar_ventana(cursor, usuario_id, hoy)
+    ocurrencia = recurrencias.siguiente_ocurrencia(reglas, excepciones, hoy)
+    if ocurrencia is not None and (not fila or ocurrencia[1].date() < recurrencias.a_fecha(fila[1])):
+        return ocurrencia
+    return fila
+
+def _consultar_hoy_o_siguiente(usuario_id, hoy):
+    """Primera actividad desde el inicio de `hoy` (la de hoy o la siguiente)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.HOY_O_SIGUIENTE,
+                           (usuario_id, datetime.combine(hoy, datetime.min.time())))
+        return con_recurrentes(cursor, usuario_id, hoy, cursor.fetchone())
+
+async def hoy_o_siguiente(usuario_id, hoy):
+    """
+    Fila de la actividad de hoy o la siguiente, () si no hay ninguna. Sale del
+    puntero en memoria; solo si falta se consulta la base de datos.
+    """
+    clave = (usuario_id, hoy)
+    fila = cache.siguiente_actividad.get(clave)
+    if fila is None:
+        generacion = cache.siguiente_actividad.generacion(usuario_id)
+        fila = tuple(await run_db(_consultar_hoy_o_siguiente, usuario_id, hoy) or ())
+        cache.siguiente_actividad.set(clave, fila, generacion)
+    return fila
+
+@router.get("/hoy/{usuario_id}")
+async def actividad_hoy_o_siguiente(request: Request, usuario_id: int):
+    """
+    Devuelve la actividad de hoy de un usuario. 
+    Si no hay, devuelve la siguiente actividad pendiente.
+    """
+    try:
+        hoy = datetime.today().date()
+        actividad = await hoy_o_siguiente(usuario_id, hoy)
+
+        # Una sola fila: el validador es la propia fila
+        no_modificado, encabezados = validar(request, "hoy", usuario_id, hoy, actividad)
+        if no_modificado is not None:
+            return no_modificado
+        return negociar(request, respuesta_hoy_o_siguiente(actividad, hoy), headers=encabezados)
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
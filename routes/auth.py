@@ -66,54 +66,51 @@ async def login_usuario(usuario: UsuarioLogin):
 
 from fastapi import APIRouter, HTTPException
 from models import UsuarioRegistro, UsuarioLogin
-from database import get_db_connection
+from database import db_connection, run_db
+import consultas
 
 router = APIRouter(prefix="/api", tags=["auth"])
 
-@router.post("/registro")
-async def registrar_usuario(usuario: UsuarioRegistro):
-    try:
-        conn = get_db_connection()
+def _insertar_usuario(usuario):
+    with db_connection() as conn:
         cursor = conn.cursor()
         
         # Verificar si usuario existe
-        cursor.execute(
-            "SELECT COUNT(*) FROM usuarios WHERE username = %s OR email = %s", 
-            (usuario.username, usuario.email)
-        )
+        consultas.ejecutar(cursor, consultas.USUARIO_EXISTE, (usuario.username, usuario.email))
         count = cursor.fetchone()[0]
         
         if count > 0:
-            conn.close()
             raise HTTPException(status_code=400, detail="Usuario o email ya existe")
         
         # Insertar usuario
-        cursor.execute("""
-            INSERT INTO usuarios (username, email, password, telefono) 
-            VALUES (%s, %s, %s, %s)
-        """, (usuario.username, usuario.email, usuario.password, usuario.telefono))
+        consultas.ejecutar(cursor, consultas.INSERTAR_USUARIO,
+                           (usuario.username, usuario.email, usuario.password, usuario.telefono))
         
         conn.commit()
-        conn.close()
+
+@router.post("/registro")
+async def registrar_usuario(usuario: UsuarioRegistro):
+    try:
+        await run_db(_insertar_usuario, usuario)
         
         return {"success": True, "message": "Usuario registrado"}
         
     except Exception as e:
         return {"success": False, "message": str(e)}
 
-@router.post("/login")
-async def login_usuario(usuario: UsuarioLogin):
-    try:
-        conn = get_db_connection()
+def _buscar_credenciales(usuario):
+    with db_connection() as conn:
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT id, username, email FROM usuarios 
-            WHERE (username = %s OR email = %s) AND password = %s
-        """, (usuario.username, usuario.username, usuario.password))
+        consultas.ejecutar(cursor, consultas.CREDENCIALES,
+                           (usuario.username, usuario.username, usuario.password))
         
-        result = cursor.fetchone()
-        conn.close()
+        return cursor.fetchone()
+
+@router.post("/login")
+async def login_usuario(usuario: UsuarioLogin):
+    try:
+        result = await run_db(_buscar_credenciales, usuario)
         
         if result:
             return {
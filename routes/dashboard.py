@@ -0,0 +1,76 @@
+from fastapi import APIRouter, HTTPException
+from database import db_connection, run_db
+from datetime import date, datetime
+import cache
+import consultas
+from routes.lecturas import acumulado_desde_fila, consulta_acumulado_dia, respuesta_promedio_hoy
+from routes.actividades import con_recurrentes, respuesta_hoy_o_siguiente
+
+router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
+
+# ----------------- PANTALLA DE INICIO -----------------
+def _consultar_dashboard(usuario_id, hoy, con_actividad=True):
+    """
+    Última lectura, acumulado de hoy y actividad de hoy (o la siguiente) en
+    un solo lote SQL: una conexión, un viaje de ida y vuelta, tres resultados.
+    Con con_actividad=False (el puntero ya está en memoria) la actividad no se consulta.
+    """
+    acumulado, params_acumulado = consulta_acumulado_dia(usuario_id, hoy)
+    nombres = [consultas.ULTIMA_LECTURA, acumulado]
+    params = (usuario_id, *params_acumulado)
+    if con_actividad:
+        nombres.append(consultas.HOY_O_SIGUIENTE)
+        params += (usuario_id, datetime.combine(hoy, datetime.min.time()))
+    lote = ";\n".join(consultas.sql(nombre) for nombre in nombres)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.DASHBOARD, params, sql=lote)
+        ultima = cursor.fetchone()
+        cursor.nextset()
+        acumulado = cursor.fetchone()
+        actividad = None
+        if con_actividad:
+            cursor.nextset()
+            actividad = con_recurrentes(cursor, usuario_id, hoy, cursor.fetchone())
+    return ultima, acumulado, actividad
+
+@router.get("/{usuario_id}")
+async def obtener_dashboard(usuario_id: int):
+    """
+    Reúne en una sola respuesta lo que la pantalla de inicio pedía a
+    /api/lecturas/ultima, /api/lecturas/promedio-hoy y /api/actividades/hoy.
+    """
+    try:
+        hoy = date.today()
+        generacion_ultima = cache.ultima_lectura.generacion(usuario_id)
+        generacion_acumulado = cache.acumulados.generacion(usuario_id)
+        generacion_actividad = cache.siguiente_actividad.generacion(usuario_id)
+        actividad = cache.siguiente_actividad.get((usuario_id, hoy))
+
+        ultima, fila_acumulado, fila_actividad = await run_db(
+            _consultar_dashboard, usuario_id, hoy, actividad is None
+        )
+
+        # Se aprovecha la consulta para calentar los índices en memoria
+        ultima_lectura = None
+        if ultima:
+            ultima_lectura = cache.formatear_ultima_lectura(ultima)
+            cache.ultima_lectura.set((usuario_id,), (ultima[7], ultima_lectura), generacion_ultima)
+
+        total, sumas = acumulado_desde_fila(fila_acumulado)
+        cache.acumulados.set((usuario_id, hoy), (total, sumas), generacion_acumulado)
+
+        if actividad is None:
+            actividad = tuple(fila_actividad or ())
+            cache.siguiente_actividad.set((usuario_id, hoy), actividad, generacion_actividad)
+
+        return {
+            "usuario_id": usuario_id,
+            "ultima_lectura": ultima_lectura,
+            "promedio_hoy": respuesta_promedio_hoy(hoy, total, sumas),
+            "actividad": respuesta_hoy_o_siguiente(actividad, hoy)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,116 +1,276 @@
-from fastapi import APIRouter, HTTPException, Query
-from models import LecturaCreate
-from database import get_db_connection
-from datetime import date, datetime
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from models import PARAMETROS, LecturaCreate, LecturaBatch, UsuariosBulk
+from database import db_connection, run_db
+from ingesta import BufferLlenoError, guardar_lecturas, registrar_lectura, validar_lote
+from datetime import date, datetime, timedelta
+from typing import Optional
+import cache
+import config
+import consultas
+from respuestas import negociar, validar
+from historico import (
+    METADATA_PARAMETROS, PERIODOS, normalizar_periodo, reducir_serie, respuesta_compacta,
+    serie_diaria, texto_periodo
+)
+from analitica import resumen_por_parametro
+from series import ConsultaSeriesError, consultar_series, normalizar_consulta
+from exportacion import FORMATOS as FORMATOS_EXPORTACION, RespuestaExportacion, abrir_exportacion
 
 router = APIRouter(prefix="/api/lecturas", tags=["lecturas"])
 
+# Parámetros que muestran los históricos y las gráficas
+PARAMETROS_HISTORICO = ["nitrogeno", "fosforo", "potasio", "ph", "humedad", "temperatura"]
+
 # ----------------- CREAR LECTURA -----------------
 @router.post("")
 async def crear_lectura(lectura: LecturaCreate, usuario_id: int = Query(...)):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO lecturas (usuario_id, nitrogeno, fosforo, potasio, ph, humedad, temperatura, luz_solar)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (usuario_id, lectura.nitrogeno, lectura.fosforo, lectura.potasio, 
-              lectura.ph, lectura.humedad, lectura.temperatura, lectura.luz_solar))
-        
-        conn.commit()
-        conn.close()
-        
-        return {"success": True, "message": "Lectura guardada"}
-        
+        confirmada = await registrar_lectura(usuario_id, lectura)
+
+        if confirmada:
+            return {"success": True, "message": "Lectura guardada"}
+        return {"success": True, "message": "Lectura recibida", "pendiente": True}
+
+    except BufferLlenoError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ----------------- CREAR LECTURAS EN LOTE -----------------
+@router.post("/batch")
+async def crear_lecturas_batch(lote: LecturaBatch):
+    """
+    Guarda varias lecturas (de uno o varios usuarios) en una sola transacción.
+    Las lecturas inválidas se reportan en `resultados` y no impiden guardar el resto.
+    """
+    if len(lote.lecturas) > config.LECTURAS_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {config.LECTURAS_BATCH_MAX} lecturas por lote"
+        )
+
+    try:
+        filas, resultados = validar_lote(lote.lecturas, lote.usuario_id)
+        await run_db(guardar_lecturas, filas)
+
+        return {
+            "success": True,
+            "recibidas": len(resultados),
+            "guardadas": len(filas),
+            "rechazadas": len(resultados) - len(filas),
+            "resultados": resultados
+        }
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ----------------- ÚLTIMA LECTURA -----------------
+def _consultar_ultima_lectura(usuario_id):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.ULTIMA_LECTURA, (usuario_id,))
+        return cursor.fetchone()
+
 @router.get("/ultima/{usuario_id}")
-async def obtener_ultima_lectura(usuario_id: int):
+async def obtener_ultima_lectura(request: Request, usuario_id: int):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT TOP 1 nitrogeno, fosforo, potasio, ph, humedad, temperatura, luz_solar, fecha_hora
-            FROM lecturas 
-            WHERE usuario_id = %s 
-            ORDER BY fecha_hora DESC
-        """, (usuario_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return {
-                "nitrogeno": float(result[0]),
-                "fosforo": float(result[1]),
-                "potasio": float(result[2]),
-                "ph": float(result[3]),
-                "humedad": float(result[4]),
-                "temperatura": float(result[5]),
-                "luz_solar": float(result[6]),
-                "fecha_hora": result[7].isoformat()
-            }
-        else:
-            return {"message": "No hay lecturas disponibles"}
-            
+        # Índice en memoria; si no está, se consulta la base de datos
+        cacheada = cache.ultima_lectura.get((usuario_id,))
+        if cacheada is None:
+            generacion = cache.ultima_lectura.generacion(usuario_id)
+            result = await run_db(_consultar_ultima_lectura, usuario_id)
+            if not result:
+                return {"message": "No hay lecturas disponibles"}
+            cacheada = (result[7], cache.formatear_ultima_lectura(result))
+            cache.ultima_lectura.set((usuario_id,), cacheada, generacion)
+
+        # La fecha_hora de la última lectura identifica la respuesta
+        no_modificado, encabezados = validar(request, "ultima", usuario_id, cacheada[0])
+        if no_modificado is not None:
+            return no_modificado
+        return negociar(request, cacheada[1], headers=encabezados)
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# ----------------- HISTÓRICO -----------------
-@router.get("/historico/{usuario_id}/{periodo}")
-async def obtener_datos_historicos(usuario_id: int, periodo: str):
+# ----------------- SERIES POR RANGO -----------------
+@router.get("/series")
+async def obtener_series(
+    request: Request,
+    usuario_id: int = Query(...),
+    desde: datetime = Query(...),
+    hasta: Optional[datetime] = Query(None),
+    bucket: str = Query("day"),
+    parametros: Optional[str] = Query(None, description="Lista separada por comas; por defecto todos"),
+    agregados: Optional[str] = Query(None, description="avg, min, max, sum, count; por defecto avg"),
+):
+    """
+    Serie de lecturas en el rango [desde, hasta) agrupada por bucket
+    (raw, 15min, hour, day, week, month). `hasta` por defecto es ahora.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        if periodo == "1mes":
-            fecha_consulta = "DATEADD(MONTH, -1, GETDATE())"
-        elif periodo == "3meses":
-            fecha_consulta = "DATEADD(MONTH, -3, GETDATE())"
-        else:
-            fecha_consulta = "DATEADD(MONTH, -6, GETDATE())"
-        
-        query = f"""
-            SELECT 
-                CAST(fecha_hora AS DATE) as fecha,
-                AVG(CAST(nitrogeno AS FLOAT)) as nitrogeno,
-                AVG(CAST(fosforo AS FLOAT)) as fosforo,
-                AVG(CAST(potasio AS FLOAT)) as potasio,
-                AVG(CAST(ph AS FLOAT)) as ph,
-                AVG(CAST(humedad AS FLOAT)) as humedad,
-                AVG(CAST(temperatura AS FLOAT)) as temperatura
-            FROM lecturas 
-            WHERE usuario_id = %s AND fecha_hora >= {fecha_consulta}
-            GROUP BY CAST(fecha_hora AS DATE)
-            ORDER BY CAST(fecha_hora AS DATE)
-        """
-        
-        cursor.execute(query, (usuario_id,))
-        results = cursor.fetchall()
-        conn.close()
-        
-        datos = []
-        for row in results:
-            datos.append({
-                "fecha": row[0].strftime("%Y-%m-%d"),
-                "nitrogeno": float(row[1]) if row[1] else 0,
-                "fosforo": float(row[2]) if row[2] else 0,
-                "potasio": float(row[3]) if row[3] else 0,
-                "ph": float(row[4]) if row[4] else 0,
-                "humedad": float(row[5]) if row[5] else 0,
-                "temperatura": float(row[6]) if row[6] else 0
-            })
-        
-        return datos
-        
+        desde, hasta, bucket, parametros, agregados = normalizar_consulta(
+            desde, hasta, bucket, parametros, agregados
+        )
+    except ConsultaSeriesError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        datos = await run_db(
+            consultar_series, usuario_id, desde, hasta, bucket, parametros, agregados,
+            config.SERIES_MAX_PUNTOS
+        )
+        return negociar(request, {
+            "usuario_id": usuario_id,
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "bucket": bucket,
+            "parametros": parametros,
+            "agregados": agregados if bucket != "raw" else [],
+            **datos
+        })
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ----------------- EXPORTACIÓN -----------------
+@router.get("/export/{usuario_id}")
+async def exportar_lecturas(
+    usuario_id: int,
+    desde: datetime = Query(...),
+    hasta: Optional[datetime] = Query(None),
+    formato: str = Query("csv", alias="format", description="csv o ndjson"),
+    parametros: Optional[str] = Query(None, description="Lista separada por comas; por defecto todos"),
+):
+    """
+    Lecturas crudas del rango [desde, hasta) en CSV o NDJSON, enviadas por
+    lotes a medida que se leen. `hasta` por defecto es ahora.
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise HTTPException(status_code=400, detail="format debe ser csv o ndjson")
+    try:
+        desde, hasta, _, parametros, _ = normalizar_consulta(desde, hasta, "raw", parametros, None)
+    except ConsultaSeriesError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        lector = await abrir_exportacion(usuario_id, desde, hasta, parametros)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    nombre = f"lecturas_{usuario_id}_{desde:%Y%m%d}_{hasta:%Y%m%d}.{formato}"
+    return RespuestaExportacion(lector, formato, nombre)
+
+# ----------------- VERSIÓN DE LAS LECTURAS -----------------
+def consulta_version_lecturas(usuario_id):
+    """(sentencia, params) de una fila: total de lecturas y última fecha_hora del usuario."""
+    if config.ROLLUP_DIARIO:
+        return consultas.VERSION_LECTURAS_RESUMEN, (usuario_id, usuario_id)
+    return consultas.VERSION_LECTURAS, (usuario_id,)
+
+def _consultar_version_lecturas(usuario_id):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, *consulta_version_lecturas(usuario_id))
+        total, ultima = cursor.fetchone()
+        return int(total or 0), ultima
+
+async def _version_lecturas(usuario_id):
+    """
+    Validador del ETag de los históricos desde memoria; si falta se consulta la
+    base de datos. Cualquier lectura nueva, aunque llegue con fecha atrasada,
+    cambia el total.
+    """
+    clave = (usuario_id,)
+    version = cache.versiones_lecturas.get(clave)
+    if version is None:
+        generacion = cache.versiones_lecturas.generacion(usuario_id)
+        version = await run_db(_consultar_version_lecturas, usuario_id)
+        cache.versiones_lecturas.set(clave, version, generacion)
+    return version
+
+async def _validar_historico(request, usuario_id, *partes):
+    """(304 o None, encabezados); el período depende además del día actual."""
+    version = await _version_lecturas(usuario_id)
+    return validar(request, "historico", usuario_id, version, date.today(), *partes)
+
+# ----------------- HISTÓRICO -----------------
+def _campos_compactos(formato, fields):
+    """Parámetros pedidos en modo compacto, o None para la respuesta completa."""
+    if formato not in ("full", "compact"):
+        raise HTTPException(status_code=400, detail="format debe ser full o compact")
+    if fields is None:
+        return list(PARAMETROS_HISTORICO) if formato == "compact" else None
+    campos = []
+    for campo in fields.split(","):
+        campo = campo.strip()
+        if campo not in PARAMETROS_HISTORICO:
+            raise HTTPException(status_code=400, detail=f"Parámetro inválido: {campo}")
+        if campo not in campos:
+            campos.append(campo)
+    return campos
+
+async def _historico_compacto(usuario_id, periodo, campos, max_points):
+    serie = await serie_diaria(usuario_id, periodo)
+    serie, _ = reducir_serie(serie, max_points, campos)
+    return respuesta_compacta(serie, periodo, campos)
+
+@router.get("/metadata")
+async def obtener_metadata(response: Response):
+    """Datos estáticos de los parámetros y períodos, para el modo compacto del histórico."""
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return {
+        "parametros": METADATA_PARAMETROS,
+        "periodos": {periodo: texto for periodo, (_, texto) in PERIODOS.items()}
+    }
+
+# ----------------- ACUMULADOS DEL DÍA -----------------
+def consulta_acumulado_dia(usuario_id, fecha):
+    """(sentencia, params) de una fila: total y suma por parámetro del día."""
+    if config.ROLLUP_DIARIO:
+        return consultas.ACUMULADO_DIA_RESUMEN, (usuario_id, fecha)
+    inicio = datetime.combine(fecha, datetime.min.time())
+    return consultas.ACUMULADO_DIA_LECTURAS, (usuario_id, inicio, inicio + timedelta(days=1))
+
+def consulta_acumulado_dia_varios(usuario_ids, fecha):
+    """(sentencia, params) de una fila por usuario con lecturas: usuario_id, total y sumas."""
+    ids = consultas.lista_ids(usuario_ids)
+    if config.ROLLUP_DIARIO:
+        return consultas.ACUMULADO_DIA_RESUMEN_VARIOS, (ids, fecha)
+    inicio = datetime.combine(fecha, datetime.min.time())
+    return consultas.ACUMULADO_DIA_LECTURAS_VARIOS, (ids, inicio, inicio + timedelta(days=1))
+
+def acumulado_desde_fila(row):
+    """(total, [suma por parámetro]) a partir de la fila de consulta_acumulado_dia."""
+    if not row or not row[0]:
+        return 0, [0.0] * len(PARAMETROS)
+    return row[0], [float(v or 0) for v in row[1:]]
+
+def _consultar_acumulado_dia(usuario_id, fecha):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, *consulta_acumulado_dia(usuario_id, fecha))
+        return acumulado_desde_fila(cursor.fetchone())
+
+async def _acumulado_dia(usuario_id, fecha):
+    """Acumulado del día desde memoria; si falta se rehidrata desde la base de datos."""
+    clave = (usuario_id, fecha)
+    acumulado = cache.acumulados.get(clave)
+    if acumulado is None:
+        generacion = cache.acumulados.generacion(usuario_id)
+        acumulado = await run_db(_consultar_acumulado_dia, usuario_id, fecha)
+        cache.acumulados.set(clave, acumulado, generacion)
+    return acumulado
+
 # ----------------- NUEVO: PROMEDIO DEL DÍA -----------------
+def _consultar_promedio_dia(usuario_id, fecha_inicio, fecha_fin):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.PROMEDIO_RANGO, (usuario_id, fecha_inicio, fecha_fin))
+        return cursor.fetchone()
+
 @router.get("/promedio/{usuario_id}")
 async def promedio_dia(usuario_id: int, fecha: str = Query(..., description="Fecha en formato YYYY-MM-DD")):
     """
@@ -119,26 +279,18 @@ async def promedio_dia(usuario_id: int, fecha: str = Query(..., description="Fec
     """
     try:
         fecha_dt = datetime.strptime(fecha, "%Y-%m-%d")
-        fecha_inicio = fecha_dt.strftime("%Y-%m-%d 00:00:00")
-        fecha_fin = fecha_dt.strftime("%Y-%m-%d 23:59:59")
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                AVG(CAST(nitrogeno AS FLOAT)) as nitrogeno,
-                AVG(CAST(fosforo AS FLOAT)) as fosforo,
-                AVG(CAST(potasio AS FLOAT)) as potasio,
-                AVG(CAST(ph AS FLOAT)) as ph,
-                AVG(CAST(humedad AS FLOAT)) as humedad,
-                AVG(CAST(temperatura AS FLOAT)) as temperatura,
-                AVG(CAST(luz_solar AS FLOAT)) as luz_solar
-            FROM lecturas
-            WHERE usuario_id = %s AND fecha_hora BETWEEN %s AND %s
-        """, (usuario_id, fecha_inicio, fecha_fin))
+        if fecha_dt.date() == date.today():
+            total, sumas = await _acumulado_dia(usuario_id, fecha_dt.date())
+            if total:
+                return {"fecha": fecha, **cache.promedios_acumulados(total, sumas)}
+            return {"message": "No hay lecturas para esa fecha"}
 
-        result = cursor.fetchone()
-        conn.close()
+        # Rango semiabierto: incluye todo el último segundo del día
+        fecha_inicio = fecha_dt
+        fecha_fin = fecha_dt + timedelta(days=1)
+
+        result = await run_db(_consultar_promedio_dia, usuario_id, fecha_inicio, fecha_fin)
 
         if result and any(result):
             return {
@@ -161,92 +313,63 @@ async def promedio_dia(usuario_id: int, fecha: str = Query(..., description="Fec
 
 # ----------------- HISTÓRICO PARA GRÁFICAS -----------------
 @router.get("/historico/{usuario_id}/{periodo}")
-async def obtener_datos_historicos(usuario_id: int, periodo: str):
+async def obtener_datos_historicos(request: Request, usuario_id: int, periodo: str,
+                                   max_points: Optional[int] = Query(None, ge=3),
+                                   formato: str = Query("full", alias="format"),
+                                   fields: Optional[str] = Query(None),
+                                   analisis: bool = Query(False)):
     """
     Devuelve el histórico dividido por parámetro con valor actual, valor anterior,
     descripción y datos completos para gráficas con formato de series temporales.
+    Con max_points las series de las gráficas se reducen a ese número de días (LTTB).
+    Con analisis=1 cada parámetro del resumen trae además sus estadísticas y la media móvil.
+    Con format=compact o fields=... devuelve solo fechas y una columna por parámetro;
+    los metadatos están en /api/lecturas/metadata.
     """
+    campos = _campos_compactos(formato, fields)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Definir fecha de consulta según período
-        if periodo == "1mes":
-            fecha_consulta = "DATEADD(MONTH, -1, GETDATE())"
-            periodo_texto = "Último mes"
-        elif periodo == "3meses":
-            fecha_consulta = "DATEADD(MONTH, -3, GETDATE())"
-            periodo_texto = "Últimos 3 meses"
-        else:
-            fecha_consulta = "DATEADD(MONTH, -6, GETDATE())"
-            periodo_texto = "Últimos 6 meses"
-
-        # Traer todas las lecturas agrupadas por fecha con formato para gráficas
-        query = f"""
-            SELECT 
-                CAST(fecha_hora AS DATE) as fecha,
-                AVG(CAST(nitrogeno AS FLOAT)) as nitrogeno,
-                AVG(CAST(fosforo AS FLOAT)) as fosforo,
-                AVG(CAST(potasio AS FLOAT)) as potasio,
-                AVG(CAST(ph AS FLOAT)) as ph,
-                AVG(CAST(humedad AS FLOAT)) as humedad,
-                AVG(CAST(temperatura AS FLOAT)) as temperatura
-            FROM lecturas 
-            WHERE usuario_id = %s AND fecha_hora >= {fecha_consulta}
-            GROUP BY CAST(fecha_hora AS DATE)
-            ORDER BY CAST(fecha_hora AS DATE)
-        """
-        cursor.execute(query, (usuario_id,))
-        results = cursor.fetchall()
-        conn.close()
+        no_modificado, encabezados = await _validar_historico(
+            request, usuario_id, periodo, max_points, campos, analisis
+        )
+        if no_modificado is not None:
+            return no_modificado
 
-        if not results:
-            return {"message": "No hay datos históricos disponibles"}
+        if campos is not None:
+            compacto = await _historico_compacto(usuario_id, periodo, campos, max_points)
+            return negociar(request, compacto, headers=encabezados)
 
-        # Procesar datos para formato de gráficas
-        fechas = []
-        datos_nitrogeno = []
-        datos_fosforo = []
-        datos_potasio = []
-        datos_ph = []
-        datos_humedad = []
-        datos_temperatura = []
+        clave = (usuario_id, "historico", normalizar_periodo(periodo), max_points, analisis)
+        cacheado = cache.historico.get(clave)
+        if cacheado is not None:
+            return negociar(request, cacheado, headers=encabezados)
+        generacion = cache.historico.generacion(usuario_id)
 
-        for row in results:
-            fecha_str = row[0].strftime("%Y-%m-%d")
-            fechas.append(fecha_str)
-            datos_nitrogeno.append(float(row[1]))
-            datos_fosforo.append(float(row[2]))
-            datos_potasio.append(float(row[3]))
-            datos_ph.append(float(row[4]))
-            datos_humedad.append(float(row[5]))
-            datos_temperatura.append(float(row[6]))
+        periodo_texto = texto_periodo(periodo)
 
-        # Tomamos el último valor y el anterior para mostrar la comparación
-        ultimo = results[-1]
-        anterior = results[-2] if len(results) > 1 else ultimo
+        # Serie diaria compartida con la gráfica por parámetro
+        serie = await serie_diaria(usuario_id, periodo)
 
-        # Calcular tendencias
-        def calcular_tendencia(datos):
-            if len(datos) < 2:
-                return "estable"
-            inicio = sum(datos[:len(datos)//3]) / (len(datos)//3)
-            final = sum(datos[-len(datos)//3:]) / (len(datos)//3)
-            if final > inicio * 1.05:  # 5% de incremento
-                return "creciente"
-            elif final < inicio * 0.95:  # 5% de decremento
-                return "decreciente"
-            else:
-                return "estable"
+        if not serie["fechas"]:
+            sin_datos = {"message": "No hay datos históricos disponibles"}
+            cache.historico.set(clave, sin_datos, generacion)
+            return negociar(request, sin_datos, headers=encabezados)
 
-        tendencias = {
-            "nitrogeno": calcular_tendencia(datos_nitrogeno),
-            "fosforo": calcular_tendencia(datos_fosforo),
-            "potasio": calcular_tendencia(datos_potasio),
-            "ph": calcular_tendencia(datos_ph),
-            "humedad": calcular_tendencia(datos_humedad),
-            "temperatura": calcular_tendencia(datos_temperatura)
-        }
+        # Procesar datos para formato de gráficas
+        grafica, indices = reducir_serie(serie, max_points, PARAMETROS_HISTORICO)
+        fechas = grafica["fechas"]
+        datos_nitrogeno = grafica["series"]["nitrogeno"]
+        datos_fosforo = grafica["series"]["fosforo"]
+        datos_potasio = grafica["series"]["potasio"]
+        datos_ph = grafica["series"]["ph"]
+        datos_humedad = grafica["series"]["humedad"]
+        datos_temperatura = grafica["series"]["temperatura"]
+
+        # Tomamos el último valor y el anterior (de la serie completa) para mostrar la comparación
+        anterior = -2 if len(serie["fechas"]) > 1 else -1
+
+        # Tendencias y estadísticas de todos los parámetros (sobre la serie completa)
+        resumen_parametros = resumen_por_parametro(serie, PARAMETROS_HISTORICO, indices=indices)
+        tendencias = {p: resumen_parametros[p]["tendencia"] for p in PARAMETROS_HISTORICO}
 
         # Generar recomendaciones basadas en tendencias
         recomendaciones = []
@@ -285,8 +408,8 @@ async def obtener_datos_historicos(usuario_id: int, periodo: str):
             "fechas": fechas,  # Array de fechas para el eje X
             "resumen": {
                 "nitrogeno": {
-                    "valor_actual": float(ultimo[1]),
-                    "valor_anterior": float(anterior[1]),
+                    "valor_actual": serie["series"]["nitrogeno"][-1],
+                    "valor_anterior": serie["series"]["nitrogeno"][anterior],
                     "unidad": "ppm",
                     "icono": "🌱",
                     "descripcion": "El nitrógeno es esencial para el crecimiento vegetativo y el desarrollo de hojas.",
@@ -296,8 +419,8 @@ async def obtener_datos_historicos(usuario_id: int, periodo: str):
                     "nombre": "Nitrógeno"
                 },
                 "fosforo": {
-                    "valor_actual": float(ultimo[2]),
-                    "valor_anterior": float(anterior[2]),
+                    "valor_actual": serie["series"]["fosforo"][-1],
+                    "valor_anterior": serie["series"]["fosforo"][anterior],
                     "unidad": "ppm",
                     "icono": "🧪",
                     "descripcion": "El fósforo favorece el desarrollo radicular y la formación de flores y frutos.",
@@ -307,8 +430,8 @@ async def obtener_datos_historicos(usuario_id: int, periodo: str):
                     "nombre": "Fósforo"
                 },
                 "potasio": {
-                    "valor_actual": float(ultimo[3]),
-                    "valor_anterior": float(anterior[3]),
+                    "valor_actual": serie["series"]["potasio"][-1],
+                    "valor_anterior": serie["series"]["potasio"][anterior],
                     "unidad": "ppm",
                     "icono": "🪴",
                     "descripcion": "El potasio mejora la resistencia a enfermedades y la calidad de los frutos.",
@@ -318,8 +441,8 @@ async def obtener_datos_historicos(usuario_id: int, periodo: str):
                     "nombre": "Potasio"
                 },
                 "ph": {
-                    "valor_actual": float(ultimo[4]),
-                    "valor_anterior": float(anterior[4]),
+                    "valor_actual": serie["series"]["ph"][-1],
+                    "valor_anterior": serie["series"]["ph"][anterior],
                     "unidad": "",
                     "icono": "⚗️",
                     "descripcion": "El pH afecta la disponibilidad de nutrientes para las plantas.",
@@ -329,8 +452,8 @@ async def obtener_datos_historicos(usuario_id: int, periodo: str):
                     "nombre": "pH del suelo"
                 },
                 "humedad": {
-                    "valor_actual": float(ultimo[5]),
-                    "valor_anterior": float(anterior[5]),
+                    "valor_actual": serie["series"]["humedad"][-1],
+                    "valor_anterior": serie["series"]["humedad"][anterior],
                     "unidad": "%",
                     "icono": "💧",
                     "descripcion": "La humedad del suelo es crucial para la absorción de nutrientes.",
@@ -340,8 +463,8 @@ async def obtener_datos_historicos(usuario_id: int, periodo: str):
                     "nombre": "Humedad"
                 },
                 "temperatura": {
-                    "valor_actual": float(ultimo[6]),
-                    "valor_anterior": float(anterior[6]),
+                    "valor_actual": serie["series"]["temperatura"][-1],
+                    "valor_anterior": serie["series"]["temperatura"][anterior],
                     "unidad": "°C",
                     "icono": "🌡️",
                     "descripcion": "La temperatura afecta los procesos metabólicos de las plantas.",
@@ -366,7 +489,7 @@ async def obtener_datos_historicos(usuario_id: int, periodo: str):
                             "color": "#4A6B2A"
                         },
                         {
-                            "nombre": "Fósforo", 
+                            "nombre": "Fósforo",
                             "datos": datos_fosforo,
                             "color": "#6B9EBF"
                         },
@@ -400,12 +523,34 @@ async def obtener_datos_historicos(usuario_id: int, periodo: str):
             }
         }
 
-        return historico
+        if analisis:
+            for parametro in PARAMETROS_HISTORICO:
+                historico["resumen"][parametro]["estadisticas"] = resumen_parametros[parametro]["estadisticas"]
+                historico["resumen"][parametro]["media_movil"] = resumen_parametros[parametro]["media_movil"]
+
+        cache.historico.set(clave, historico, generacion)
+        return negociar(request, historico, headers=encabezados)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ----------------- PROMEDIO DEL DÍA ACTUAL -----------------
+def respuesta_promedio_hoy(hoy, total, sumas):
+    if total > 0:  # Si hay lecturas (total_lecturas > 0)
+        return {
+            "fecha": hoy.strftime("%Y-%m-%d"),
+            "total_lecturas": total,
+            "promedios": cache.promedios_acumulados(total, sumas),
+            "message": f"Promedio de {total} lecturas del día de hoy"
+        }
+    else:
+        return {
+            "fecha": hoy.strftime("%Y-%m-%d"),
+            "message": "No hay lecturas para el día de hoy",
+            "total_lecturas": 0,
+            "promedios": None
+        }
+
 @router.get("/promedio-hoy/{usuario_id}")
 async def promedio_dia_actual(usuario_id: int):
     """
@@ -415,50 +560,105 @@ async def promedio_dia_actual(usuario_id: int):
     try:
         # Obtener la fecha actual
         hoy = date.today()
-        fecha_inicio = hoy.strftime("%Y-%m-%d 00:00:00")
-        fecha_fin = hoy.strftime("%Y-%m-%d 23:59:59")
 
-        conn = get_db_connection()
+        # Acumulados en memoria: no se vuelven a recorrer las lecturas de hoy
+        total, sumas = await _acumulado_dia(usuario_id, hoy)
+
+        return respuesta_promedio_hoy(hoy, total, sumas)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ----------------- VARIOS USUARIOS -----------------
+def _usuarios_bulk(datos):
+    usuario_ids = list(dict.fromkeys(datos.usuario_ids))
+    if not usuario_ids:
+        raise HTTPException(status_code=400, detail="usuario_ids no puede estar vacío")
+    if len(usuario_ids) > config.BULK_MAX_USUARIOS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo {config.BULK_MAX_USUARIOS} usuarios por petición"
+        )
+    return usuario_ids
+
+def _consultar_ultimas_lecturas(usuario_ids):
+    with db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                AVG(CAST(nitrogeno AS FLOAT)) as nitrogeno,
-                AVG(CAST(fosforo AS FLOAT)) as fosforo,
-                AVG(CAST(potasio AS FLOAT)) as potasio,
-                AVG(CAST(ph AS FLOAT)) as ph,
-                AVG(CAST(humedad AS FLOAT)) as humedad,
-                AVG(CAST(temperatura AS FLOAT)) as temperatura,
-                AVG(CAST(luz_solar AS FLOAT)) as luz_solar,
-                COUNT(*) as total_lecturas
-            FROM lecturas
-            WHERE usuario_id = %s AND fecha_hora BETWEEN %s AND %s
-        """, (usuario_id, fecha_inicio, fecha_fin))
+        consultas.ejecutar(cursor, consultas.ULTIMA_LECTURA_VARIOS, (consultas.lista_ids(usuario_ids),))
+        return {fila[0]: fila[1:] for fila in cursor.fetchall()}
 
-        result = cursor.fetchone()
-        conn.close()
+@router.post("/bulk/ultima")
+async def obtener_ultimas_lecturas(request: Request, datos: UsuariosBulk):
+    """
+    Última lectura de varios usuarios: {"usuarios": {usuario_id: lectura}}.
+    Los que no están en el índice en memoria se resuelven en una sola consulta.
+    """
+    usuario_ids = _usuarios_bulk(datos)
+    try:
+        lecturas = {}
+        faltan = []
+        for usuario_id in usuario_ids:
+            cacheada = cache.ultima_lectura.get((usuario_id,))
+            if cacheada is not None:
+                lecturas[usuario_id] = cacheada[1]
+            else:
+                faltan.append(usuario_id)
+
+        if faltan:
+            generaciones = {u: cache.ultima_lectura.generacion(u) for u in faltan}
+            filas = await run_db(_consultar_ultimas_lecturas, faltan)
+            for usuario_id in faltan:
+                fila = filas.get(usuario_id)
+                if fila is None:
+                    lecturas[usuario_id] = {"message": "No hay lecturas disponibles"}
+                    continue
+                lectura = cache.formatear_ultima_lectura(fila)
+                cache.ultima_lectura.set((usuario_id,), (fila[-1], lectura), generaciones[usuario_id])
+                lecturas[usuario_id] = lectura
+
+        return negociar(request, {"usuarios": {u: lecturas[u] for u in usuario_ids}})
 
-        if result and result[7] > 0:  # Si hay lecturas (total_lecturas > 0)
-            return {
-                "fecha": hoy.strftime("%Y-%m-%d"),
-                "total_lecturas": result[7],
-                "promedios": {
-                    "nitrogeno": round(float(result[0]), 2) if result[0] else 0,
-                    "fosforo": round(float(result[1]), 2) if result[1] else 0,
-                    "potasio": round(float(result[2]), 2) if result[2] else 0,
-                    "ph": round(float(result[3]), 2) if result[3] else 0,
-                    "humedad": round(float(result[4]), 2) if result[4] else 0,
-                    "temperatura": round(float(result[5]), 2) if result[5] else 0,
-                    "luz_solar": round(float(result[6]), 2) if result[6] else 0
-                },
-                "message": f"Promedio de {result[7]} lecturas del día de hoy"
-            }
-        else:
-            return {
-                "fecha": hoy.strftime("%Y-%m-%d"),
-                "message": "No hay lecturas para el día de hoy",
-                "total_lecturas": 0,
-                "promedios": None
-            }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _consultar_acumulados_dia(usuario_ids, fecha):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, *consulta_acumulado_dia_varios(usuario_ids, fecha))
+        return {fila[0]: acumulado_desde_fila(fila[1:]) for fila in cursor.fetchall()}
+
+@router.post("/bulk/promedio-hoy")
+async def promedio_dia_actual_bulk(request: Request, datos: UsuariosBulk):
+    """
+    Promedio del día actual de varios usuarios: {"fecha", "usuarios": {usuario_id: promedio}},
+    cada uno con el formato de /promedio-hoy. Los acumulados que faltan en memoria
+    se leen en una sola consulta.
+    """
+    usuario_ids = _usuarios_bulk(datos)
+    try:
+        hoy = date.today()
+        acumulados = {}
+        faltan = []
+        for usuario_id in usuario_ids:
+            acumulado = cache.acumulados.get((usuario_id, hoy))
+            if acumulado is not None:
+                acumulados[usuario_id] = acumulado
+            else:
+                faltan.append(usuario_id)
+
+        if faltan:
+            generaciones = {u: cache.acumulados.generacion(u) for u in faltan}
+            filas = await run_db(_consultar_acumulados_dia, faltan, hoy)
+            for usuario_id in faltan:
+                # Sin fila: el usuario no tiene lecturas hoy
+                acumulado = filas.get(usuario_id) or acumulado_desde_fila(None)
+                cache.acumulados.set((usuario_id, hoy), acumulado, generaciones[usuario_id])
+                acumulados[usuario_id] = acumulado
+
+        return negociar(request, {
+            "fecha": hoy.strftime("%Y-%m-%d"),
+            "usuarios": {u: respuesta_promedio_hoy(hoy, *acumulados[u]) for u in usuario_ids}
+        })
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -466,49 +666,35 @@ async def promedio_dia_actual(usuario_id: int):
 
 # ----------------- ENDPOINT ADICIONAL PARA GRÁFICA ESPECÍFICA -----------------
 @router.get("/historico/{usuario_id}/{periodo}/{parametro}")
-async def obtener_grafica_parametro(usuario_id: int, periodo: str, parametro: str):
+async def obtener_grafica_parametro(request: Request, usuario_id: int, periodo: str, parametro: str,
+                                    max_points: Optional[int] = Query(None, ge=3)):
     """
     Devuelve datos específicos para una gráfica individual de un parámetro.
     Parámetros válidos: nitrogeno, fosforo, potasio, ph, humedad, temperatura
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         # Validar parámetro
-        parametros_validos = ["nitrogeno", "fosforo", "potasio", "ph", "humedad", "temperatura"]
-        if parametro not in parametros_validos:
+        if parametro not in PARAMETROS_HISTORICO:
             raise HTTPException(status_code=400, detail="Parámetro inválido")
 
-        # Definir fecha de consulta según período
-        if periodo == "1mes":
-            fecha_consulta = "DATEADD(MONTH, -1, GETDATE())"
-        elif periodo == "3meses":
-            fecha_consulta = "DATEADD(MONTH, -3, GETDATE())"
-        else:
-            fecha_consulta = "DATEADD(MONTH, -6, GETDATE())"
+        no_modificado, encabezados = await _validar_historico(
+            request, usuario_id, periodo, parametro, max_points
+        )
+        if no_modificado is not None:
+            return no_modificado
 
-        # Query específica para el parámetro
-        query = f"""
-            SELECT 
-                CAST(fecha_hora AS DATE) as fecha,
-                AVG(CAST({parametro} AS FLOAT)) as valor
-            FROM lecturas 
-            WHERE usuario_id = %s AND fecha_hora >= {fecha_consulta}
-            GROUP BY CAST(fecha_hora AS DATE)
-            ORDER BY CAST(fecha_hora AS DATE)
-        """
-        
-        cursor.execute(query, (usuario_id,))
-        results = cursor.fetchall()
-        conn.close()
+        # Misma serie diaria que el histórico completo
+        serie = await serie_diaria(usuario_id, periodo)
 
-        if not results:
-            return {"message": f"No hay datos históricos para {parametro}"}
+        if not serie["fechas"]:
+            return negociar(request, {"message": f"No hay datos históricos para {parametro}"},
+                            headers=encabezados)
 
-        # Procesar datos
-        fechas = [row[0].strftime("%Y-%m-%d") for row in results]
-        valores = [float(row[1]) for row in results]
+        # Procesar datos (reducidos a max_points días si se pide)
+        grafica, _ = reducir_serie(serie, max_points, [parametro])
+        fechas = grafica["fechas"]
+        valores = grafica["series"][parametro]
+        completos = serie["series"][parametro]
 
         # Información del parámetro
         info_parametros = {
@@ -520,19 +706,19 @@ async def obtener_grafica_parametro(usuario_id: int, periodo: str, parametro: st
             "temperatura": {"nombre": "Temperatura", "unidad": "°C", "color": "#F1948A", "icono": "🌡️"}
         }
 
-        return {
+        return negociar(request, {
             "parametro": parametro,
             "info": info_parametros[parametro],
             "periodo": periodo,
             "fechas": fechas,
             "valores": valores,
-            "valor_actual": valores[-1] if valores else 0,
-            "valor_anterior": valores[-2] if len(valores) > 1 else valores[-1] if valores else 0
-        }
+            "valor_actual": completos[-1] if completos else 0,
+            "valor_anterior": completos[-2] if len(completos) > 1 else completos[-1] if completos else 0
+        }, headers=encabezados)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
 
 
 
@@ -0,0 +1,170 @@
+"""
+Series de lecturas por rango de fechas y tamaño de intervalo (bucket).
+
+El rango es semiabierto [desde, hasta) y se filtra siempre con comparaciones
+directas sobre la columna (fecha_hora >= %s AND fecha_hora < %s), sin
+funciones sobre ella, para que SQL Server pueda buscar en el índice
+(usuario_id, fecha_hora). Los intervalos de día, semana y mes se leen de
+lecturas_diarias cuando el rango empieza y termina a medianoche.
+"""
+from datetime import datetime, time
+
+import config
+import consultas
+from database import db_connection
+from models import PARAMETROS
+
+# bucket -> expresión que trunca la columna al inicio del intervalo.
+# La fecha 0 de SQL Server (1900-01-01) es lunes, así que las semanas empiezan en lunes.
+BUCKETS = {
+    "raw": None,
+    "15min": "DATEADD(MINUTE, DATEDIFF(MINUTE, 0, {col}) / 15 * 15, 0)",
+    "hour": "DATEADD(HOUR, DATEDIFF(HOUR, 0, {col}), 0)",
+    "day": "DATEADD(DAY, DATEDIFF(DAY, 0, {col}), 0)",
+    "week": "DATEADD(DAY, DATEDIFF(DAY, 0, {col}) / 7 * 7, 0)",
+    "month": "DATEADD(MONTH, DATEDIFF(MONTH, 0, {col}), 0)",
+}
+BUCKETS_DIARIOS = ("day", "week", "month")
+
+# agregado -> (expresión sobre lecturas, expresión sobre lecturas_diarias)
+AGREGADOS = {
+    "avg": ("AVG(CAST({p} AS FLOAT))", "SUM(suma_{p}) / SUM(total)"),
+    "min": ("MIN(CAST({p} AS FLOAT))", "MIN(min_{p})"),
+    "max": ("MAX(CAST({p} AS FLOAT))", "MAX(max_{p})"),
+    "sum": ("SUM(CAST({p} AS FLOAT))", "SUM(suma_{p})"),
+}
+
+
+class ConsultaSeriesError(ValueError):
+    """Parámetros de consulta inválidos (bucket, parámetro, agregado o rango)."""
+
+
+def _lista(valor, permitidos, nombre, por_defecto):
+    if not valor:
+        return list(por_defecto)
+    elegidos = []
+    for item in valor.split(","):
+        item = item.strip().lower()
+        if item not in permitidos:
+            raise ConsultaSeriesError(
+                f"{nombre} inválido: {item}. Permitidos: {', '.join(permitidos)}"
+            )
+        if item not in elegidos:
+            elegidos.append(item)
+    return elegidos
+
+
+def normalizar_consulta(desde, hasta, bucket, parametros, agregados, ahora=None):
+    """
+    Valida los parámetros del endpoint y devuelve
+    (desde, hasta, bucket, lista de parámetros, lista de agregados).
+    `parametros` y `agregados` llegan como texto separado por comas.
+    """
+    if bucket not in BUCKETS:
+        raise ConsultaSeriesError(f"bucket inválido: {bucket}. Permitidos: {', '.join(BUCKETS)}")
+
+    # La columna es datetime sin zona: se compara en hora local del servidor
+    if desde.tzinfo is not None:
+        desde = desde.astimezone().replace(tzinfo=None)
+    if hasta is None:
+        hasta = ahora or datetime.now()
+    elif hasta.tzinfo is not None:
+        hasta = hasta.astimezone().replace(tzinfo=None)
+    if desde >= hasta:
+        raise ConsultaSeriesError("desde debe ser anterior a hasta")
+
+    parametros = _lista(parametros, PARAMETROS, "Parámetro", PARAMETROS)
+    agregados = _lista(agregados, tuple(AGREGADOS) + ("count",), "Agregado", ("avg",))
+    return desde, hasta, bucket, parametros, agregados
+
+
+def _a_medianoche(momento):
+    return momento.time() == time.min
+
+
+def usa_resumen_diario(desde, hasta, bucket):
+    return (
+        config.ROLLUP_DIARIO
+        and bucket in BUCKETS_DIARIOS
+        and _a_medianoche(desde)
+        and _a_medianoche(hasta)
+    )
+
+
+def sql_series(usuario_id, desde, hasta, bucket, parametros, agregados, limite):
+    """
+    Devuelve (query, params). Las columnas son: inicio del intervalo, total de
+    lecturas y un valor por (parámetro, agregado) en ese orden; con bucket
+    "raw" son fecha_hora y un valor por parámetro. Se pide una fila más que
+    `limite` para saber si el resultado se truncó.
+    """
+    params = (int(limite) + 1, usuario_id, desde, hasta)
+
+    if BUCKETS[bucket] is None:
+        columnas = ", ".join(f"CAST({p} AS FLOAT)" for p in parametros)
+        query = f"""
+            SELECT TOP (%s) fecha_hora, 1, {columnas}
+            FROM lecturas
+            WHERE usuario_id = %s AND fecha_hora >= %s AND fecha_hora < %s
+            ORDER BY fecha_hora
+        """
+        return query, params
+
+    if usa_resumen_diario(desde, hasta, bucket):
+        tabla, columna, total, indice = "lecturas_diarias", "CAST(fecha AS DATETIME)", "SUM(total)", 1
+        filtro = "fecha >= %s AND fecha < %s"
+        params = (int(limite) + 1, usuario_id, desde.date(), hasta.date())
+    else:
+        tabla, columna, total, indice = "lecturas", "fecha_hora", "COUNT(*)", 0
+        filtro = "fecha_hora >= %s AND fecha_hora < %s"
+
+    intervalo = BUCKETS[bucket].format(col=columna)
+    valores = ", ".join(
+        AGREGADOS[a][indice].format(p=p) for p in parametros for a in agregados if a != "count"
+    )
+    query = f"""
+        SELECT TOP (%s) {intervalo} AS intervalo, {total}{", " + valores if valores else ""}
+        FROM {tabla}
+        WHERE usuario_id = %s AND {filtro}
+        GROUP BY {intervalo}
+        ORDER BY intervalo
+    """
+    return query, params
+
+
+def consultar_series(usuario_id, desde, hasta, bucket, parametros, agregados, limite):
+    """
+    Ejecuta la consulta y arma la respuesta:
+    {"fechas", "total"?, "series": {parametro: {agregado: [...]}}, "truncado"}.
+    Con bucket "raw" cada parámetro trae solo "valor".
+    """
+    query, params = sql_series(usuario_id, desde, hasta, bucket, parametros, agregados, limite)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        consultas.ejecutar(cursor, consultas.SERIES, params, sql=query)
+        filas = cursor.fetchall()
+
+    truncado = len(filas) > limite
+    filas = filas[:limite]
+
+    if BUCKETS[bucket] is None:
+        nombres = ["valor"]
+    else:
+        nombres = [a for a in agregados if a != "count"]
+
+    series = {p: {a: [] for a in nombres} for p in parametros}
+    for fila in filas:
+        i = 2
+        for p in parametros:
+            for a in nombres:
+                series[p][a].append(float(fila[i]) if fila[i] is not None else None)
+                i += 1
+
+    respuesta = {
+        "fechas": [fila[0].isoformat() for fila in filas],
+        "series": series,
+        "truncado": truncado,
+    }
+    if BUCKETS[bucket] is not None and "count" in agregados:
+        respuesta["total"] = [int(fila[1]) for fila in filas]
+    return respuesta
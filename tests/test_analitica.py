@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from analitica import analizar, indices_lttb, matriz_serie, resumen_por_parametro
+from models import PARAMETROS
+
+
+def serie_de(valores_por_dia):
+    """Serie de historico.serie_diaria con el mismo valor en todos los parámetros."""
+    return {
+        "fechas": [f"2024-01-{dia + 1:02d}" for dia in range(len(valores_por_dia))],
+        "series": {p: list(valores_por_dia) for p in PARAMETROS},
+    }
+
+
+# ----------------- indices_lttb -----------------
+def test_lttb_serie_vacia():
+    assert indices_lttb([], 5).tolist() == []
+
+
+def test_lttb_serie_mas_corta_que_el_limite_se_devuelve_entera():
+    assert indices_lttb(np.arange(4.0), 4).tolist() == [0, 1, 2, 3]
+    assert indices_lttb(np.arange(4.0), 100).tolist() == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("max_puntos, esperados", [(1, [0]), (2, [0, 9]), (3, [0, 1, 9])])
+def test_lttb_pocos_puntos(max_puntos, esperados):
+    assert indices_lttb(np.arange(10.0), max_puntos).tolist() == esperados
+
+
+@pytest.mark.parametrize("max_puntos", [3, 4, 10, 57])
+def test_lttb_conserva_extremos_y_orden(max_puntos):
+    datos = np.random.default_rng(7).random((200, 3))
+    indices = indices_lttb(datos, max_puntos)
+    assert len(indices) == max_puntos
+    assert indices[0] == 0 and indices[-1] == 199
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_conserva_un_pico():
+    datos = np.zeros(50)
+    datos[23] = 10.0
+    assert 23 in indices_lttb(datos, 5)
+
+
+def test_lttb_con_nan():
+    datos = np.random.default_rng(3).random((100, 2))
+    datos[::7, 1] = np.nan
+    indices = indices_lttb(datos, 10)
+    assert len(indices) == 10
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_todo_nan():
+    indices = indices_lttb(np.full(20, np.nan), 5)
+    assert indices[0] == 0 and indices[-1] == 19
+    assert np.all(np.diff(indices) > 0)
+
+
+# ----------------- analizar -----------------
+def test_analizar_sin_dias():
+    resultado = analizar(np.empty((0, 2)))
+    assert resultado["tendencia"].tolist() == ["estable", "estable"]
+    assert np.isnan(resultado["promedio"]).all()
+    assert resultado["media_movil"].shape == (0, 2)
+
+
+def test_analizar_columna_sin_datos():
+    datos = np.column_stack([np.arange(6.0), np.full(6, np.nan)])
+    resultado = analizar(datos)
+    assert resultado["total"].tolist() == [6, 0]
+    assert resultado["promedio"][0] == pytest.approx(2.5)
+    assert np.isnan(resultado["promedio"][1])
+    assert resultado["tendencia"].tolist() == ["creciente", "estable"]
+
+
+def test_analizar_tendencias():
+    dias = np.arange(9.0)
+    datos = np.column_stack([10 + dias, 10 - dias, np.full(9, 5.0)])
+    assert analizar(datos)["tendencia"].tolist() == ["creciente", "decreciente", "estable"]
+
+
+def test_analizar_menos_de_tres_dias_es_estable():
+    assert analizar(np.array([[1.0], [100.0]]))["tendencia"].tolist() == ["estable"]
+
+
+def test_analizar_ignora_dias_sin_dato():
+    datos = np.array([[1.0], [np.nan], [3.0], [np.nan], [5.0]])
+    resultado = analizar(datos)
+    assert resultado["total"][0] == 3
+    assert resultado["promedio"][0] == pytest.approx(3.0)
+    assert resultado["pendiente"][0] == pytest.approx(1.0)
+    assert resultado["cambio_porcentual"][0] == pytest.approx(400.0)
+
+
+def test_analizar_bloque_igual_que_cada_matriz():
+    rng = np.random.default_rng(11)
+    matrices = [rng.random((30, 3)) for _ in range(4)]
+    bloque = analizar(np.stack(matrices))
+    for i, matriz in enumerate(matrices):
+        individual = analizar(matriz)
+        np.testing.assert_allclose(bloque["promedio"][i], individual["promedio"])
+        np.testing.assert_allclose(bloque["pendiente"][i], individual["pendiente"])
+        assert bloque["tendencia"][i].tolist() == individual["tendencia"].tolist()
+
+
+def test_media_movil_primeros_dias_promedian_los_que_hay():
+    datos = np.arange(1.0, 11.0).reshape(-1, 1)
+    movil = analizar(datos, ventana=3)["media_movil"][:, 0]
+    np.testing.assert_allclose(movil[:4], [1.0, 1.5, 2.0, 3.0])
+
+
+# ----------------- resumen_por_parametro -----------------
+def test_resumen_serie_vacia():
+    resumen = resumen_por_parametro(serie_de([]))
+    assert set(resumen) == set(PARAMETROS)
+    for parametro in PARAMETROS:
+        assert resumen[parametro]["tendencia"] == "estable"
+        assert resumen[parametro]["media_movil"] == []
+        assert all(v is None for v in resumen[parametro]["estadisticas"].values())
+
+
+def test_resumen_redondea_y_recorta_la_media_movil():
+    serie = serie_de([1.0, 2.0, 4.0, 8.0, 16.0])
+    resumen = resumen_por_parametro(serie, ["ph"], decimales=1, indices=[0, 4])
+    assert list(resumen) == ["ph"]
+    assert resumen["ph"]["tendencia"] == "creciente"
+    assert resumen["ph"]["estadisticas"]["promedio"] == 6.2
+    assert len(resumen["ph"]["media_movil"]) == 2
+
+
+def test_matriz_serie_vacia():
+    assert matriz_serie(serie_de([]), ["ph", "humedad"]).shape == (0, 2)
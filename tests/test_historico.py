@@ -0,0 +1,70 @@
+import math
+from datetime import date, timedelta
+
+import pytest
+
+from historico import reducir_serie, respuesta_compacta
+from models import PARAMETROS
+
+
+def serie_sintetica(dias, inicio=date(2024, 1, 1)):
+    return {
+        "fechas": [(inicio + timedelta(days=i)).isoformat() for i in range(dias)],
+        "series": {
+            p: [math.sin(i / 5 + j) * 10 + 50 for i in range(dias)] for j, p in enumerate(PARAMETROS)
+        },
+    }
+
+
+def test_sin_max_puntos_no_reduce():
+    serie = serie_sintetica(30)
+    assert reducir_serie(serie, None) == (serie, None)
+
+
+@pytest.mark.parametrize("max_puntos", [30, 31, 1000])
+def test_serie_mas_corta_que_el_limite_no_reduce(max_puntos):
+    serie = serie_sintetica(30)
+    reducida, indices = reducir_serie(serie, max_puntos)
+    assert reducida is serie
+    assert indices is None
+
+
+def test_serie_vacia():
+    serie = serie_sintetica(0)
+    assert reducir_serie(serie, 3) == (serie, None)
+
+
+@pytest.mark.parametrize("max_puntos", [3, 10, 50])
+def test_reduce_con_los_mismos_dias_en_todos_los_parametros(max_puntos):
+    serie = serie_sintetica(183)
+    reducida, indices = reducir_serie(serie, max_puntos)
+
+    assert len(indices) == max_puntos
+    assert indices[0] == 0 and indices[-1] == 182
+    assert reducida["fechas"] == [serie["fechas"][i] for i in indices]
+    for p in PARAMETROS:
+        assert reducida["series"][p] == [serie["series"][p][i] for i in indices]
+
+
+def test_reduce_solo_los_parametros_pedidos():
+    serie = serie_sintetica(100)
+    reducida, indices = reducir_serie(serie, 10, ["ph", "humedad"])
+    assert set(reducida["series"]) == {"ph", "humedad"}
+    assert len(reducida["fechas"]) == len(indices) == 10
+
+
+def test_reduce_con_dias_sin_dato():
+    serie = serie_sintetica(60)
+    for p in PARAMETROS:
+        serie["series"][p][::4] = [math.nan] * len(serie["series"][p][::4])
+    reducida, indices = reducir_serie(serie, 12)
+    assert len(indices) == 12
+    assert indices == sorted(set(indices))
+
+
+def test_respuesta_compacta_redondea_las_columnas():
+    serie = serie_sintetica(5)
+    compacta = respuesta_compacta(serie, "1mes", ["ph"], decimales=1)
+    assert compacta["fechas"] == serie["fechas"]
+    assert list(compacta["columnas"]) == ["ph"]
+    assert compacta["columnas"]["ph"] == [round(v, 1) for v in serie["series"]["ph"]]
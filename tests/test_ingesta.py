@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+from ingesta import fila_lectura, validar_lote
+from models import PARAMETROS
+
+AHORA = datetime(2024, 6, 1, 12, 0)
+LECTURA = {"nitrogeno": 1, "fosforo": 2, "potasio": 3, "ph": 6.5, "humedad": 40,
+           "temperatura": 20, "luz_solar": 100}
+
+
+def test_lote_vacio():
+    assert validar_lote([], 7, ahora=AHORA) == ([], [])
+
+
+def test_lecturas_validas_usan_el_usuario_del_lote_o_el_propio():
+    filas, resultados = validar_lote([LECTURA, {**LECTURA, "usuario_id": 9}], 7, ahora=AHORA)
+    assert [fila[0] for fila in filas] == [7, 9]
+    assert resultados == [
+        {"indice": 0, "ok": True, "usuario_id": 7},
+        {"indice": 1, "ok": True, "usuario_id": 9},
+    ]
+
+
+def test_fila_en_el_orden_de_la_tabla_y_sin_fecha_para_la_base_de_datos():
+    filas, _ = validar_lote([LECTURA], 7, ahora=AHORA)
+    assert filas == [(7, *(float(LECTURA[p]) for p in PARAMETROS), None)]
+
+
+def test_falta_usuario_id():
+    filas, resultados = validar_lote([LECTURA], None, ahora=AHORA)
+    assert filas == []
+    assert resultados == [{"indice": 0, "ok": False, "error": "Falta usuario_id"}]
+
+
+def test_errores_de_validacion_por_campo():
+    filas, resultados = validar_lote([{**LECTURA, "ph": "ácido"}, {"nitrogeno": 1}], 7, ahora=AHORA)
+    assert filas == []
+    assert resultados[0]["indice"] == 0 and resultados[0]["error"].startswith("ph: ")
+    faltan = resultados[1]["error"].split("; ")
+    assert [error.split(":")[0] for error in faltan] == [p for p in PARAMETROS if p != "nitrogeno"]
+
+
+def test_valores_no_finitos():
+    filas, resultados = validar_lote(
+        [{**LECTURA, "ph": float("nan"), "humedad": float("inf")}], 7, ahora=AHORA
+    )
+    assert filas == []
+    assert resultados[0]["error"] == "Valores no numéricos en: ph, humedad"
+
+
+def test_fecha_en_el_futuro_con_tolerancia():
+    dentro = {**LECTURA, "fecha_hora": (AHORA + timedelta(minutes=4)).isoformat()}
+    fuera = {**LECTURA, "fecha_hora": (AHORA + timedelta(minutes=6)).isoformat()}
+    filas, resultados = validar_lote([dentro, fuera], 7, ahora=AHORA)
+    assert [fila[-1] for fila in filas] == [AHORA + timedelta(minutes=4)]
+    assert resultados[1] == {"indice": 1, "ok": False, "error": "fecha_hora en el futuro"}
+
+
+def test_fecha_con_zona_se_guarda_en_hora_local_sin_zona():
+    con_zona = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+    filas, _ = validar_lote([{**LECTURA, "fecha_hora": con_zona.isoformat()}], 7, ahora=AHORA)
+    assert filas[0][-1] == con_zona.astimezone().replace(tzinfo=None)
+    assert filas[0][-1].tzinfo is None
+
+
+def test_invalidas_no_impiden_guardar_el_resto():
+    items = [LECTURA, {**LECTURA, "ph": None}, {**LECTURA, "usuario_id": 3}]
+    filas, resultados = validar_lote(items, 7, ahora=AHORA)
+    assert [fila[0] for fila in filas] == [7, 3]
+    assert [r["ok"] for r in resultados] == [True, False, True]
+    assert [r["indice"] for r in resultados] == [0, 1, 2]
+
+
+def test_fila_lectura():
+    class Lectura:
+        nitrogeno, fosforo, potasio, ph, humedad, temperatura, luz_solar = range(7)
+
+    assert fila_lectura(5, Lectura()) == (5, 0, 1, 2, 3, 4, 5, 6, None)
+    assert fila_lectura(5, Lectura(), AHORA)[-1] == AHORA
@@ -0,0 +1,146 @@
+from datetime import date, datetime
+
+import pytest
+
+from recurrencias import (
+    Excepcion, Regla, expandir, fila_ocurrencia, ocurrencias_en_rango, primera_desde,
+    siguiente_ocurrencia, sumar_meses,
+)
+
+
+def regla(inicio, frecuencia, intervalo=1, hasta=None, repeticiones=None, id=1, titulo="Riego"):
+    return Regla(id, 7, titulo, inicio, frecuencia, intervalo, hasta, repeticiones)
+
+
+def excepcion(fecha, nueva_fecha=None, completada=False, cancelada=False):
+    return {fecha: Excepcion(fecha, nueva_fecha, completada, cancelada)}
+
+
+# ----------------- sumar_meses -----------------
+@pytest.mark.parametrize("fecha, meses, esperada", [
+    (date(2024, 1, 31), 1, date(2024, 2, 29)),
+    (date(2023, 1, 31), 1, date(2023, 2, 28)),
+    (date(2024, 1, 31), 3, date(2024, 4, 30)),
+    (date(2023, 12, 31), 2, date(2024, 2, 29)),
+    (date(2024, 1, 31), 13, date(2025, 2, 28)),
+    (date(2024, 5, 15), 0, date(2024, 5, 15)),
+])
+def test_sumar_meses(fecha, meses, esperada):
+    assert sumar_meses(fecha, meses) == esperada
+
+
+# ----------------- Regla.fechas -----------------
+def test_mensual_desde_fin_de_mes_no_se_corre():
+    # Cada ocurrencia se calcula desde el inicio: tras febrero vuelve al 31
+    r = regla(date(2024, 1, 31), "mensual")
+    assert list(r.fechas(date(2024, 1, 1), date(2024, 6, 1))) == [
+        date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30), date(2024, 5, 31),
+    ]
+
+
+def test_mensual_ventana_que_empieza_a_mitad_de_mes():
+    r = regla(date(2024, 1, 31), "mensual", intervalo=2)
+    assert list(r.fechas(date(2024, 3, 15), date(2024, 10, 1))) == [
+        date(2024, 3, 31), date(2024, 5, 31), date(2024, 7, 31), date(2024, 9, 30),
+    ]
+
+
+def test_es_ocurrencia_en_fin_de_mes():
+    r = regla(date(2024, 1, 31), "mensual")
+    assert r.es_ocurrencia(date(2024, 2, 29))
+    assert r.es_ocurrencia(date(2024, 4, 30))
+    assert not r.es_ocurrencia(date(2024, 3, 30))
+
+
+def test_semanal_con_intervalo():
+    r = regla(date(2024, 1, 1), "semanal", intervalo=2)
+    assert list(r.fechas(date(2024, 1, 2), date(2024, 2, 1))) == [date(2024, 1, 15), date(2024, 1, 29)]
+
+
+def test_termina_por_repeticiones():
+    r = regla(date(2024, 1, 1), "semanal", intervalo=2, repeticiones=3)
+    assert list(r.fechas(date(2023, 1, 1), date(2025, 1, 1))) == [
+        date(2024, 1, 1), date(2024, 1, 15), date(2024, 1, 29),
+    ]
+    # La cuenta empieza en `inicio` aunque la ventana empiece después
+    assert list(r.fechas(date(2024, 1, 20))) == [date(2024, 1, 29)]
+    assert list(r.fechas(date(2024, 2, 1))) == []
+
+
+def test_termina_por_repeticiones_en_fin_de_mes():
+    r = regla(date(2024, 1, 31), "mensual", repeticiones=2)
+    assert list(r.fechas(date(2024, 1, 1))) == [date(2024, 1, 31), date(2024, 2, 29)]
+
+
+def test_hasta_es_inclusiva():
+    r = regla(date(2024, 1, 1), "diaria", hasta=date(2024, 1, 5))
+    assert list(r.fechas(date(2024, 1, 3))) == [date(2024, 1, 3), date(2024, 1, 4), date(2024, 1, 5)]
+
+
+def test_sin_fin_genera_mientras_se_pida():
+    fechas = regla(date(2024, 1, 1), "diaria").fechas(date(2030, 1, 1))
+    assert [next(fechas) for _ in range(3)] == [date(2030, 1, 1), date(2030, 1, 2), date(2030, 1, 3)]
+
+
+def test_acepta_datetime_de_la_base_de_datos():
+    r = regla(datetime(2024, 1, 31), "mensual", hasta=datetime(2024, 3, 31))
+    assert list(r.fechas(date(2024, 1, 1))) == [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31)]
+
+
+# ----------------- excepciones -----------------
+def test_expandir_aplica_cancelada_movida_y_completada():
+    r = regla(date(2024, 1, 1), "diaria", repeticiones=5)
+    excepciones = {
+        **excepcion(date(2024, 1, 2), cancelada=True),
+        **excepcion(date(2024, 1, 3), nueva_fecha=date(2024, 2, 10), completada=True),
+        **excepcion(date(2024, 1, 4), completada=True),
+    }
+    assert expandir(r, excepciones, date(2024, 1, 1), date(2024, 2, 1)) == [
+        (date(2024, 1, 1), False), (date(2024, 1, 4), True), (date(2024, 1, 5), False),
+    ]
+    # La movida aparece en la ventana de su nueva fecha
+    assert expandir(r, excepciones, date(2024, 2, 1), date(2024, 3, 1)) == [(date(2024, 2, 10), True)]
+
+
+def test_expandir_ignora_excepciones_de_fechas_que_no_son_ocurrencias():
+    r = regla(date(2024, 1, 1), "semanal")
+    excepciones = excepcion(date(2024, 1, 3), nueva_fecha=date(2024, 1, 20))
+    assert expandir(r, excepciones, date(2024, 1, 15), date(2024, 1, 22)) == [(date(2024, 1, 15), False)]
+
+
+def test_primera_desde():
+    r = regla(date(2024, 1, 1), "diaria", repeticiones=5)
+    excepciones = {
+        **excepcion(date(2024, 1, 2), cancelada=True),
+        **excepcion(date(2024, 1, 3), nueva_fecha=date(2024, 2, 10), completada=True),
+    }
+    assert primera_desde(r, excepciones, date(2024, 1, 2)) == (date(2024, 1, 4), False)
+    # Terminada la regla solo queda la ocurrencia movida
+    assert primera_desde(r, excepciones, date(2024, 1, 6)) == (date(2024, 2, 10), True)
+    assert primera_desde(r, {}, date(2024, 1, 6)) is None
+
+
+def test_primera_desde_movida_antes_que_la_siguiente():
+    r = regla(date(2024, 1, 1), "mensual")
+    excepciones = excepcion(date(2024, 3, 1), nueva_fecha=date(2024, 2, 10))
+    assert primera_desde(r, excepciones, date(2024, 2, 2)) == (date(2024, 2, 10), False)
+
+
+# ----------------- varias reglas -----------------
+def test_ocurrencias_en_rango_ordenadas_por_fecha():
+    riego = regla(date(2024, 1, 1), "semanal", id=1, titulo="Riego")
+    abono = regla(date(2024, 1, 31), "mensual", id=2, titulo="Abono")
+    filas = ocurrencias_en_rango([riego, abono], {}, date(2024, 1, 20), date(2024, 2, 10))
+    assert [(f[1].date(), f[4]) for f in filas] == [
+        (date(2024, 1, 22), 1), (date(2024, 1, 29), 1), (date(2024, 1, 31), 2), (date(2024, 2, 5), 1),
+    ]
+    assert all(f[0] is None for f in filas)
+
+
+def test_siguiente_ocurrencia():
+    riego = regla(date(2024, 1, 1), "semanal", id=1, titulo="Riego")
+    abono = regla(date(2024, 1, 31), "mensual", id=2, titulo="Abono")
+    assert siguiente_ocurrencia([riego, abono], {}, date(2024, 1, 30)) == fila_ocurrencia(
+        abono, date(2024, 1, 31), False
+    )
+    assert siguiente_ocurrencia([], {}, date(2024, 1, 30)) is None